@@ -0,0 +1,199 @@
+"""
+Columnar order analytics
+────────────────────────
+Order history as NumPy columns: scan date parsed once into epoch days,
+driver / status / store / tag dictionary-encoded, cash and fee as
+float64.  Filters are boolean masks and group-bys are one ``np.unique``
+plus a few weighted ``np.bincount`` calls, instead of looping over lists
+of strings row by row.
+
+Each driver's rows are encoded into their own columns, against
+dictionaries shared by every driver; the frame is their concatenation.
+``with_driver`` re-encodes one driver and reuses the other drivers'
+columns, so a change in one tab costs that tab's rows, not all of them.
+
+Metrics follow ``/stats``: cash and fees are collected on ``Livré``
+orders, the cancelled amount is the cash of returned / refused /
+cancelled ones.
+"""
+import datetime as dt
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+EPOCH = dt.date(1970, 1, 1)
+NO_DAY = np.iinfo(np.int32).min          # missing or unparseable scan date
+GROUP_KEYS = ("driver", "status", "store", "tag", "day", "week", "month")
+DELIVERED = "Livré"
+RETURNED = ("Returned", "Annulé", "Refusé")
+
+
+def _epoch_day(text: str) -> int:
+    try:
+        return (dt.datetime.strptime(text, "%Y-%m-%d").date() - EPOCH).days
+    except (TypeError, ValueError):
+        return NO_DAY
+
+
+def _number(text: str) -> float:
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def day_number(d: Optional[dt.date]) -> Optional[int]:
+    return None if d is None else (d - EPOCH).days
+
+
+class _Codes:
+    """Dictionary encoder: each distinct value gets a small integer."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        hit = self._index.get(value)
+        if hit is None:
+            hit = self._index[value] = len(self.values)
+            self.values.append(value)
+        return hit
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self._index.get(value)
+
+
+def _concat(arrays: List[np.ndarray], dtype) -> np.ndarray:
+    return np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+
+
+class _Part:
+    """The encoded columns of one driver's rows."""
+
+    __slots__ = ("day", "cash", "fee", "codes")
+
+    def __init__(self, driver: str, rows: Iterable[List[str]],
+                 tag_of: Callable[[str], str], dicts: Dict[str, _Codes]):
+        driver_code = dicts["driver"].code(driver)
+        day, cash, fee = [], [], []
+        cols: Dict[str, list] = {k: [] for k in ("status", "store", "tag")}
+        for r in rows:
+            cols["status"].append(dicts["status"].code(r[9]))
+            cols["store"].append(dicts["store"].code(r[8]))
+            cols["tag"].append(dicts["tag"].code(tag_of(r[5])))
+            day.append(_epoch_day(r[12]))
+            cash.append(_number(r[13]))
+            fee.append(_number(r[14]))
+        self.day = np.array(day, dtype=np.int32)
+        self.cash = np.array(cash, dtype=np.float64)
+        self.fee = np.array(fee, dtype=np.float64)
+        self.codes = {k: np.array(v, dtype=np.int32) for k, v in cols.items()}
+        self.codes["driver"] = np.full(len(day), driver_code, dtype=np.int32)
+
+
+class OrderFrame:
+    def __init__(self, parts: Dict[str, _Part], dictionaries: Dict[str, _Codes]):
+        self.parts = parts
+        self.dictionaries = dictionaries
+        chunks = list(parts.values())
+        self.day = _concat([p.day for p in chunks], np.int32)
+        self.cash = _concat([p.cash for p in chunks], np.float64)
+        self.fee = _concat([p.fee for p in chunks], np.float64)
+        self.codes = {k: _concat([p.codes[k] for p in chunks], np.int32)
+                      for k in ("driver", "status", "store", "tag")}
+
+    @classmethod
+    def from_rows(cls, rows_by_driver: Dict[str, Iterable[List[str]]],
+                  tag_of: Callable[[str], str]) -> "OrderFrame":
+        """Encode order rows (sheet layout) of every driver."""
+        dicts = {k: _Codes() for k in ("driver", "status", "store", "tag")}
+        return cls({d: _Part(d, rows, tag_of, dicts) for d, rows in rows_by_driver.items()},
+                   dicts)
+
+    def with_driver(self, driver: str, rows: Iterable[List[str]],
+                    tag_of: Callable[[str], str]) -> "OrderFrame":
+        """A new frame with ``driver``'s rows re-encoded; this one is left as is."""
+        # the dictionaries only ever grow, so codes held by this frame stay valid
+        parts = dict(self.parts)
+        parts[driver] = _Part(driver, rows, tag_of, self.dictionaries)
+        return OrderFrame(parts, self.dictionaries)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    # ─── filtering ─────────────────────────────────────────────
+    def mask(self, start: Optional[dt.date] = None, end: Optional[dt.date] = None,
+             drivers: Sequence[str] = (), statuses: Sequence[str] = ()) -> np.ndarray:
+        m = np.ones(len(self), dtype=bool)
+        if start is not None:
+            m &= (self.day != NO_DAY) & (self.day >= day_number(start))
+        if end is not None:
+            m &= (self.day != NO_DAY) & (self.day <= day_number(end))
+        for key, wanted in (("driver", drivers), ("status", statuses)):
+            if wanted:
+                codes = [c for c in map(self.dictionaries[key].lookup, wanted) if c is not None]
+                m &= np.isin(self.codes[key], codes)
+        return m
+
+    # ─── grouping ──────────────────────────────────────────────
+    def _key(self, key: str) -> np.ndarray:
+        if key in self.codes:
+            return self.codes[key]
+        if key == "day":
+            return self.day
+        if key == "week":           # Monday of the ISO week; 1970-01-01 was a Thursday
+            return np.where(self.day == NO_DAY, NO_DAY, self.day - (self.day + 3) % 7)
+        if key == "month":
+            months = self.day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+            return np.where(self.day == NO_DAY, NO_DAY, months)
+        raise KeyError(key)
+
+    def _label(self, key: str, value: int) -> str:
+        if key in self.dictionaries:
+            return self.dictionaries[key].values[value]
+        if value == NO_DAY:
+            return ""
+        if key == "month":
+            return str(np.datetime64(int(value), "M"))
+        return (EPOCH + dt.timedelta(days=int(value))).isoformat()
+
+    def group_by(self, keys: Sequence[str], mask: Optional[np.ndarray] = None) -> List[dict]:
+        """Order count, delivery rate, cash, fees and cancelled amount per group."""
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        if not mask.any():
+            return []
+        stacked = np.stack([self._key(k)[mask] for k in keys], axis=1)
+        groups, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        n = len(groups)
+
+        status = self.codes["status"][mask]
+        status_codes = self.dictionaries["status"]
+        delivered_code = status_codes.lookup(DELIVERED)
+        delivered = status == (-1 if delivered_code is None else delivered_code)
+        returned = np.isin(status, [c for c in map(status_codes.lookup, RETURNED) if c is not None])
+        cash, fee = self.cash[mask], self.fee[mask]
+
+        orders = np.bincount(inverse, minlength=n)
+        n_delivered = np.bincount(inverse, weights=delivered, minlength=n)
+        n_returned = np.bincount(inverse, weights=returned, minlength=n)
+        collect = np.bincount(inverse, weights=np.where(delivered, cash, 0.0), minlength=n)
+        fees = np.bincount(inverse, weights=np.where(delivered, fee, 0.0), minlength=n)
+        canceled = np.bincount(inverse, weights=np.where(returned, cash, 0.0), minlength=n)
+
+        out = []
+        for i, group in enumerate(groups):
+            total = int(orders[i])
+            out.append({
+                **{k: self._label(k, v) for k, v in zip(keys, group)},
+                "totalOrders": total,
+                "delivered": int(n_delivered[i]),
+                "returned": int(n_returned[i]),
+                "totalCollect": round(float(collect[i]), 2),
+                "totalFees": round(float(fees[i]), 2),
+                "deliveryRate": float(n_delivered[i]) / total * 100 if total else 0,
+                "canceledAmount": round(float(canceled[i]), 2),
+            })
+        return out
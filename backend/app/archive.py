@@ -0,0 +1,76 @@
+"""
+Archive segments
+────────────────
+Completed, paid-out rows moved off the live driver tabs are kept in
+gzip-compressed JSON-lines segments, one file per driver, kind and day::
+
+    <root>/<driver>/orders/2024-05-01.jsonl.gz     (scan date)
+    <root>/<driver>/payouts/2024-05-03.jsonl.gz    (date created)
+
+An archiving run appends one gzip member per segment, so files are never
+rewritten.  The index of which key lives in which segment is the store's
+``archived`` table; it also keeps the archived rows' rollups and search
+terms, so stats and search cover the archive without opening it.
+"""
+import gzip
+import json
+import logging
+import os
+import zlib
+from typing import Dict, Iterable, Iterator, List
+
+log = logging.getLogger(__name__)
+
+UNDATED = "undated"
+
+
+class SegmentStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, driver: str, kind: str, day: str) -> str:
+        return os.path.join(self.root, driver, kind, f"{day or UNDATED}.jsonl.gz")
+
+    def append(self, driver: str, kind: str, rows_by_day: Dict[str, List[List[str]]]) -> None:
+        """Append rows to their day segments and fsync them."""
+        for day, rows in rows_by_day.items():
+            path = self.path(driver, kind, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as fh:
+                with gzip.GzipFile(fileobj=fh, mode="wb") as gz:
+                    for row in rows:
+                        gz.write(json.dumps(row, ensure_ascii=False).encode() + b"\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+
+    def read(self, driver: str, kind: str, day: str) -> Iterator[List[str]]:
+        path = self.path(driver, kind, day)
+        if not os.path.exists(path):
+            return
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                for line in fh:
+                    yield json.loads(line)
+        except (EOFError, OSError, zlib.error, ValueError) as exc:
+            # a run that died mid-write leaves a truncated last member
+            log.warning("archive segment %s: unreadable tail (%s)", path, exc)
+
+    def days(self, driver: str, kind: str) -> List[str]:
+        folder = os.path.join(self.root, driver, kind)
+        if not os.path.isdir(folder):
+            return []
+        days = [f[:-len(".jsonl.gz")] for f in os.listdir(folder) if f.endswith(".jsonl.gz")]
+        return sorted("" if d == UNDATED else d for d in days)
+
+    def rows(self, driver: str, kind: str) -> Iterator[List[str]]:
+        for day in self.days(driver, kind):
+            yield from self.read(driver, kind, day)
+
+    def find(self, driver: str, kind: str, day: str, key_col: int,
+             keys: Iterable[str]) -> Dict[str, List[str]]:
+        """The rows of one segment whose ``key_col`` is in ``keys``, read in one pass."""
+        wanted, found = set(keys), {}
+        for row in self.read(driver, kind, day):
+            if row[key_col] in wanted:
+                found[row[key_col]] = row    # the latest copy wins
+        return found
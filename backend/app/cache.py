@@ -0,0 +1,147 @@
+"""
+Cross-worker caches
+───────────────────
+Every gunicorn worker keeps its own ``TTLCache``, but entries are stamped
+with the driver's data version from the shared SQLite store.  The store
+bumps that version inside every write transaction, so a write handled by
+any worker invalidates every worker's copy on their next lookup – one
+indexed SQLite read instead of a 60 s stale window.
+
+``persist=True`` also keeps the computed value in the store, so a payload
+built by one worker is reused by the others until the version moves on.
+
+``get`` wraps lookup + load: concurrent misses for a driver share one
+load (single-flight), an entry that merely aged out of the TTL cache but
+still carries the current version is revived without loading, and
+``stale_ok`` callers get the previous snapshot – with its own version –
+while the refresh runs.  Coroutines use ``alookup`` / ``aput``, which do
+their SQLite work in a thread.
+
+Hits, misses, revivals, stale answers, joined loads, evictions and
+expiries are counted per cache in ``metrics``.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cachetools import Cache, TTLCache
+
+from . import metrics
+from .store import OrderStore
+
+log = logging.getLogger(__name__)
+
+
+class _CountingTTLCache(TTLCache):
+    """``TTLCache`` that reports evictions (size) and expiries (age)."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.name = name
+
+    def popitem(self):
+        item = super().popitem()
+        metrics.cache_event(self.name, "evicted")
+        return item
+
+    def expire(self, time=None):
+        # Cache.__len__: TTLCache's own would call expire() again
+        before = Cache.__len__(self)
+        super().expire(time)
+        gone = before - Cache.__len__(self)
+        if gone:
+            metrics.cache_event(self.name, "expired", gone)
+
+
+class SharedCache:
+    def __init__(self, name: str, store: OrderStore, maxsize: int, ttl: float,
+                 persist: bool = False):
+        self.name = name
+        self.persist = persist
+        self.ttl = ttl
+        self._store = store
+        self._local = _CountingTTLCache(name, maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()           # TTLCache is not thread-safe
+        self._last: Dict[str, Tuple[int, Any]] = {}     # newest entry, TTL or not
+        self._inflight: Dict[str, Tuple[int, asyncio.Future]] = {}
+
+    def lookup(self, driver: str) -> Tuple[Optional[Any], int]:
+        """``(value or None, current version)`` – pass the version back to ``put``."""
+        version = self._store.data_version(driver)
+        with self._lock:
+            hit = self._local.get(driver)
+        if hit is not None and hit[0] == version:
+            metrics.cache_event(self.name, "hit")
+            return hit[1], version
+        if self.persist:
+            value = self._store.cache_get(self.name, driver, version, self.ttl)
+            if value is not None:
+                with self._lock:
+                    self._local[driver] = (version, value)
+                metrics.cache_event(self.name, "shared_hit")
+                return value, version
+        metrics.cache_event(self.name, "miss")
+        return None, version
+
+    def put(self, driver: str, value: Any, version: int) -> None:
+        """Store ``value`` computed from data at ``version`` (read *before* computing)."""
+        with self._lock:
+            self._local[driver] = (version, value)
+            self._last[driver] = (version, value)
+        if self.persist:
+            self._store.cache_put(self.name, driver, version, value)
+
+    async def alookup(self, driver: str) -> Tuple[Optional[Any], int]:
+        """``lookup`` from a worker thread – it reads SQLite."""
+        return await asyncio.to_thread(self.lookup, driver)
+
+    async def aput(self, driver: str, value: Any, version: int) -> None:
+        if self.persist:
+            await asyncio.to_thread(self.put, driver, value, version)
+        else:
+            self.put(driver, value, version)
+
+    def pop(self, driver: str, default=None):
+        with self._lock:
+            self._last.pop(driver, None)
+            return self._local.pop(driver, default)
+
+    # ─── single-flight loading ─────────────────────────────────
+    async def get(self, driver: str, load: Callable[[], Awaitable[Any]],
+                  stale_ok: bool = False) -> Tuple[Any, int]:
+        """``(value, version it was computed at)``, loading it on a miss."""
+        value, version = await self.alookup(driver)
+        if value is not None:
+            return value, version
+        with self._lock:
+            last = self._last.get(driver)
+        if last is not None and last[0] == version:
+            # only the TTL ran out; the data has not changed
+            await self.aput(driver, last[1], version)
+            metrics.cache_event(self.name, "revived")
+            return last[1], version
+        inflight = self._inflight.get(driver)
+        # a load that started before the latest write would miss it
+        if inflight is None or inflight[0] < version:
+            task = asyncio.ensure_future(self._load(driver, load, version))
+            task.add_done_callback(lambda t: self._loaded(driver, t))
+            inflight = self._inflight[driver] = (version, task)
+        else:
+            metrics.cache_event(self.name, "joined")
+        if stale_ok and last is not None:
+            metrics.cache_event(self.name, "stale")
+            return last[1], last[0]
+        return await asyncio.shield(inflight[1])
+
+    async def _load(self, driver: str, load: Callable[[], Awaitable[Any]],
+                    version: int) -> Tuple[Any, int]:
+        value = await load()
+        await self.aput(driver, value, version)
+        return value, version
+
+    def _loaded(self, driver: str, task: asyncio.Future) -> None:
+        if self._inflight.get(driver, (0, None))[1] is task:
+            del self._inflight[driver]
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("%s cache: load for %s failed: %r", self.name, driver, task.exception())
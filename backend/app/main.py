@@ -6,29 +6,39 @@ delivery-app FastAPI backend
 ✓ Driver-fee calculation + Payout roll-up
 ✓ Order & payout queries for the mobile / web app
 ✓ Status update incl. “Returned” handling
-✓ Daily archive of yesterday’s rows
+✓ Archive of old, settled rows into archive tabs (+ local compressed segments)
+✓ Local SQLite order store; Google Sheets mirrored in the background
 
 Déployé sur Render via the Dockerfile you created earlier.
 """
 from dotenv import load_dotenv
 load_dotenv()
-import base64, json, os
+import asyncio, base64, contextlib, json, logging, os, threading, time
 import datetime as dt
-from typing import List, Optional
-from datetime import timezone          
-import requests
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
+from typing import List, Optional, Tuple
+from datetime import timezone
+from fastapi import BackgroundTasks, FastAPI, Form, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Request, Form
-from cachetools import TTLCache
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
-from pydantic import BaseModel
-from starlette.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
 import gspread
 from google.oauth2.service_account import Credentials
 
+from .analytics import GROUP_KEYS, OrderFrame
+from .archive import SegmentStore
+from . import metrics
+from .cache import SharedCache
+from .mirror import SheetMirror
+from .records import OrderRecord, OrderSnapshot, PayoutRecord, safe_float
+from .quota import ADMIN, BACKGROUND, RETRYABLE_STATUS, ScheduledHTTPClient, priority
+from .sheets_async import AsyncSheetsClient, SheetsError, a1
+from .shopify import ShopifyClient, slim_order
+from .store import OrderStore
+from .worksheets import Workbook
+
 # ---   Google secret handling  ---------------------------------
 cred_b64 = os.getenv("GOOGLE_CREDENTIALS_B64", "")
 if not cred_b64:
@@ -38,12 +48,14 @@ cred_json      = base64.b64decode(cred_b64).decode("utf-8")
 creds_dict     = json.loads(cred_json)
 SCOPES         = ["https://www.googleapis.com/auth/spreadsheets"]
 credentials    = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-gc             = gspread.authorize(credentials)
 
 spreadsheet_id = os.getenv("SPREADSHEET_ID")
 if not spreadsheet_id:
     raise RuntimeError("Missing SPREADSHEET_ID env-var")
-ss = gc.open_by_key(spreadsheet_id)
+# authorised and opened on first use, not at import
+workbook = Workbook(
+    lambda: gspread.authorize(credentials, http_client=ScheduledHTTPClient), spreadsheet_id
+)
 
 # ───────────────────────────────────────────────────────────────
 # CONFIGURATION  ––––– edit via env-vars in Render dashboard
@@ -55,18 +67,41 @@ SHOPIFY_STORES = [
         "api_key": os.getenv("IRRAKIDS_API_KEY", ""),
         "password": os.getenv("IRRAKIDS_PASSWORD", ""),
         "domain": "nouralibas.myshopify.com",
+        "timeout": float(os.getenv("IRRAKIDS_TIMEOUT", "10")),
+        "webhook_secret": os.getenv("IRRAKIDS_WEBHOOK_SECRET", ""),
     },
     {
         "name": "irranova",
         "api_key": os.getenv("IRRANOVA_API_KEY", ""),
         "password": os.getenv("IRRANOVA_PASSWORD", ""),
         "domain": "fdd92b-2e.myshopify.com",
+        "timeout": float(os.getenv("IRRANOVA_TIMEOUT", "10")),
+        "webhook_secret": os.getenv("IRRANOVA_WEBHOOK_SECRET", ""),
     },
 ]
 
-# Sheet configuration (default names can be overridden via env vars)
-SHEET_NAME = os.getenv("SHEET_NAME")
-DELIVERY_GUY_NAME = os.getenv("DELIVERY_GUY_NAME", "delivery")
+# pooled keep-alive clients, queried concurrently on a cache miss in /scan
+shopify = ShopifyClient(SHOPIFY_STORES)
+
+# only orders created in the last SCAN_WINDOW_DAYS can be dispatched
+SCAN_WINDOW_DAYS = 50
+# most barcodes accepted by one /scan/batch call
+SCAN_BATCH_MAX = 300
+# responses smaller than this many bytes are sent uncompressed
+GZIP_MIN_SIZE = 1024
+# seconds between background Shopify order syncs (0 disables)
+SHOPIFY_SYNC_INTERVAL = int(os.getenv("SHOPIFY_SYNC_INTERVAL", "300"))
+# seconds between pulls of rows added to the driver tabs by hand (0 disables)
+SHEET_SYNC_INTERVAL = int(os.getenv("SHEET_SYNC_INTERVAL", "60"))
+# seconds between re-checks of cached worksheet headers (0 disables)
+HEADER_CHECK_INTERVAL = int(os.getenv("HEADER_CHECK_INTERVAL", "600"))
+# log one line per request with its latency and external calls (1 enables)
+TRACE_REQUESTS = os.getenv("TRACE_REQUESTS", "0") == "1"
+
+# settled rows older than this many days move off the driver tabs
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# an archive run renews its lease this often (÷3) and loses it after this long
+ARCHIVE_LEASE_SECONDS = 60
 
 DELIVERY_STATUSES   = [
     "Dispatched", "Livré", "En cours",
@@ -80,33 +115,34 @@ EXCHANGE_DELIVERY_FEE = 10
 # Employee log configuration
 EMPLOYEE_TAB = os.getenv("EMPLOYEE_TAB", "Employee_Log")
 
+log = logging.getLogger(__name__)
+trace_log = logging.getLogger(__name__ + ".trace")
+if TRACE_REQUESTS:
+    trace_log.setLevel(logging.INFO)
+    trace_log.addHandler(logging.StreamHandler())
+    trace_log.propagate = False
 
-# Cache for opened worksheets to avoid repeated API calls
-sheet_cache = TTLCache(maxsize=32, ttl=300)
-
+# Local order store (SQLite, shared by all workers on the instance).  Only one
+# instance is supported; point DATA_DIR at a persistent volume to keep the
+# mirror journal across restarts
+DATA_DIR = os.getenv("DATA_DIR", "/tmp/delivery-data")
+ORDER_STORE_PATH = os.getenv("ORDER_STORE_PATH", os.path.join(DATA_DIR, "orders.sqlite3"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(DATA_DIR, "archive"))
 
 
 def _get_or_create_sheet(sheet_name: str, header: List[str]) -> gspread.Worksheet:
-    # return cached worksheet if available
-    ws = sheet_cache.get(sheet_name)
-    if ws is None:
-        try:
-            ws = ss.worksheet(sheet_name)
-        except gspread.WorksheetNotFound:
-            ws = ss.add_worksheet(title=sheet_name, rows="1", cols=str(len(header)))
-            ws.append_row(header)
-        sheet_cache[sheet_name] = ws
+    # handle and header are checked once per process, then served from memory
+    return workbook.worksheet(sheet_name, header)
 
-    existing_header = ws.row_values(1)
-    if existing_header != header:
-        # extend or update header to match expected columns
-        for idx, val in enumerate(header, start=1):
-            if idx > len(existing_header) or existing_header[idx-1] != val:
-                ws.update_cell(1, idx, val)
-        # refresh cache entry after header update
-        sheet_cache[sheet_name] = ws
 
-    return ws
+# Authoritative local copy of the driver tabs + background writer to Sheets
+order_store = OrderStore(ORDER_STORE_PATH, SegmentStore(ARCHIVE_DIR))
+mirror = SheetMirror(_get_or_create_sheet, os.path.join(DATA_DIR, "journal"),
+                     layout=order_store.sheet_generation)
+# non-blocking Sheets reads for the request path
+sheets = AsyncSheetsClient(credentials, spreadsheet_id)
+metrics.registry.gauge("sheet_mirror_pending", "Sheet writes journaled but not yet sent.",
+                       mirror.pending)
 
 
 # ───────────────────────────────────────────────────────────────
@@ -116,6 +152,9 @@ def _get_or_create_sheet(sheet_name: str, header: List[str]) -> gspread.Workshee
 class ScanIn(BaseModel):
     barcode: str
 
+class BatchScanIn(BaseModel):
+    barcodes: List[str] = Field(..., max_length=SCAN_BATCH_MAX)
+
 class ScanResult(BaseModel):
     result: str
     order: str
@@ -159,33 +198,41 @@ DRIVERS = {
     "abderrehman": {
         "sheet_id": spreadsheet_id,
         "order_tab": "abderrehman_Orders",
-        "payouts_tab": "abderrehman_Payouts"
+        "payouts_tab": "abderrehman_Payouts",
+        "order_archive_tab": "abderrehman_Orders_Archive",
+        "payouts_archive_tab": "abderrehman_Payouts_Archive"
     },
     "anouar": {
         "sheet_id": spreadsheet_id,
         "order_tab": "anouar_Orders",
-        "payouts_tab": "anouar_Payouts"
+        "payouts_tab": "anouar_Payouts",
+        "order_archive_tab": "anouar_Orders_Archive",
+        "payouts_archive_tab": "anouar_Payouts_Archive"
     },
     "mohammed": {
         "sheet_id": spreadsheet_id,
         "order_tab": "mohammed_Orders",
-        "payouts_tab": "mohammed_Payouts"
+        "payouts_tab": "mohammed_Payouts",
+        "order_archive_tab": "mohammed_Orders_Archive",
+        "payouts_archive_tab": "mohammed_Payouts_Archive"
     },
     "nizar": {
         "sheet_id": spreadsheet_id,
         "order_tab": "nizar_Orders",
-        "payouts_tab": "nizar_Payouts"
+        "payouts_tab": "nizar_Payouts",
+        "order_archive_tab": "nizar_Orders_Archive",
+        "payouts_archive_tab": "nizar_Payouts_Archive"
     },
 }
 
 # Simple admin password (override via env var)
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
 
-# In-memory caches for orders and payouts
-# shorter TTLs for near real-time updates
-orders_cache = TTLCache(maxsize=8, ttl=60)
-payouts_cache = TTLCache(maxsize=8, ttl=60)
-orders_data_cache = TTLCache(maxsize=8, ttl=60)
+# Per-driver caches, stamped with the driver's data version in the shared
+# store: a write in any worker invalidates the copies in every worker.
+orders_cache = SharedCache("orders", order_store, maxsize=8, ttl=60, persist=True)
+payouts_cache = SharedCache("payouts", order_store, maxsize=8, ttl=60, persist=True)
+orders_data_cache = SharedCache("orders_data", order_store, maxsize=8, ttl=60)
 
 @app.get("/", response_class=HTMLResponse)
 async def show_login():
@@ -211,7 +258,7 @@ async def admin_login(password: str = Form(...)):
     raise HTTPException(status_code=401, detail="Invalid admin password")
 
 @app.get("/drivers")
-def list_drivers():
+async def list_drivers():
     """Return list of driver IDs."""
     return list(DRIVERS.keys())
 
@@ -225,6 +272,88 @@ app.add_middleware(
 )
 
 
+class SheetsPriorityMiddleware:
+    """Admin pages and maintenance jobs queue behind drivers for Sheets quota."""
+
+    LEVELS = (("/admin", ADMIN), ("/archive", BACKGROUND))
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        level = next((lvl for prefix, lvl in self.LEVELS if path.startswith(prefix)), None)
+        if level is None:
+            return await self.app(scope, receive, send)
+        with priority(level):
+            return await self.app(scope, receive, send)
+
+
+app.add_middleware(SheetsPriorityMiddleware)
+
+
+class CompressionMiddleware:
+    """GZip for full JSON payloads; ``/events`` must stream unbuffered."""
+
+    def __init__(self, app):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=GZIP_MIN_SIZE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/events":
+            return await self.app(scope, receive, send)
+        return await self.gzip(scope, receive, send)
+
+
+app.add_middleware(CompressionMiddleware)
+
+
+class MetricsMiddleware:
+    """Per-route latency and external calls for ``/metrics`` (outermost)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with metrics.trace() as calls:
+            try:
+                await self.app(scope, receive, send_status)
+            finally:
+                elapsed = time.perf_counter() - started
+                # the matched template, so /payout/mark-paid/{payout_id} is one series
+                route = getattr(scope.get("route"), "path", "unmatched")
+                metrics.REQUEST_SECONDS.observe(elapsed, route, scope["method"], status)
+                for service, n in calls.items():
+                    metrics.ROUTE_EXTERNAL_CALLS.inc(route, service, amount=n)
+                if TRACE_REQUESTS:
+                    trace_log.info("%s %s %s %.1fms sheets=%d shopify=%d", scope["method"],
+                                   scope["path"], status, elapsed * 1000,
+                                   calls["sheets"], calls["shopify"])
+
+
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(SheetsError)
+async def sheets_busy(request: Request, exc: SheetsError):
+    # quota / outage that outlasted the retries: tell the client to come back
+    if exc.status_code in RETRYABLE_STATUS:
+        return JSONResponse(status_code=503, headers={"Retry-After": "30"},
+                            content={"detail": "Google Sheets is busy, try again shortly"})
+    return JSONResponse(status_code=502, content={"detail": f"Google Sheets: {exc.message}"})
+
+
 # ───────────────────────────────────────────────────────────────
 # Utility functions – exact ports of your Apps Script logic
 # ───────────────────────────────────────────────────────────────
@@ -251,45 +380,58 @@ def get_primary_display_tag(tags: str) -> str:
     return ""
 
 
-def safe_float(val):
-    """Return a float or 0.0 for falsy/non-numeric values."""
-    try:
-        return float(val)
-    except (TypeError, ValueError):
-        return 0.0
-
-
 def get_cell(row, idx, default=""):
     """Safely access a cell from a row, providing a default if missing."""
     return row[idx] if idx < len(row) else default
 
 
-def parse_timestamp(val: str) -> dt.datetime:
-    """Parse timestamp strings with optional microseconds and timezone."""
-    val = (val or "").strip()
-    parts = val.split()
-    if len(parts) > 2 and parts[-1].isalpha():
-        val = " ".join(parts[:-1])
-    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+def shopify_time(value: str) -> dt.datetime:
+    """Shopify timestamp (shop-local offset, or ``Z``) as an aware datetime."""
+    return dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+async def sync_shopify_orders() -> dict:
+    """Pull orders updated since the last sync from every store into the cache."""
+    now = dt.datetime.now(timezone.utc)
+    window_start = (now - dt.timedelta(days=SCAN_WINDOW_DAYS)).isoformat()
+    synced = {}
+    for st in shopify.stores:
+        since = await asyncio.to_thread(order_store.shopify_cursor, st.name) or window_start
+        # compared as instants: the shop's offset (and DST) differ from ours
+        latest, batch, count = shopify_time(since), [], 0
         try:
-            return dt.datetime.strptime(val, fmt)
-        except ValueError:
+            async for order in st.aupdated_orders(since):
+                batch.append(slim_order(order))
+                if order.get("updated_at"):
+                    latest = max(latest, shopify_time(order["updated_at"]))
+                if len(batch) >= 250:
+                    await asyncio.to_thread(order_store.put_shopify_orders, st.name, batch)
+                    count += len(batch)
+                    batch = []
+        except Exception:
+            log.exception("shopify sync failed for %s", st.name)
+            synced[st.name] = None
             continue
-    return dt.datetime.fromisoformat(val)
+        finally:
+            if batch:
+                await asyncio.to_thread(order_store.put_shopify_orders, st.name, batch)
+                count += len(batch)
+        await asyncio.to_thread(order_store.set_shopify_cursor, st.name, latest.isoformat())
+        synced[st.name] = count
+    # keep a little history beyond the scan window
+    await asyncio.to_thread(
+        order_store.prune_shopify_orders,
+        (now - dt.timedelta(days=SCAN_WINDOW_DAYS + 10)).isoformat(),
+    )
+    return synced
 
 
-def get_order_from_store(order_name: str, store_cfg: dict) -> Optional[dict]:
-    """Call Shopify Admin API by order name (#1234)."""
-    auth = (store_cfg["api_key"], store_cfg["password"])
-    url = f"https://{store_cfg['domain']}/admin/api/2023-07/orders.json"
-    params = {"name": order_name}
-    r = requests.get(url, auth=auth, params=params, timeout=10)
-    try:
-        r.raise_for_status()
-    except requests.HTTPError:
-        return None
-    data = r.json()
-    return data.get("orders", [{}])[0] if data.get("orders") else None
+async def _shopify_sync_loop() -> None:
+    while True:
+        # every worker runs this loop; the store lets one of them sync
+        if await asyncio.to_thread(order_store.claim, "shopify-sync", SHOPIFY_SYNC_INTERVAL):
+            await sync_shopify_orders()
+        await asyncio.sleep(SHOPIFY_SYNC_INTERVAL / 4)
 
 
 # ───────────────────────────────────────────────────────────────
@@ -312,158 +454,264 @@ EMPLOYEE_HEADER = [
 ]
 
 
-def order_exists(ws: gspread.Worksheet, order_name: str) -> bool:
-    col = ws.col_values(2)  # column B
-    return order_name in col
+_load_locks: dict[str, asyncio.Lock] = {}
 
 
-def get_order_row(ws: gspread.Worksheet, order_name: str) -> Optional[List]:
-    data = ws.get_all_values()
-    for row in data[1:]:
-        if row[1] == order_name:
-            return row
-    return None
+async def _ensure_loaded(driver: str) -> None:
+    """Seed the local store from the driver's tabs on first use."""
+    if driver not in DRIVERS:
+        raise HTTPException(status_code=400, detail="Invalid driver")
+    if not await asyncio.to_thread(order_store.is_loaded, driver):
+        await _ensure_all_loaded([driver])
 
 
-def add_to_payout(ws_orders: gspread.Worksheet, payout_ws: gspread.Worksheet,
-                  order_name: str, cash_amount: float, driver_fee: float) -> str:
-    """Create (or extend) an open payout row and write payout ID back to orders sheet."""
-    data = payout_ws.get_all_values()
-    open_row_idx = None
-    open_payout_id = None
-    # search from bottom up
-    for idx in range(len(data) - 1, 0, -1):
-        if data[idx][6].lower() != "paid":      # status column
-            open_row_idx = idx
-            open_payout_id = data[idx][0]
-            break
-
-    if open_row_idx is None:
-        # create new payout
-        now = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        payout_id = f"PO-{dt.datetime.now().strftime('%Y%m%d-%H%M')}"
-        new_row = [
-            payout_id, now, order_name,
-            cash_amount, driver_fee,
-            cash_amount - driver_fee,
-            "pending", ""
-        ]
-        payout_ws.append_row(new_row)
-    else:
-        # update existing payout line
-        orders_cell = payout_ws.cell(open_row_idx + 1, 3)  # 1-based API
-        cash_cell = payout_ws.cell(open_row_idx + 1, 4)
-        fee_cell = payout_ws.cell(open_row_idx + 1, 5)
-        payout_cell = payout_ws.cell(open_row_idx + 1, 6)
-
-        orders_cell.value = f"{orders_cell.value}, {order_name}" if orders_cell.value else order_name
-        cash_total = float(cash_cell.value or 0) + cash_amount
-        fee_total = float(fee_cell.value or 0) + driver_fee
-        payout_total = cash_total - fee_total
-
-        cash_cell.value = cash_total
-        fee_cell.value = fee_total
-        payout_cell.value = payout_total
-        payout_ws.update_cells([orders_cell, cash_cell, fee_cell, payout_cell])
-
-        payout_id = open_payout_id
-
-    # write back to orders sheet
-    order_cells = ws_orders.findall(order_name)
-    if order_cells:
-        row_idx = order_cells[0].row
-        ws_orders.update_cell(row_idx, 16, payout_id)
-
-    return payout_id
-
-
-def remove_from_payout(ws_orders: gspread.Worksheet, payout_ws: gspread.Worksheet,
-                       payout_id: str, order_name: str,
-                       cash_amount: float, driver_fee: float) -> None:
-    """Remove an order from an existing payout line."""
-    if not payout_id:
-        return
-    cells = payout_ws.findall(payout_id)
-    if not cells:
-        return
-    row_idx = cells[0].row
-    row = payout_ws.row_values(row_idx)
+def _cold(drivers) -> List[str]:
+    return [d for d in drivers if not order_store.is_loaded(d)]
 
-    orders_list = [o.strip() for o in (row[2] or "").split(',') if o.strip()]
-    if order_name not in orders_list:
+
+async def _ensure_all_loaded(drivers=DRIVERS) -> None:
+    """Seed every driver in ``drivers`` that is not loaded yet.
+
+    All their order and payout tabs are read with one batchGet, so a cold
+    admin page costs one round trip however many drivers there are.
+    Store reads and writes run in a thread: seeding a 100k-row tab takes
+    seconds, which the event loop spends serving other requests."""
+    cold = await asyncio.to_thread(_cold, drivers)
+    if not cold:
         return
-    orders_list.remove(order_name)
+    # same lock order everywhere, so overlapping calls cannot deadlock
+    locks = [_load_locks.setdefault(d, asyncio.Lock()) for d in sorted(cold)]
+    async with contextlib.AsyncExitStack() as stack:
+        for lock in locks:
+            await stack.enter_async_context(lock)
+        cold = await asyncio.to_thread(_cold, cold)
+        if not cold:
+            return
+        # an empty archive means a fresh data directory: restore it from the archive tabs
+        restore = await asyncio.to_thread(
+            lambda: {d for d in cold if not order_store.has_archive(d)})
+        ranges = []
+        for d in cold:
+            ranges += [a1(DRIVERS[d]["order_tab"], "A1:R"), a1(DRIVERS[d]["payouts_tab"], "A1:H")]
+        for d in cold:
+            if d in restore:
+                ranges += [a1(DRIVERS[d]["order_archive_tab"], "A2:R"),
+                           a1(DRIVERS[d]["payouts_archive_tab"], "A2:H")]
+        try:
+            values = await sheets.values_batch_get(ranges)
+        except SheetsError as exc:
+            if exc.status_code != 400:
+                raise
+            # a tab does not exist yet – create the missing ones with their header
+            await asyncio.to_thread(lambda: [_tabs_for(d, archive=True) for d in cold])
+            values = await sheets.values_batch_get(ranges)
+        await asyncio.to_thread(_seed, cold, restore, values)
+
+
+def _seed(cold: List[str], restore: set, values: List[List[List[str]]]) -> None:
+    """Load the store from ``_ensure_all_loaded``'s batchGet result."""
+    archived = iter(values[2 * len(cold):])
+    for n, driver in enumerate(cold):
+        cfg = DRIVERS[driver]
+        order_values, payout_values = values[2 * n], values[2 * n + 1]
+        old_orders, old_payouts = (next(archived), next(archived)) if driver in restore else ([], [])
+        if order_store.load(driver, order_values[1:], payout_values[1:], old_orders, old_payouts):
+            order_store.set_sheet_rows(cfg["order_tab"], len(order_values))
+            order_store.set_sheet_rows(cfg["payouts_tab"], len(payout_values))
+        mirror.index_tab(cfg["order_tab"], 2, order_values)
+        mirror.index_tab(cfg["payouts_tab"], 1, payout_values)
+
+
+def sync_sheet_deltas() -> dict:
+    """Import rows added to the driver tabs directly in Google Sheets.
+
+    Only rows below each tab's last known row count are read, with one
+    batchGet for every loaded tab, so a pass costs as much as the recent
+    activity rather than the tab size.  Rows written through the API are
+    already in the store and are skipped by key."""
+    tabs = []
+    for driver, cfg in DRIVERS.items():
+        for tab, last_col, merge in (
+            (cfg["order_tab"], "R", order_store.merge_orders),
+            (cfg["payouts_tab"], "H", order_store.merge_payouts),
+        ):
+            known = order_store.sheet_rows(tab)
+            if known is not None:
+                tabs.append((driver, tab, known, merge, a1(tab, f"A{known + 1}:{last_col}")))
+    if not tabs:
+        return {}
+    resp = workbook.spreadsheet.values_batch_get([t[4] for t in tabs])
+    imported = {}
+    for (driver, tab, known, merge, _), vr in zip(tabs, resp.get("valueRanges", [])):
+        rows = vr.get("values", [])
+        if not rows:
+            continue
+        imported[tab] = merge(driver, rows)
+        # a reload since we read ``known`` has recorded a fresh count – keep it
+        order_store.set_sheet_rows(tab, known + len(rows), expected=known)
+    return imported
 
-    cash_total = safe_float(get_cell(row, 3)) - cash_amount
-    fee_total = safe_float(get_cell(row, 4)) - driver_fee
-    payout_total = cash_total - fee_total
 
-    payout_ws.update("C{}:F{}".format(row_idx, row_idx),
-                     [[", ".join(orders_list), cash_total, fee_total, payout_total]])
+def _sheet_sync_loop() -> None:
+    while True:
+        time.sleep(SHEET_SYNC_INTERVAL)
+        if not order_store.claim("sheet-sync", SHEET_SYNC_INTERVAL):
+            continue
+        try:
+            with priority(BACKGROUND):
+                imported = sync_sheet_deltas()
+        except Exception:
+            log.exception("sheet delta sync failed")
+            continue
+        for tab, added in imported.items():
+            if added:
+                log.info("sheet delta sync: %d new rows from %s", added, tab)
+
+
+def _header_check_loop() -> None:
+    while True:
+        time.sleep(HEADER_CHECK_INTERVAL)
+        try:
+            with priority(BACKGROUND):
+                fixed = workbook.revalidate()
+        except Exception:
+            log.exception("worksheet header check failed")
+            continue
+        if fixed:
+            log.warning("worksheet header check: repaired %d headers", fixed)
+
+
+def order_exists(driver: str, order_name: str) -> bool:
+    return order_store.find_order(driver, order_name) is not None
+
 
-    # clear payout ID from order row
-    order_cells = ws_orders.findall(order_name)
-    if order_cells:
-        ws_orders.update_cell(order_cells[0].row, 16, "")
+def get_order_row(driver: str, order_name: str) -> Optional[List]:
+    return order_store.find_order(driver, order_name)
+
+
+def _update_order(driver: str, order_name: str, changes: dict,
+                  credit: Optional[Tuple[float, float]] = None,
+                  debit: Optional[Tuple[float, float]] = None) -> Optional[List]:
+    """Write ``{column index: value}`` to the store and queue it for Sheets.
+
+    ``credit`` / ``debit`` (``(cash, fee)``) add the order to the open
+    payout or take it out of its payout in the same store transaction."""
+    done = order_store.update_order(driver, order_name, changes, credit, debit)
+    if done is None:
+        return None
+    row, payout, created = done
+    cfg = DRIVERS[driver]
+    if payout is not None:
+        if created:
+            mirror.append(cfg["payouts_tab"], PAYOUT_HEADER, payout)
+        else:
+            mirror.update(cfg["payouts_tab"], PAYOUT_HEADER, 1, payout[0],
+                          {i: payout[i] for i in (2, 3, 4, 5)})
+        # the store already carries the payout ID on the order row
+        changes = {**changes, 15: row[15]}
+    mirror.update(cfg["order_tab"], ORDER_HEADER, 2, order_name, changes)
+    return row
 
 
 # ───────────────────────────────────────────────────────────────
 # FastAPI ROUTES
 # ───────────────────────────────────────────────────────────────
-def _tabs_for(driver_id: str):
+def _tabs_for(driver_id: str, archive: bool = False):
     cfg = DRIVERS.get(driver_id)
     if not cfg:
         raise HTTPException(status_code=400, detail="Invalid driver")
+    if archive:
+        _get_or_create_sheet(cfg["order_archive_tab"], ORDER_HEADER)
+        _get_or_create_sheet(cfg["payouts_archive_tab"], PAYOUT_HEADER)
     return (
         _get_or_create_sheet(cfg["order_tab"],  ORDER_HEADER),
         _get_or_create_sheet(cfg["payouts_tab"], PAYOUT_HEADER)
     )
 
+
+async def _orders(driver: str, stale_ok: bool = False) -> Tuple[OrderSnapshot, int]:
+    """``(order snapshot, data version)`` for ``driver``, cached per driver.
+
+    One read per driver is in flight at a time; ``stale_ok`` callers get
+    the previous snapshot (and its version) while it runs."""
+    await _ensure_loaded(driver)
+    return await orders_data_cache.get(
+        driver, lambda: asyncio.to_thread(lambda: OrderSnapshot(order_store.order_rows(driver))),
+        stale_ok=stale_ok,
+    )
+
+
+def _find_record(driver: str, name: str) -> Optional[OrderRecord]:
+    row = order_store.find_order(driver, name)
+    return OrderRecord(row) if row is not None else None
+
+
+# background tasks on this worker's event loop (referenced so they are not collected)
+_tasks: dict = {"shopify_sync": None}
+
+
+@app.on_event("startup")
+async def start_sheet_mirror():
+    # replays anything a previous worker journaled but never wrote
+    await asyncio.to_thread(mirror.start)
+    if SHOPIFY_SYNC_INTERVAL > 0:
+        # on the event loop: the sync shares the request path's async Shopify clients
+        _tasks["shopify_sync"] = asyncio.create_task(_shopify_sync_loop())
+    if SHEET_SYNC_INTERVAL > 0:
+        threading.Thread(target=_sheet_sync_loop, name="sheet-sync", daemon=True).start()
+    if HEADER_CHECK_INTERVAL > 0:
+        threading.Thread(target=_header_check_loop, name="header-check", daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    if _tasks["shopify_sync"] is not None:
+        _tasks["shopify_sync"].cancel()
+    await shopify.aclose()
+    await sheets.aclose()
+
+
 @app.get("/health", tags=["meta"])
-def health():
+async def health():
     return {"status": "ok", "time": dt.datetime.utcnow().isoformat()}
 
+
+@app.get("/metrics", tags=["meta"], include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text format; numbers are per worker process."""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # -------------------------------  SCAN  -------------------------------
-@app.post("/scan", response_model=ScanResult, tags=["orders"])
-def scan(
-    payload: ScanIn,
-    driver: str = Query(..., description="driver1 / driver2 / …")
-):
-    ws_orders, _ = _tabs_for(driver)
-    barcode = payload.barcode.strip()
-    order_number = "#" + "".join(filter(str.isdigit, barcode))
+def _order_number(barcode: str) -> str:
+    return "#" + "".join(filter(str.isdigit, barcode.strip()))
 
-    if len(order_number) <= 1:
-        raise HTTPException(status_code=400, detail="Invalid barcode")
 
-    # already scanned?
-    if order_exists(ws_orders, order_number):
-        existing = get_order_row(ws_orders, order_number)
-        return ScanResult(
-            result="⚠️ Already scanned",
-            order=order_number,
-            tag=get_primary_display_tag(existing[5]),
-            deliveryStatus=existing[9],
-        )
+def _already_scanned(order_number: str, row: List[str]) -> ScanResult:
+    return ScanResult(
+        result="⚠️ Already scanned",
+        order=order_number,
+        tag=get_primary_display_tag(row[5]),
+        deliveryStatus=row[9],
+    )
+
 
-    # --- Shopify look-up (unchanged) ----------------------------------
-    window_start = dt.datetime.now(timezone.utc) - dt.timedelta(days=50)
+def _choose_order(candidates):
+    """Newest of the stores' matches created inside the scan window."""
+    window_start = dt.datetime.now(timezone.utc) - dt.timedelta(days=SCAN_WINDOW_DAYS)
     chosen_order, chosen_store_name = None, ""
-    for store in SHOPIFY_STORES:
-        order = get_order_from_store(order_number, store)
+    for store_name, order in candidates:
         if order:
-            created_at = dt.datetime.fromisoformat(
-                order["created_at"].replace("Z", "+00:00")
-            )
+            created_at = shopify_time(order["created_at"])
             if created_at >= window_start and (
-                not chosen_order
-                or created_at > dt.datetime.fromisoformat(
-                    chosen_order["created_at"].replace("Z", "+00:00")
-                )
+                not chosen_order or created_at > shopify_time(chosen_order["created_at"])
             ):
-                chosen_order, chosen_store_name = order, store["name"]
+                chosen_order, chosen_store_name = order, store_name
+    return chosen_order, chosen_store_name
 
-    # --- sheet append (same logic, but to the driver tab) -------------
+
+def _scan_row(order_number: str, chosen_order: Optional[dict],
+              chosen_store_name: str) -> tuple:
+    """``(new driver-tab row, ScanResult)`` for a freshly scanned order."""
     tags = chosen_order.get("tags", "") if chosen_order else ""
     fulfillment = chosen_order.get("fulfillment_status", "unfulfilled") if chosen_order else ""
     order_status = "closed" if (chosen_order and chosen_order.get("cancelled_at")) else "open"
@@ -491,83 +739,164 @@ def scan(
     scan_day = dt.datetime.now().strftime("%Y-%m-%d")
     driver_fee = calculate_driver_fee(tags)
 
-    ws_orders.append_row([
+    new_row = [
         now_ts, order_number, customer_name, phone, address, tags, fulfillment,
         order_status, chosen_store_name, "Dispatched", "", "", scan_day,
         cash_amount, driver_fee, ""
-    ])
-
-    # invalidate caches for this driver
-    orders_cache.pop(driver, None)
-    payouts_cache.pop(driver, None)
-    orders_data_cache.pop(driver, None)
-
-    return ScanResult(
+    ]
+    return new_row, ScanResult(
         result=result_msg,
         order=order_number,
         tag=get_primary_display_tag(tags),
         deliveryStatus="Dispatched",
     )
 
+
+def _cache_shopify_orders(candidates) -> None:
+    for store_name, order in candidates:
+        if order:
+            order_store.put_shopify_orders(store_name, [slim_order(order)])
+
+
+@app.post("/scan", response_model=ScanResult, tags=["orders"])
+async def scan(
+    payload: ScanIn,
+    driver: str = Query(..., description="driver1 / driver2 / …")
+):
+    await _ensure_loaded(driver)
+    order_number = _order_number(payload.barcode)
+
+    if len(order_number) <= 1:
+        raise HTTPException(status_code=400, detail="Invalid barcode")
+
+    # already scanned?
+    existing = await asyncio.to_thread(get_order_row, driver, order_number)
+    if existing is not None:
+        return _already_scanned(order_number, existing)
+
+    # --- Shopify look-up: local cache first, live API on a miss --------
+    candidates = await asyncio.to_thread(order_store.shopify_orders, order_number)
+    if not candidates:
+        candidates = await shopify.afind_order(order_number)
+        await asyncio.to_thread(_cache_shopify_orders, candidates)
+
+    # --- sheet append (same logic, but to the driver tab) -------------
+    new_row, result = _scan_row(order_number, *_choose_order(candidates))
+    await asyncio.to_thread(_append_orders, driver, [new_row])
+    return result
+
+
+def _append_orders(driver: str, rows: List[list]) -> None:
+    order_store.append_orders(driver, rows)
+    with mirror.batch():
+        for row in rows:
+            mirror.append(DRIVERS[driver]["order_tab"], ORDER_HEADER, row)
+
+
+@app.post("/scan/batch", response_model=List[ScanResult], tags=["orders"])
+async def scan_batch(
+    payload: BatchScanIn,
+    driver: str = Query(..., description="driver1 / driver2 / …")
+):
+    """Scan a whole van load: one result per barcode, in the order sent."""
+    await _ensure_loaded(driver)
+    numbers = [_order_number(b) for b in payload.barcodes]
+    # only the scanned names are read (and decoded), not the whole tab
+    existing = await asyncio.to_thread(
+        order_store.find_orders, driver, [n for n in numbers if len(n) > 1])
+
+    # one live lookup for every name the local Shopify cache does not know
+    wanted = list(dict.fromkeys(n for n in numbers if len(n) > 1 and n not in existing))
+    candidates = await asyncio.to_thread(lambda: {n: order_store.shopify_orders(n) for n in wanted})
+    missing = [n for n in wanted if not candidates[n]]
+    if missing:
+        found = await shopify.afind_orders(missing)
+        await asyncio.to_thread(lambda: [_cache_shopify_orders(c) for c in found.values()])
+        candidates.update(found)
+
+    results, new_rows = [], []
+    for barcode, number in zip(payload.barcodes, numbers):
+        if len(number) <= 1:
+            results.append(ScanResult(result="❌ Invalid barcode", order=barcode))
+        elif number in existing:
+            results.append(_already_scanned(number, existing[number]))
+        else:
+            new_row, result = _scan_row(number, *_choose_order(candidates[number]))
+            existing[number] = new_row
+            new_rows.append(new_row)
+            results.append(result)
+
+    if new_rows:
+        await asyncio.to_thread(_append_orders, driver, new_rows)
+    return results
+
 # -----------------------------  ORDERS  -------------------------------
-@app.get("/orders", tags=["orders"])
-def list_active_orders(driver: str = Query(...)):
-    if driver in orders_cache:
-        return orders_cache[driver]
-
-    data = orders_data_cache.get(driver)
-    if data is None:
-        ws_orders, _ = _tabs_for(driver)
-        data = ws_orders.get_all_values()
-        orders_data_cache[driver] = data
-    data = data[1:]  # skip header
-    active = []
-    for r in data:
-        if not r or r[9] in COMPLETED_STATUSES:
-            continue
-        active.append({
-            "timestamp":    r[0],
-            "orderName":    r[1],
-            "customerName": r[2],
-            "customerPhone":r[3],
-            "address":      r[4],
-            "tags":         r[5],
-            "deliveryStatus": r[9] or "Dispatched",
-            "notes":        r[10],
-            "scheduledTime": r[11],
-            "scanDate":     r[12],
-            "cashAmount":   safe_float(get_cell(r, 13)),
-            "driverFee":    safe_float(get_cell(r, 14)),
-            "payoutId":     r[15],
-            "statusLog":    get_cell(r, 16),
-            "commLog":      get_cell(r, 17),
-        })
-    def sort_key(o):
-        if o["scheduledTime"]:
-            try:
-                return parse_timestamp(o["scheduledTime"])
-            except Exception:
-                pass
-        return parse_timestamp(o["timestamp"])
+def _etag(version: int, window: Optional[float] = None) -> str:
+    # time-dependent payloads (``urgent``) also change with the clock window
+    return f'W/"{version}-{int(time.time() // window)}"' if window else f'W/"{version}"'
 
-    active.sort(key=sort_key)
 
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """304 when the client already has ``etag``; otherwise tag ``response``."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+async def _active_orders(driver: str) -> Tuple[list, int]:
+    cached, version = await orders_cache.alookup(driver)
+    if cached is not None:
+        return cached, version
+
+    snapshot, version = await _orders(driver)
     now = dt.datetime.now()
-    for o in active:
-        if o["scheduledTime"]:
-            try:
-                st = parse_timestamp(o["scheduledTime"])
-                o["urgent"] = (st - now).total_seconds() <= 3600
-            except Exception:
-                o["urgent"] = False
-        else:
-            o["urgent"] = False
+    records = [r for r in snapshot.records if r.status not in COMPLETED_STATUSES]
+    records.sort(key=lambda r: r.due_at)
+    active = [r.json(now) for r in records]
+
+    await orders_cache.aput(driver, active, version)
+    return active, version
+
 
-    orders_cache[driver] = active
+@app.get("/orders", tags=["orders"])
+async def list_active_orders(
+    request: Request,
+    response: Response,
+    driver: str = Query(...),
+    since: int | None = Query(None, ge=0, description="data version the client already has"),
+):
+    """Active orders; ``?since=`` returns only what changed after that version."""
+    if since is not None:
+        return await _orders_delta(driver, since)
+    await _ensure_loaded(driver)
+    version = await asyncio.to_thread(order_store.data_version, driver)
+    hit = _not_modified(request, response, _etag(version, orders_cache.ttl))
+    if hit is not None:
+        return hit
+    active, version = await _active_orders(driver)
+    response.headers["ETag"] = _etag(version, orders_cache.ttl)
     return active
 
+
+async def _orders_delta(driver: str, since: int) -> dict:
+    await _ensure_loaded(driver)
+    version, changes = await asyncio.to_thread(order_store.changes_since, driver, since)
+    if changes is None:
+        active, version = await _active_orders(driver)
+        return {"version": version, "full": True, "changed": active, "removed": []}
+    latest = {row[1]: row for kind, row in changes if kind == "order"}
+    now = dt.datetime.now()
+    return {
+        "version": version,
+        "full": False,
+        "changed": [OrderRecord(r).json(now) for r in latest.values() if r[9] not in COMPLETED_STATUSES],
+        "removed": [name for name, r in latest.items() if r[9] in COMPLETED_STATUSES],
+    }
+
 @app.put("/order/status", tags=["orders"])
-def update_order_status(
+async def update_order_status(
     payload: StatusUpdate,
     bg: BackgroundTasks,
     driver: str = Query(...)
@@ -575,135 +904,189 @@ def update_order_status(
     if payload.new_status and payload.new_status not in DELIVERY_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    ws_orders, ws_payouts = _tabs_for(driver)
-    cells = ws_orders.findall(payload.order_name)
-    if not cells:
+    await _ensure_loaded(driver)
+    if not await asyncio.to_thread(_set_status, driver, payload):
         raise HTTPException(status_code=404, detail="Order not found")
 
-    row = cells[0].row
-    row_vals = ws_orders.row_values(row)
-
-    # ensure row has at least 18 columns
-    if len(row_vals) < len(ORDER_HEADER):
-        row_vals += [""] * (len(ORDER_HEADER) - len(row_vals))
-
-    if payload.new_status:
-        ws_orders.update_cell(row, 10, payload.new_status)
-        ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        status_cell = ws_orders.cell(row, 17)
-        status_cell.value = ((status_cell.value or "") + f" | {payload.new_status} @ {ts}").strip(" |")
-        ws_orders.update_cells([status_cell])
-    if payload.note is not None:
-        ws_orders.update_cell(row, 11, payload.note)
-    if payload.scheduled_time is not None:
-        ws_orders.update_cell(row, 12, payload.scheduled_time)
-    if payload.cash_amount is not None:
-        ws_orders.update_cell(row, 14, payload.cash_amount)
-    if payload.comm_log is not None:
-        ws_orders.update_cell(row, 18, payload.comm_log)
-
-    # add or remove from payout depending on status change
-    if payload.new_status == "Livré" and row_vals[9] != "Livré":
-        driver_fee = calculate_driver_fee(row_vals[5])
-        cash_amt = payload.cash_amount or safe_float(get_cell(row_vals, 13))
-        add_to_payout(ws_orders, ws_payouts,
-                      payload.order_name, cash_amt, driver_fee)
-    elif payload.new_status and payload.new_status != "Livré" and row_vals[9] == "Livré":
-        driver_fee = safe_float(get_cell(row_vals, 14))
-        cash_amt = payload.cash_amount if payload.cash_amount is not None else safe_float(get_cell(row_vals, 13))
-        payout_id = get_cell(row_vals, 15)
-        remove_from_payout(ws_orders, ws_payouts, payout_id,
-                           payload.order_name, cash_amt, driver_fee)
-
     # clean up list if returned
     if payload.new_status == "Returned":
         pass
 
-    # invalidate caches for this driver
-    orders_cache.pop(driver, None)
-    payouts_cache.pop(driver, None)
-    orders_data_cache.pop(driver, None)
-
     return {"success": True}
 
+
+def _set_status(driver: str, payload: StatusUpdate) -> bool:
+    """Apply a status update to the store and the mirror; False if no such order."""
+    order = _find_record(driver, payload.order_name)
+    if order is None:
+        return False
+
+    # one Sheets batchUpdate for the order row and its payout row
+    with mirror.batch():
+        changes = {}
+        if payload.new_status:
+            changes[9] = payload.new_status
+            ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            changes[16] = (order.status_log + f" | {payload.new_status} @ {ts}").strip(" |")
+        if payload.note is not None:
+            changes[10] = payload.note
+        if payload.scheduled_time is not None:
+            changes[11] = payload.scheduled_time
+        if payload.cash_amount is not None:
+            changes[13] = payload.cash_amount
+        if payload.comm_log is not None:
+            changes[17] = payload.comm_log
+
+        # add or remove from payout depending on status change
+        credit = debit = None
+        if payload.new_status == "Livré" and order.status != "Livré":
+            credit = (payload.cash_amount or order.cash, calculate_driver_fee(order.tags))
+        elif payload.new_status and payload.new_status != "Livré" and order.status == "Livré":
+            cash_amt = payload.cash_amount if payload.cash_amount is not None else order.cash
+            debit = (cash_amt, order.fee)
+        _update_order(driver, payload.order_name, changes, credit, debit)
+    return True
+
 # ----------------------------  PAYOUTS  -------------------------------
-@app.get("/payouts", tags=["payouts"])
-def get_payouts(driver: str = Query(...)):
-    if driver in payouts_cache:
-        return payouts_cache[driver]
-
-    ws_orders, ws_payouts = _tabs_for(driver)
-    # Fetch orders sheet once and build a lookup dictionary
-    orders_data = orders_data_cache.get(driver)
-    if orders_data is None:
-        orders_data = ws_orders.get_all_values()
-        orders_data_cache[driver] = orders_data
-    order_lookup = {row[1]: row for row in orders_data[1:]}
-
-    rows = ws_payouts.get_all_values()[1:]
-    payouts = []
-    for r in reversed(rows):
-        orders_list = [o.strip() for o in (r[2] or "").split(',') if o.strip()]
-        order_details = []
-        for name in orders_list:
-            row = order_lookup.get(name)
-            if row:
-                order_details.append({
-                    "name": name,
-                    "cashAmount": safe_float(get_cell(row, 13)),
-                    "driverFee": safe_float(get_cell(row, 14))
-                })
-            else:
-                order_details.append({"name": name, "cashAmount": 0.0, "driverFee": 0.0})
-
-        payouts.append({
-            "payoutId":   r[0],
-            "dateCreated":r[1],
-            "orders":     r[2],
-            "totalCash":  float(r[3] or 0),
-            "totalFees":  float(r[4] or 0),
-            "totalPayout":float(r[5] or 0),
-            "status":     r[6] or "pending",
-            "datePaid":   r[7],
-            "orderDetails": order_details
-        })
+async def _all_payouts(driver: str) -> Tuple[list, int]:
+    cached, version = await payouts_cache.alookup(driver)
+    if cached is not None:
+        return cached, version
+
+    # Fetch orders once and build a lookup dictionary; order details may
+    # lag one write behind, the payload is then cached under that version
+    snapshot, version = await _orders(driver, stale_ok=True)
+    rows = await asyncio.to_thread(order_store.payout_rows, driver)
+    payouts = [PayoutRecord(r).json(snapshot.by_name.get) for r in reversed(rows)]
+
+    await payouts_cache.aput(driver, payouts, version)
+    return payouts, version
 
-    payouts_cache[driver] = payouts
+
+@app.get("/payouts", tags=["payouts"])
+async def get_payouts(
+    request: Request,
+    response: Response,
+    driver: str = Query(...),
+    since: int | None = Query(None, ge=0, description="data version the client already has"),
+):
+    """All payouts, newest first; ``?since=`` returns only the changed ones."""
+    await _ensure_loaded(driver)
+    if since is not None:
+        delta = await asyncio.to_thread(_payouts_delta, driver, since)
+        if delta is None:
+            payouts, version = await _all_payouts(driver)
+            return {"version": version, "full": True, "changed": payouts}
+        return delta
+    version = await asyncio.to_thread(order_store.data_version, driver)
+    hit = _not_modified(request, response, _etag(version))
+    if hit is not None:
+        return hit
+    payouts, version = await _all_payouts(driver)
+    response.headers["ETag"] = _etag(version)
     return payouts
 
+
+def _payouts_delta(driver: str, since: int) -> Optional[dict]:
+    """``/payouts?since=`` body, or None when the changes cannot be replayed."""
+    version, changes = order_store.changes_since(driver, since)
+    if changes is None:
+        return None
+    # an order's cash / fee shows up in its payout's details
+    ids = dict.fromkeys(row[0] if kind == "payout" else row[15]
+                        for kind, row in changes if kind in ("payout", "order"))
+    rows = [order_store.find_payout(driver, pid) for pid in ids if pid]
+
+    def find(name: str) -> Optional[OrderRecord]:
+        return _find_record(driver, name)
+
+    return {"version": version, "full": False,
+            "changed": [PayoutRecord(r).json(find) for r in rows if r]}
+
+
 @app.post("/payout/mark-paid/{payout_id}", tags=["payouts"])
-def mark_payout_paid(payout_id: str, driver: str = Query(...)):
-    _, ws_payouts = _tabs_for(driver)
-    cells = ws_payouts.findall(payout_id)
-    if not cells:
+async def mark_payout_paid(payout_id: str, driver: str = Query(...)):
+    await _ensure_loaded(driver)
+    changes = {6: "paid", 7: dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    if await asyncio.to_thread(_update_payout, driver, payout_id, changes) is None:
         raise HTTPException(status_code=404, detail="Payout not found")
 
-    row = cells[0].row
-    ws_payouts.update_cell(row, 7, "paid")
-    ws_payouts.update_cell(row, 8, dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    return {"success": True}
 
-    # invalidate caches for this driver
-    payouts_cache.pop(driver, None)
-    orders_cache.pop(driver, None)
-    orders_data_cache.pop(driver, None)
 
-    return {"success": True}
+def _update_payout(driver: str, payout_id: str, changes: dict) -> Optional[List]:
+    row = order_store.update_payout(driver, payout_id, changes)
+    if row is not None:
+        mirror.update(DRIVERS[driver]["payouts_tab"], PAYOUT_HEADER, 1, payout_id, changes)
+    return row
 
+# ----------------------------  EVENTS  ------------------------------
+EVENTS_POLL = 0.5           # seconds between checks of the shared event log
+EVENTS_HEARTBEAT = 15.0     # keep-alive comment so proxies keep the stream open
 
-# ----------------------------  STATS  -------------------------------
-def _compute_stats(
-    driver: str,
-    days: int | None = None,
-    start: str | None = None,
-    end: str | None = None,
-) -> dict:
-    data = orders_data_cache.get(driver)
-    if data is None:
-        ws_orders, _ = _tabs_for(driver)
-        data = ws_orders.get_all_values()
-        orders_data_cache[driver] = data
-    rows = data[1:]
 
+def _event_data(driver: str, kind: str, row: Optional[List[str]]) -> dict:
+    if kind == "order":
+        gone = row[9] in COMPLETED_STATUSES
+        return {"driver": driver, "op": "remove" if gone else "upsert",
+                "order": OrderRecord(row).json(dt.datetime.now())}
+    if kind == "payout":
+        return {"driver": driver,
+                "payout": PayoutRecord(row).json(lambda name: _find_record(driver, name))}
+    return {"driver": driver}
+
+
+def _event_frames(after: int, driver: Optional[str]) -> Tuple[int, List[str]]:
+    """SSE frames for the events after ``after``, and the id to continue from."""
+    frames = []
+    for event_id, drv, kind, row in order_store.events_since(after, driver):
+        if event_id < 0:            # log was pruned past ``after``
+            after = order_store.last_event_id()
+            frames.append(f"event: reload\ndata: {json.dumps({'driver': drv})}\n\n")
+            continue
+        after = event_id
+        data = json.dumps(_event_data(drv, kind, row), ensure_ascii=False)
+        frames.append(f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n")
+    return after, frames
+
+
+@app.get("/events", tags=["events"])
+async def events(request: Request, driver: Optional[str] = Query(None)):
+    """Server-sent stream of order and payout changes (all drivers when ``driver`` is omitted).
+
+    Events come from the store's shared log, so writes handled by any
+    worker reach every client; reconnecting clients resume from
+    ``Last-Event-ID``."""
+    if driver is not None and driver not in DRIVERS:
+        raise HTTPException(status_code=400, detail="Invalid driver")
+    last_id = request.headers.get("last-event-id", "")
+    after = int(last_id) if last_id.isdigit() else \
+        await asyncio.to_thread(order_store.last_event_id)
+
+    async def stream():
+        nonlocal after
+        yield "retry: 3000\n\n"
+        idle = 0.0
+        while not await request.is_disconnected():
+            after, frames = await asyncio.to_thread(_event_frames, after, driver)
+            for frame in frames:
+                yield frame
+            if frames:
+                idle = 0.0
+                continue
+            await asyncio.sleep(EVENTS_POLL)
+            idle += EVENTS_POLL
+            if idle >= EVENTS_HEARTBEAT:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ----------------------------  STATS  -------------------------------
+def _date_range(days: int | None, start: str | None, end: str | None):
+    """``(start_date, end_date)`` from the stats query parameters; None = open."""
     if start:
         try:
             start_date = dt.datetime.strptime(start, "%Y-%m-%d").date()
@@ -721,162 +1104,285 @@ def _compute_stats(
             raise HTTPException(status_code=400, detail="Invalid end date")
     else:
         end_date = None
+    return start_date, end_date
 
-    total = delivered = returned = 0
-    collect = fees = canceled_amount = 0.0
-    for r in rows:
-        scan_day = r[12]
-        try:
-            sd = dt.datetime.strptime(scan_day, "%Y-%m-%d").date()
-        except Exception:
-            sd = None
-        if start_date and (not sd or sd < start_date):
-            continue
-        if end_date and (not sd or sd > end_date):
-            continue
-        total += 1
-        status = r[9]
-        cash = safe_float(get_cell(r, 13))
-        fee = safe_float(get_cell(r, 14))
-        if status == "Livré":
-            delivered += 1
-            collect += cash
-            fees += fee
-        elif status in ("Returned", "Annulé", "Refusé"):
-            returned += 1
-            canceled_amount += cash
 
+def _day_bounds(start_date, end_date):
+    return (start_date.isoformat() if start_date else None,
+            end_date.isoformat() if end_date else None)
+
+
+def _new_stats() -> dict:
+    return {"total": 0, "delivered": 0, "returned": 0,
+            "collect": 0.0, "fees": 0.0, "canceled": 0.0}
+
+
+def _count_bucket(acc: dict, status: str, orders: int, cash: float, fees: float) -> None:
+    acc["total"] += orders
+    if status == "Livré":
+        acc["delivered"] += orders
+        acc["collect"] += cash
+        acc["fees"] += fees
+    elif status in ("Returned", "Annulé", "Refusé"):
+        acc["returned"] += orders
+        acc["canceled"] += cash
+
+
+def _stats_payload(acc: dict) -> dict:
+    total, delivered = acc["total"], acc["delivered"]
     rate = (delivered / total * 100) if total else 0
     return {
         "totalOrders": total,
         "delivered": delivered,
-        "returned": returned,
-        "totalCollect": collect,
-        "totalFees": fees,
+        "returned": acc["returned"],
+        "totalCollect": acc["collect"],
+        "totalFees": acc["fees"],
         "deliveryRate": rate,
-        "canceledAmount": canceled_amount,
+        "canceledAmount": acc["canceled"],
     }
 
 
+async def _compute_stats(
+    driver: str,
+    days: int | None = None,
+    start: str | None = None,
+    end: str | None = None,
+) -> dict:
+    start_date, end_date = _date_range(days, start, end)
+    await _ensure_loaded(driver)
+    acc = _new_stats()
+    for _day, status, orders, cash, fees in await asyncio.to_thread(
+        order_store.rollups, driver, *_day_bounds(start_date, end_date)
+    ):
+        _count_bucket(acc, status, orders, cash, fees)
+    return _stats_payload(acc)
+
+
 @app.get("/stats", tags=["stats"])
-def get_stats(
+async def get_stats(
     driver: str = Query(...),
     days: int | None = Query(None),
     start: str | None = Query(None),
     end: str | None = Query(None),
 ):
-    return _compute_stats(driver, days, start, end)
+    return await _compute_stats(driver, days, start, end)
 
 
 @app.get("/admin/stats", tags=["admin"])
-def admin_stats(
+async def admin_stats(
     days: int | None = Query(None),
     start: str | None = Query(None),
     end: str | None = Query(None),
 ):
-    return {d: _compute_stats(d, days, start, end) for d in DRIVERS.keys()}
+    await _ensure_all_loaded()
+    return {d: await _compute_stats(d, days, start, end) for d in DRIVERS.keys()}
 
 
 # -------------------------------------------------------------------
 # Daily trend data for all drivers
 # -------------------------------------------------------------------
 @app.get("/admin/trends", tags=["admin"])
-def admin_trends(
+async def admin_trends(
     start: str | None = Query(None),
     end: str | None = Query(None),
     days: int | None = Query(None),
 ):
     """Return delivered count per day across all drivers."""
-    if start:
-        try:
-            start_date = dt.datetime.strptime(start, "%Y-%m-%d").date()
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid start date")
-    elif days and days > 0:
-        start_date = dt.datetime.now().date() - dt.timedelta(days=days - 1)
-    else:
-        start_date = None
-
-    if end:
-        try:
-            end_date = dt.datetime.strptime(end, "%Y-%m-%d").date()
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid end date")
-    else:
-        end_date = dt.datetime.now().date()
+    start_date, end_date = _date_range(days, start, end)
+    end_date = end_date or dt.datetime.now().date()
+    bounds = _day_bounds(start_date, end_date)
 
-    counts: dict[dt.date, int] = {}
+    counts: dict[str, int] = {}
+    await _ensure_all_loaded()
     for driver in DRIVERS.keys():
-        data = orders_data_cache.get(driver)
-        if data is None:
-            ws_orders, _ = _tabs_for(driver)
-            data = ws_orders.get_all_values()
-            orders_data_cache[driver] = data
-        rows = data[1:]
-        for r in rows:
-            scan_day = get_cell(r, 12)
-            status = get_cell(r, 9)
-            try:
-                sd = dt.datetime.strptime(scan_day, "%Y-%m-%d").date()
-            except Exception:
-                continue
-            if start_date and sd < start_date:
-                continue
-            if end_date and sd > end_date:
-                continue
+        for day, status, orders, _cash, _fees in await asyncio.to_thread(
+            order_store.rollups, driver, *bounds
+        ):
             if status == "Livré":
-                counts[sd] = counts.get(sd, 0) + 1
+                counts[day] = counts.get(day, 0) + orders
+    return _trend_payload(counts)
 
-    days_sorted = sorted(counts.keys())
+
+def _trend_payload(counts: dict) -> list:
     return [
-        {"date": d.strftime("%Y-%m-%d"), "delivered": counts[d]}
-        for d in days_sorted
+        {"date": d, "delivered": counts[d]}
+        for d in sorted(counts.keys())
     ]
 
 
+@app.get("/admin/dashboard", tags=["admin"])
+async def admin_dashboard(
+    days: int | None = Query(None),
+    start: str | None = Query(None),
+    end: str | None = Query(None),
+):
+    """Everything ``admin.html`` shows, from one pass over each driver's day buckets.
+
+    Same numbers as ``/admin/stats``, ``/admin/trends`` and the per-driver
+    ``/orders`` / ``/payouts`` calls it replaces."""
+    start_date, end_date = _date_range(days, start, end)
+    lo, hi = _day_bounds(start_date, end_date)
+    trend_hi = hi or dt.datetime.now().date().isoformat()
+    await _ensure_all_loaded()
+    return await asyncio.to_thread(_dashboard, lo, hi, trend_hi)
+
+
+def _dashboard(lo: Optional[str], hi: Optional[str], trend_hi: str) -> dict:
+    drivers: dict[str, dict] = {}
+    delivered_by_day: dict[str, int] = {}
+    for driver in DRIVERS:
+        acc = _new_stats()
+        active = 0
+        for day, status, orders, cash, fees in order_store.rollups(driver):
+            if status not in COMPLETED_STATUSES:
+                active += orders
+            if lo and (not day or day < lo):
+                continue
+            if hi is None or (day and day <= hi):
+                _count_bucket(acc, status, orders, cash, fees)
+            if status == "Livré" and day and day <= trend_hi:
+                delivered_by_day[day] = delivered_by_day.get(day, 0) + orders
+        unpaid = sum((
+            safe_float(p[5]) for p in order_store.payout_rows(driver)
+            if (p[6] or "pending").lower() != "paid"
+        ), 0.0)
+        drivers[driver] = {**_stats_payload(acc), "activeOrders": active, "unpaidPayout": unpaid}
+    return {"drivers": drivers, "trends": _trend_payload(delivered_by_day)}
+
+
+# -------------------------------------------------------------------
+# Grouped analytics (columnar)
+# -------------------------------------------------------------------
+_frame: dict = {"versions": {}, "frame": None}
+_frame_lock = asyncio.Lock()
+# archived rows only change when an archive run adds some (or a reload restores them)
+_archived_rows: dict = {"generation": None, "rows": {}}
+
+
+def _archived_order_rows(driver: str) -> List[List[str]]:
+    generation = order_store.archive_generation()
+    if _archived_rows["generation"] != generation:
+        _archived_rows["rows"] = {}
+        _archived_rows["generation"] = generation
+    rows = _archived_rows["rows"].get(driver)
+    if rows is None:
+        rows = _archived_rows["rows"][driver] = order_store.archived_orders(driver)
+    return rows
+
+
+def _frame_rows(driver: str) -> List[List[str]]:
+    return order_store.order_rows(driver) + _archived_order_rows(driver)
+
+
+async def _order_frame() -> OrderFrame:
+    """Columnar copy of every driver's orders (archived ones included);
+    only the drivers whose data changed are encoded again."""
+    await _ensure_all_loaded()
+    async with _frame_lock:
+        versions = await asyncio.to_thread(lambda: {d: order_store.data_version(d) for d in DRIVERS})
+        changed = [d for d in DRIVERS if _frame["versions"].get(d) != versions[d]]
+        if changed:
+            def build():
+                frame = _frame["frame"]
+                if frame is None:
+                    return OrderFrame.from_rows(
+                        {d: _frame_rows(d) for d in DRIVERS}, get_primary_display_tag)
+                for d in changed:
+                    frame = frame.with_driver(d, _frame_rows(d), get_primary_display_tag)
+                return frame
+            _frame["frame"] = await asyncio.to_thread(build)
+            _frame["versions"] = versions
+        return _frame["frame"]
+
+
+@app.get("/admin/analytics", tags=["admin"])
+async def admin_analytics(
+    by: str = Query("driver", description="comma-separated: " + ", ".join(GROUP_KEYS)),
+    days: int | None = Query(None),
+    start: str | None = Query(None),
+    end: str | None = Query(None),
+    driver: List[str] = Query([]),
+    status: List[str] = Query([]),
+):
+    """Order metrics grouped by up to three keys, e.g. ``?by=driver,week&days=90``."""
+    keys = [k.strip() for k in by.split(",") if k.strip()]
+    if not keys or len(keys) > 3 or any(k not in GROUP_KEYS for k in keys):
+        raise HTTPException(status_code=400, detail=f"by must be 1-3 of {', '.join(GROUP_KEYS)}")
+    start_date, end_date = _date_range(days, start, end)
+    frame = await _order_frame()
+    mask = frame.mask(start_date, end_date, drivers=driver, statuses=status)
+    return {"by": keys, "groups": frame.group_by(keys, mask)}
+
+
 @app.get("/admin/search", tags=["admin"])
-def admin_search(q: str = Query(...)):
-    """Search orders across all drivers by order name or phone."""
-    q_lower = q.lower()
-    results: list[dict] = []
-    for driver in DRIVERS.keys():
-        data = orders_data_cache.get(driver)
-        if data is None:
-            ws_orders, _ = _tabs_for(driver)
-            data = ws_orders.get_all_values()
-            orders_data_cache[driver] = data
-        rows = data[1:]
-        for r in rows:
-            order_name = get_cell(r, 1)
-            phone = get_cell(r, 3)
-            if q_lower in str(order_name).lower() or q_lower in str(phone).lower():
-                results.append({
-                    "driver": driver,
-                    "orderName": order_name,
-                    "customerName": get_cell(r, 2),
-                    "customerPhone": phone,
-                    "deliveryStatus": get_cell(r, 9) or "Dispatched",
-                    "cashAmount": safe_float(get_cell(r, 13)),
-                    "address": get_cell(r, 4),
-                })
-    return results
+async def admin_search(
+    response: Response,
+    q: str = Query(...),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    """Search orders across all drivers by order number, phone, name or address.
+
+    Every word of ``q`` must prefix-match; the total number of matches is
+    returned in ``X-Total-Count``."""
+    await _ensure_all_loaded()
+    # archived hits are read back from their segments
+    total, hits = await asyncio.to_thread(order_store.search, q, limit, offset)
+    response.headers["X-Total-Count"] = str(total)
+    return [
+        {
+            "driver": driver,
+            "orderName": get_cell(r, 1),
+            "customerName": get_cell(r, 2),
+            "customerPhone": get_cell(r, 3),
+            "deliveryStatus": get_cell(r, 9) or "Dispatched",
+            "cashAmount": safe_float(get_cell(r, 13)),
+            "address": get_cell(r, 4),
+        }
+        for driver, r in hits
+    ]
+
+
+# ----------------------------- SHOPIFY --------------------------------
+@app.post("/shopify/webhooks/orders-updated", tags=["shopify"])
+async def shopify_order_webhook(request: Request):
+    """Keep the local order cache current from Shopify's orders/updated webhook."""
+    body = await request.body()
+    st = shopify.store_for_domain(request.headers.get("X-Shopify-Shop-Domain", ""))
+    if st is None or not st.verify_webhook(body, request.headers.get("X-Shopify-Hmac-Sha256", "")):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    await asyncio.to_thread(order_store.put_shopify_orders, st.name, [slim_order(json.loads(body))])
+    return {"success": True}
+
+
+@app.post("/shopify/sync", tags=["maintenance"])
+async def shopify_sync():
+    """Run the Shopify → local order cache sync now."""
+    return await sync_shopify_orders()
 
 
 # ---------------------------- EMPLOYEES -------------------------------
 @app.post("/employee/log", tags=["employees"])
-def employee_log(entry: EmployeeLog):
-    """Append an employee action row to the configured sheet."""
-    ws = _get_or_create_sheet(EMPLOYEE_TAB, EMPLOYEE_HEADER)
+async def employee_log(entry: EmployeeLog):
+    """Queue an employee action row for the configured sheet."""
     ts = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    ws.append_row([ts, entry.employee, entry.order or "", entry.amount or ""])
+    # journaling fsyncs, so it runs in a thread
+    await asyncio.to_thread(mirror.append, EMPLOYEE_TAB, EMPLOYEE_HEADER,
+                            [ts, entry.employee, entry.order or "", entry.amount or ""])
     return {"success": True}
 
 
 @app.get("/employee/logs", tags=["employees"])
-def employee_logs():
+async def employee_logs():
     """Return all employee log rows as a list of dictionaries."""
-    ws = _get_or_create_sheet(EMPLOYEE_TAB, EMPLOYEE_HEADER)
-    rows = ws.get_all_values()[1:]
+    try:
+        rows = (await sheets.values_get(a1(EMPLOYEE_TAB)))[1:]
+    except SheetsError as exc:
+        if exc.status_code != 400:
+            raise
+        # no log tab yet – create it so the next write has a header
+        await asyncio.to_thread(_get_or_create_sheet, EMPLOYEE_TAB, EMPLOYEE_HEADER)
+        rows = []
     logs = []
     for r in rows:
         logs.append({
@@ -888,35 +1394,146 @@ def employee_logs():
     return logs
 
 
-@app.post("/archive-yesterday", tags=["maintenance"])
-def archive_yesterday():
-    ws = _get_or_create_sheet(SHEET_NAME, ORDER_HEADER)
-    data = ws.get_all_values()
-    if len(data) <= 1:
-        return {"archived": 0}
+@app.post("/admin/resync", tags=["maintenance"])
+async def admin_resync(driver: str = Query(...)):
+    """Drop the local copy of a driver's tabs and reload it from Sheets."""
+    if driver not in DRIVERS:
+        raise HTTPException(status_code=400, detail="Invalid driver")
+    if not await asyncio.to_thread(mirror.flush):
+        raise HTTPException(status_code=503, detail="Sheet writes still pending")
+    await asyncio.to_thread(order_store.reset, driver)
+    await _ensure_loaded(driver)
+    return await asyncio.to_thread(lambda: {
+        "orders": len(order_store.order_rows(driver)),
+        "payouts": len(order_store.payout_rows(driver)),
+    })
+
+
+def _archivable(driver: str, cutoff: str):
+    """Order names and payout IDs of ``driver`` that are settled before ``cutoff``.
+
+    An order qualifies once it is completed and scanned before the cutoff;
+    a delivered one must also sit in a paid payout, and a payout only goes
+    when it is paid, created before the cutoff and all its orders go."""
+    orders = order_store.order_rows(driver)
+    settled = {
+        r[1] for r in orders
+        if r[9] in COMPLETED_STATUSES and "" < _scan_day(r[12]) < cutoff
+    }
+    payout_ids = {
+        p[0] for p in order_store.payout_rows(driver)
+        if p[6].lower() == "paid" and p[1][:10] < cutoff
+        and all(r[1] in settled for r in orders if r[15] == p[0])
+    }
+    names = [
+        r[1] for r in orders
+        if r[1] in settled and (r[15] in payout_ids if r[15] else r[9] != "Livré")
+    ]
+    return names, sorted(payout_ids)
 
-    header = data[0]
-    today = dt.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    archive_rows = []
-    keep_rows = [header]
 
-    for row in data[1:]:
-        ts_str = row[0]
-        try:
-            ts = parse_timestamp(ts_str)
-        except ValueError:
-            keep_rows.append(row)
-            continue
-        if ts < today:
-            archive_rows.append(row)
+def _scan_day(text: str) -> str:
+    try:
+        return dt.datetime.strptime(text, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return ""
+
+
+def _delete_sheet_rows(driver: str, tab: str, archive_tab: str, header: List[str],
+                       key_col: int, kind: str) -> int:
+    """Delete every row of ``tab`` whose key is archived; returns how many.
+
+    The rows are appended to ``archive_tab`` first (unless an earlier,
+    interrupted run already did), so a row only leaves the sheet once it
+    is stored in Google as well – the local segments do not survive a
+    new instance."""
+    ws = _get_or_create_sheet(tab, header)
+    values = ws.get_all_values()
+    gone = order_store.archived_keys(driver, kind)
+    doomed = [n for n, r in enumerate(values[1:], start=1)
+              if len(r) >= key_col and r[key_col - 1] in gone]
+    if not doomed:
+        return 0
+    archive_ws = _get_or_create_sheet(archive_tab, header)
+    copied = set(archive_ws.col_values(key_col)[1:])
+    missing = [values[n] for n in doomed if values[n][key_col - 1] not in copied]
+    if missing:
+        archive_ws.append_rows(missing)
+    runs: List[List[int]] = []
+    for n in doomed:
+        if runs and n == runs[-1][1]:
+            runs[-1][1] = n + 1
         else:
-            keep_rows.append(row)
-
-    if archive_rows:
-        y_date = (today - dt.timedelta(days=1)).strftime("%Y-%m-%d")
-        archive_name = f"{DELIVERY_GUY_NAME}_Archive_{y_date}"
-        archive_ws = _get_or_create_sheet(archive_name, header)
-        archive_ws.append_rows(archive_rows)
-        ws.clear()
-        ws.append_rows(keep_rows)
-    return {"archived": len(archive_rows)}
+            runs.append([n, n + 1])
+    # bottom-up, so earlier deletions do not shift later ranges
+    ws.spreadsheet.batch_update({"requests": [
+        {"deleteDimension": {"range": {
+            "sheetId": ws.id, "dimension": "ROWS", "startIndex": a, "endIndex": b,
+        }}}
+        for a, b in reversed(runs)
+    ]})
+    # only now: other workers' mirrors rebuild their row index on the new generation
+    order_store.rows_deleted(tab, len(values) - len(doomed))
+    mirror.forget(tab)
+    return len(doomed)
+
+
+def archive_driver(driver: str, older_than_days: int) -> dict:
+    """Move ``driver``'s settled rows to the archive and off the sheet."""
+    cutoff = (dt.date.today() - dt.timedelta(days=older_than_days)).isoformat()
+    names, payout_ids = _archivable(driver, cutoff)
+    if not mirror.flush():
+        raise HTTPException(status_code=503, detail="Sheet writes still pending")
+    cfg = DRIVERS[driver]
+    with mirror.paused():
+        orders, payouts = order_store.archive(driver, names, payout_ids)
+        # also catches rows archived by an earlier run that died before deleting
+        deleted = _delete_sheet_rows(driver, cfg["order_tab"], cfg["order_archive_tab"],
+                                     ORDER_HEADER, 2, "orders")
+        deleted += _delete_sheet_rows(driver, cfg["payouts_tab"], cfg["payouts_archive_tab"],
+                                      PAYOUT_HEADER, 1, "payouts")
+    return {"orders": orders, "payouts": payouts, "sheetRowsDeleted": deleted}
+
+
+def _archive_preview(days: int) -> dict:
+    cutoff = (dt.date.today() - dt.timedelta(days=days)).isoformat()
+    result = {}
+    for driver in DRIVERS:
+        names, payout_ids = _archivable(driver, cutoff)
+        result[driver] = {"orders": len(names), "payouts": len(payout_ids)}
+    return {"cutoffDays": days, "applied": False, "drivers": result}
+
+
+@app.post("/archive", tags=["maintenance"])
+async def archive(days: int = Query(ARCHIVE_AFTER_DAYS, ge=1),
+                  apply: bool = Query(False)):
+    """Archive completed, paid-out rows older than ``days`` for every driver.
+
+    Archived rows are copied to the ``*_Archive`` tabs and deleted from
+    the driver tabs.  Without ``apply=true`` nothing changes: the response
+    only counts what would move."""
+    await _ensure_all_loaded()
+    if not apply:
+        return await asyncio.to_thread(_archive_preview, days)
+    lease = await asyncio.to_thread(order_store.lease, "archive", ARCHIVE_LEASE_SECONDS)
+    if lease is None:
+        raise HTTPException(status_code=409, detail="An archive run is already in progress")
+    result = {}
+    with lease:
+        for driver in DRIVERS:
+            if not lease.held:
+                raise HTTPException(status_code=409, detail="Archive lease lost, run stopped")
+            result[driver] = await asyncio.to_thread(archive_driver, driver, days)
+    return {"cutoffDays": days, "applied": True, "drivers": result}
+
+
+@app.post("/archive-yesterday", tags=["maintenance"], deprecated=True)
+async def archive_yesterday():
+    """Replaced by ``/archive``; answers 410 so old cron jobs fail loudly
+    instead of silently archiving nothing."""
+    log.warning("POST /archive-yesterday is gone; call POST /archive?apply=true")
+    raise HTTPException(
+        status_code=410,
+        detail="/archive-yesterday was replaced by POST /archive?apply=true "
+               f"(archives settled rows older than {ARCHIVE_AFTER_DAYS} days)",
+    )
@@ -0,0 +1,231 @@
+"""
+Process metrics
+───────────────
+Counters, histograms and gauges rendered in the Prometheus text format
+on ``/metrics``.  Hand-rolled rather than ``prometheus_client``: a handful
+of families, no extra dependency.
+
+What is recorded:
+
+* ``http_request_duration_seconds`` – per route template, method, status
+* ``sheets_calls_total`` / ``sheets_call_duration_seconds`` – every Sheets
+  HTTP attempt (gspread and the async client), by call kind and status,
+  so 429s show up as ``status="429"``
+* ``sheets_quota_wait_seconds`` – time spent queued in the token bucket
+* ``shopify_calls_total`` / ``shopify_call_duration_seconds`` – per store
+* ``cache_events_total`` – hit / shared_hit / miss / revived / stale /
+  evicted / expired per cache
+* ``route_external_calls_total`` – Sheets and Shopify calls made while
+  serving each route
+
+Each gunicorn worker keeps its own numbers; Prometheus scrapes whichever
+worker answers, so use ``rate()`` / ``sum`` and not absolute values.
+
+``trace()`` opens a per-request tally of external calls (a context
+variable, so it follows ``asyncio.to_thread`` and child tasks) which the
+request middleware turns into the per-route counter and, with
+``TRACE_REQUESTS=1``, a log line.
+"""
+import bisect
+import collections
+import contextlib
+import contextvars
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds; covers a 304 from memory up to a cold 100k-row load
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = collections.defaultdict(float)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in items
+        ]
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (non-cumulative) + overflow, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        out = super().render()
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = f'le="{_number(bound)}"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return out
+
+
+class Gauge(_Family):
+    """Value read from ``fn`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return super().render() + [f"{self.name} {_number(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+
+    def register(self, family: _Family) -> _Family:
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families.values():
+            lines += family.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time to serve a request.", ["route", "method", "status"])
+ROUTE_EXTERNAL_CALLS = registry.counter(
+    "route_external_calls_total", "External API calls made while serving a route.",
+    ["route", "service"])
+SHEETS_CALLS = registry.counter(
+    "sheets_calls_total", "Google Sheets HTTP attempts.", ["call", "status"])
+SHEETS_SECONDS = registry.histogram(
+    "sheets_call_duration_seconds", "Google Sheets HTTP attempt latency.", ["call"])
+SHEETS_QUOTA_WAIT = registry.histogram(
+    "sheets_quota_wait_seconds", "Time queued for a Sheets quota token.", ["priority"])
+SHOPIFY_CALLS = registry.counter(
+    "shopify_calls_total", "Shopify Admin API requests.", ["store", "call", "status"])
+SHOPIFY_SECONDS = registry.histogram(
+    "shopify_call_duration_seconds", "Shopify Admin API request latency.", ["store", "call"])
+CACHE_EVENTS = registry.counter(
+    "cache_events_total", "Cache lookups and removals by outcome.", ["cache", "event"])
+
+
+# ─── per-request tally ─────────────────────────────────────────
+_trace: contextvars.ContextVar[Optional[collections.Counter]] = contextvars.ContextVar(
+    "external_calls", default=None)
+
+
+@contextlib.contextmanager
+def trace() -> Iterator[collections.Counter]:
+    """Count external calls made inside the block, by service."""
+    calls: collections.Counter = collections.Counter()
+    token = _trace.set(calls)
+    try:
+        yield calls
+    finally:
+        _trace.reset(token)
+
+
+def _tally(service: str) -> None:
+    calls = _trace.get()
+    if calls is not None:
+        calls[service] += 1
+
+
+def sheets_call(call: str, status, seconds: Optional[float]) -> None:
+    SHEETS_CALLS.inc(call, str(status))
+    if seconds is not None:
+        SHEETS_SECONDS.observe(seconds, call)
+    _tally("sheets")
+
+
+def shopify_call(store: str, call: str, status, seconds: Optional[float]) -> None:
+    SHOPIFY_CALLS.inc(store, call, str(status))
+    if seconds is not None:
+        SHOPIFY_SECONDS.observe(seconds, store, call)
+    _tally("shopify")
+
+
+def cache_event(cache: str, event: str, amount: int = 1) -> None:
+    CACHE_EVENTS.inc(cache, event, amount=amount)
@@ -0,0 +1,616 @@
+"""
+Google Sheets mirror
+────────────────────
+Write-behind queue that replays local store mutations onto the sheet tabs
+from a background thread, so HTTP handlers never wait on a Google
+round-trip.
+
+Operations are plain dicts:
+
+    {"op": "append", "tab": …, "header": […], "row": […]}
+    {"op": "update", "tab": …, "header": […], "key_col": 2, "key": "#1234",
+     "changes": {9: "Livré", 16: "…"}}
+
+``changes`` use 0-based column indexes, like the rows in ``OrderStore``.
+
+Every operation is first written to an append-only journal
+(``<journal_dir>/mirror-<pid>.jsonl``) and only then acknowledged to the
+caller.  The flusher waits ``FLUSH_INTERVAL`` for more work, then
+coalesces everything pending: appends become one ``append_rows`` call per
+tab, updates to the same row are merged (last value per cell wins) and all
+of them go out in a single ``values.batchUpdate``.  Quota (429) and 5xx
+errors are retried with ``quota.backoff_delay``, ``MAX_ATTEMPTS`` times
+per round; after that the batch stays journaled and the flusher
+lets go of the sheet until the next round.  A batch the API rejects
+outright (4xx) is split and sent one operation at a time, so only the
+operations that fail on their own are set aside in
+``<journal_dir>/dead-letter.jsonl``.
+
+An update whose key is not on the sheet (its row was appended by another
+worker that has not flushed yet) is not dropped: it stays in the journal
+and is retried every ``MISSING_RETRY_SECONDS`` against a rebuilt index,
+and dead-lettered only after ``MISSING_KEY_SECONDS``.
+
+Journals left behind by dead workers are picked up by the next mirror
+that starts.  A journal is claimed under its lock and checked to still be
+linked, so two workers starting together never replay the same one.
+
+Rows are located through a per-tab ``RowIndex`` (key → sheet row) instead of
+a whole-sheet search; the index is re-checked against the key column every
+``INDEX_VERIFY_SECONDS`` and rebuilt when it has drifted, and rebuilt
+straight away when the tab's ``layout`` generation changes (rows were
+deleted from the sheet, e.g. by archiving in any worker).
+
+Row deletions shift rows under every worker's index, so they run inside
+``paused()``, which takes ``<journal_dir>/layout.lock`` exclusively; each
+flush holds it shared.  A flush therefore sees either the old layout or
+the new one with its generation already bumped, never the gap between.
+"""
+import contextlib
+import contextvars
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+from .quota import MAX_ATTEMPTS, RETRYABLE_STATUS, backoff_delay
+
+log = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv("MIRROR_FLUSH_INTERVAL", "0.5"))
+FSYNC_JOURNAL = os.getenv("MIRROR_FSYNC", "1") == "1"
+INDEX_VERIFY_SECONDS = 300
+# updates whose row is not on the sheet yet
+MISSING_RETRY_SECONDS = 30
+MISSING_KEY_SECONDS = float(os.getenv("MIRROR_MISSING_KEY_SECONDS", "900"))
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+_RANGE_ROW = re.compile(r"![A-Z]+(\d+)")
+
+
+class RowIndex:
+    """Key (order name / payout ID) → 1-based sheet row for one worksheet."""
+
+    def __init__(self, key_col: int, keys: List[str], layout: int = 0):
+        self.key_col = key_col
+        self.layout = layout
+        self.rows: Dict[str, int] = {}
+        self.last_row = len(keys)
+        self.verified_at = time.monotonic()
+        for n, key in enumerate(keys, start=1):
+            if key and key not in self.rows:     # first match wins, like findall()[0]
+                self.rows[key] = n
+
+    @classmethod
+    def from_values(cls, key_col: int, values: List[List[str]]) -> "RowIndex":
+        return cls(key_col, [r[key_col - 1] if len(r) >= key_col else "" for r in values])
+
+    def row_for(self, key: str) -> Optional[int]:
+        return self.rows.get(key)
+
+    def add(self, key: str, row: int) -> None:
+        if key and key not in self.rows:
+            self.rows[key] = row
+        self.last_row = max(self.last_row, row)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.verified_at > INDEX_VERIFY_SECONDS
+
+    def same_as(self, other: "RowIndex") -> bool:
+        return self.rows == other.rows
+
+
+class SheetBatch:
+    """Row mutations collected during one request.
+
+    Updates to the same row are merged, so an order whose status, log and
+    payout ID all change ends up as a single entry."""
+
+    def __init__(self):
+        self.appends: List[dict] = []
+        self.updates: Dict[tuple, dict] = {}
+
+    def append(self, op: dict) -> None:
+        self.appends.append(op)
+
+    def update(self, op: dict) -> None:
+        key = (op["tab"], op["key_col"], op["key"])
+        if key in self.updates:
+            self.updates[key]["changes"].update(op["changes"])
+        else:
+            self.updates[key] = op
+
+    def ops(self) -> List[dict]:
+        return self.appends + list(self.updates.values())
+
+
+_current_batch: contextvars.ContextVar[Optional[SheetBatch]] = \
+    contextvars.ContextVar("sheet_batch", default=None)
+
+
+def _a1_tab(tab: str) -> str:
+    return "'" + tab.replace("'", "''") + "'"
+
+
+def _row_ranges(tab: str, row: int, changes: Dict[int, object]) -> List[dict]:
+    """``values.batchUpdate`` entries for ``changes``, one per run of adjacent columns."""
+    data, run = [], []
+    for col in sorted(changes):
+        if run and col != run[-1] + 1:
+            data.append(_range_entry(tab, row, run, changes))
+            run = []
+        run.append(col)
+    if run:
+        data.append(_range_entry(tab, row, run, changes))
+    return data
+
+
+def _range_entry(tab: str, row: int, cols: List[int], changes: Dict[int, object]) -> dict:
+    start = rowcol_to_a1(row, cols[0] + 1)
+    end = rowcol_to_a1(row, cols[-1] + 1)
+    return {
+        "range": f"{_a1_tab(tab)}!{start}:{end}",
+        "values": [[changes[c] for c in cols]],
+    }
+
+
+def _appended_row(resp) -> Optional[int]:
+    """First row number written by an ``append_row(s)`` call."""
+    try:
+        m = _RANGE_ROW.search(resp["updates"]["updatedRange"])
+    except (KeyError, TypeError):
+        return None
+    return int(m.group(1)) if m else None
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    resp = getattr(exc, "response", None)
+    return getattr(resp, "status_code", None)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    code = _status_code(exc)
+    if code is None:
+        # network trouble (timeouts, resets) rather than a rejected request
+        return not isinstance(exc, gspread.exceptions.APIError)
+    return code in RETRYABLE_STATUS
+
+
+def _row_key(op: dict) -> tuple:
+    return op["tab"], op["key_col"], op["key"]
+
+
+def _decode(op: dict) -> dict:
+    """Undo JSON's str-ification of the ``changes`` keys."""
+    if op["op"] == "update":
+        op["changes"] = {int(k): v for k, v in op["changes"].items()}
+    return op
+
+
+class SheetMirror:
+    def __init__(self, open_ws: Callable[[str, List[str]], gspread.Worksheet],
+                 journal_dir: str, layout: Callable[[str], int] = lambda tab: 0):
+        self._open_ws = open_ws
+        self._layout = layout
+        self._journal_dir = journal_dir
+        self._journal = None
+        self._seq = 0
+        self._pending: "OrderedDict[int, dict]" = OrderedDict()
+        # seq → when an update whose row was missing is tried again / first went missing
+        self._retry_at: Dict[int, float] = {}
+        self._missing_since: Dict[int, float] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._flushing = threading.Lock()
+        self._layout_lock = None
+        self._indexes: Dict[str, RowIndex] = {}
+
+    # ─── producer side ─────────────────────────────────────────
+    def append(self, tab: str, header: List[str], row: list) -> None:
+        op = {"op": "append", "tab": tab, "header": header, "row": list(row)}
+        batch = _current_batch.get()
+        if batch is not None:
+            batch.append(op)
+        else:
+            self._put([op])
+
+    def update(self, tab: str, header: List[str], key_col: int, key: str,
+               changes: Dict[int, object]) -> None:
+        if not changes:
+            return
+        op = {"op": "update", "tab": tab, "header": header,
+              "key_col": key_col, "key": key, "changes": dict(changes)}
+        batch = _current_batch.get()
+        if batch is not None:
+            batch.update(op)
+        else:
+            self._put([op])
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Journal every append/update made inside the block in one write."""
+        batch = SheetBatch()
+        token = _current_batch.set(batch)
+        try:
+            yield batch
+        finally:
+            # queue even on error: whatever reached the store must reach Sheets
+            _current_batch.reset(token)
+            ops = batch.ops()
+            if ops:
+                self._put(ops)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until every queued operation has been written (or timeout).
+
+        Updates waiting for their row to appear on the sheet do not count."""
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while any(seq not in self._retry_at for seq in self._pending):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Hold every worker's flusher off while rows are deleted from the sheet."""
+        with self._flushing, self._sheet_lock(fcntl.LOCK_EX):
+            yield
+
+    @contextlib.contextmanager
+    def _sheet_lock(self, mode: int):
+        # one descriptor per process; ``_flushing`` serialises its users
+        if self._layout_lock is None:
+            os.makedirs(self._journal_dir, exist_ok=True)
+            self._layout_lock = open(os.path.join(self._journal_dir, "layout.lock"), "a")
+        fcntl.flock(self._layout_lock, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._layout_lock, fcntl.LOCK_UN)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _put(self, ops: List[dict]) -> None:
+        self.start()
+        with self._cond:
+            lines = []
+            for op in ops:
+                self._seq += 1
+                self._pending[self._seq] = op
+                lines.append(json.dumps({"seq": self._seq, "op": op}))
+            self._write_journal(lines)
+            self._cond.notify_all()
+
+    # ─── journal ───────────────────────────────────────────────
+    def start(self) -> None:
+        """Open this process' journal, adopt orphaned ones, start the flusher."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._journal is None:
+                self._open_journal()
+            self._thread = threading.Thread(
+                target=self._run, name="sheet-mirror", daemon=True
+            )
+            self._thread.start()
+
+    def _open_journal(self) -> None:
+        os.makedirs(self._journal_dir, exist_ok=True)
+        own = os.path.join(self._journal_dir, f"mirror-{os.getpid()}.jsonl")
+        # built under another name and locked before it shows up as ``own``,
+        # so no other worker can take it for an orphan
+        fresh = own + ".new"
+        self._journal = open(fresh, "w", encoding="utf-8")
+        fcntl.flock(self._journal, fcntl.LOCK_EX)
+
+        recovered: List[dict] = []
+        claimed = []
+        try:
+            for path in sorted(glob.glob(os.path.join(self._journal_dir, "mirror-*.jsonl"))):
+                fh = self._claim(path)
+                if fh is not None:
+                    claimed.append((path, fh))
+                    recovered.extend(self._read_pending(fh))
+            if recovered:
+                log.info("sheet mirror: recovered %d journaled operations", len(recovered))
+                lines = []
+                for op in recovered:
+                    self._seq += 1
+                    self._pending[self._seq] = op
+                    lines.append(json.dumps({"seq": self._seq, "op": op}))
+                self._write_journal(lines)
+            # the adopted operations are on disk in our journal: only now drop
+            # the orphans (``own`` itself, left by a reused pid, is replaced)
+            os.replace(fresh, own)
+            for path, _ in claimed:
+                if path != own:
+                    os.unlink(path)
+        finally:
+            for _, fh in claimed:
+                fh.close()
+
+    @staticmethod
+    def _claim(path: str):
+        """Lock an orphaned journal for adoption, or None if it is not one."""
+        try:
+            fh = open(path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return None             # adopted and removed by another worker
+        try:
+            # a live worker holds an exclusive lock on its own journal
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # whoever held the lock before us may have adopted and unlinked it
+            if os.fstat(fh.fileno()).st_ino != os.stat(path).st_ino:
+                raise FileNotFoundError(path)
+        except OSError:
+            fh.close()
+            return None
+        return fh
+
+    @staticmethod
+    def _read_pending(fh) -> List[dict]:
+        ops: "OrderedDict[int, dict]" = OrderedDict()
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue            # torn last line after a crash
+            if "op" in entry:
+                ops[entry["seq"]] = _decode(entry["op"])
+            for seq in entry.get("ack", ()):
+                ops.pop(seq, None)
+        return list(ops.values())
+
+    def _write_journal(self, lines: List[str]) -> None:
+        self._journal.write("\n".join(lines) + "\n")
+        self._journal.flush()
+        if FSYNC_JOURNAL:
+            os.fsync(self._journal.fileno())
+
+    def _ack(self, seqs: List[int]) -> None:
+        with self._cond:
+            for seq in seqs:
+                self._pending.pop(seq, None)
+                self._retry_at.pop(seq, None)
+                self._missing_since.pop(seq, None)
+            if self._pending:
+                self._write_journal([json.dumps({"ack": seqs})])
+            else:
+                # nothing outstanding – start the journal afresh
+                self._journal.seek(0)
+                self._journal.truncate()
+                self._journal.flush()
+            self._cond.notify_all()
+
+    # ─── row index ─────────────────────────────────────────────
+    def index_tab(self, tab: str, key_col: int, values: List[List[str]]) -> None:
+        """Seed the row index for ``tab`` from a ``get_all_values()`` result."""
+        idx = RowIndex.from_values(key_col, values)
+        idx.layout = self._layout(tab)
+        self._indexes[tab] = idx
+
+    def forget(self, tab: str) -> None:
+        """Drop the index for ``tab`` (rows were moved or deleted)."""
+        self._indexes.pop(tab, None)
+
+    def _index(self, ws: gspread.Worksheet, tab: str, key_col: int) -> RowIndex:
+        idx = self._indexes.get(tab)
+        if idx is None or idx.key_col != key_col or idx.layout != self._layout(tab):
+            return self._rebuild(ws, tab, key_col)
+        if idx.is_stale():
+            fresh = self._rebuild(ws, tab, key_col)
+            if not fresh.same_as(idx):
+                log.warning("sheet mirror: row index for %s drifted, rebuilt", tab)
+            return fresh
+        return idx
+
+    def _rebuild(self, ws: gspread.Worksheet, tab: str, key_col: int) -> RowIndex:
+        layout = self._layout(tab)
+        idx = RowIndex(key_col, ws.col_values(key_col), layout)
+        self._indexes[tab] = idx
+        return idx
+
+    # ─── flusher ───────────────────────────────────────────────
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._due():
+                    self._cond.wait(self._next_retry())
+            time.sleep(FLUSH_INTERVAL)          # let a burst of writes pile up
+            with self._cond:
+                ops = self._due()
+            with self._flushing, self._sheet_lock(fcntl.LOCK_SH):
+                done = self._flush_with_retry(*_coalesce(ops))
+            if not done:
+                # Sheets is struggling: leave it alone (and the locks free) a while
+                time.sleep(backoff_delay(MAX_ATTEMPTS))
+
+    def _due(self) -> List[Tuple[int, dict]]:
+        """Pending operations to send now (caller holds ``_cond``).
+
+        An update waiting for its row rides along whenever a newer update to
+        the same row goes out, so the two are merged in order."""
+        now = time.monotonic()
+        due = [(seq, op) for seq, op in self._pending.items()
+               if self._retry_at.get(seq, 0) <= now]
+        if len(due) < len(self._pending):
+            rows = {_row_key(op) for _, op in due if op["op"] == "update"}
+            due = [(seq, op) for seq, op in self._pending.items()
+                   if self._retry_at.get(seq, 0) <= now
+                   or (op["op"] == "update" and _row_key(op) in rows)]
+        return due
+
+    def _next_retry(self) -> Optional[float]:
+        if not self._retry_at:
+            return None
+        return max(0.0, min(self._retry_at.values()) - time.monotonic())
+
+    def _flush_with_retry(self, appends: List[dict], updates: List[dict]) -> bool:
+        """Write a coalesced batch; False if Sheets kept failing and it must wait."""
+        exc = self._attempt(appends, updates)
+        if exc is None:
+            return True
+        if _is_retryable(exc):
+            log.warning("sheet mirror: flush failed %d times (%s), backing off",
+                        MAX_ATTEMPTS, _status_code(exc) or exc.__class__.__name__)
+            return False
+        parts = _split(appends, updates)
+        if len(parts) == 1:
+            self._dead_letter(*parts[0], exc)
+            return True
+        log.warning("sheet mirror: batch rejected (%s), sending its %d operations one by one",
+                    _status_code(exc) or exc.__class__.__name__, len(parts))
+        return all(self._flush_with_retry(*part) for part in parts)
+
+    def _attempt(self, appends: List[dict], updates: List[dict]) -> Optional[Exception]:
+        """Try ``_flush`` up to ``MAX_ATTEMPTS`` times; the last error if it never worked."""
+        attempt = 0
+        while True:
+            try:
+                self._flush(appends, updates)
+                return None
+            except Exception as exc:
+                attempt += 1
+                if not _is_retryable(exc) or attempt >= MAX_ATTEMPTS:
+                    return exc
+                delay = backoff_delay(attempt)
+                log.warning("sheet mirror: flush failed (%s), retrying in %.1fs",
+                            _status_code(exc) or exc.__class__.__name__, delay)
+                time.sleep(delay)
+
+    def _dead_letter(self, appends: List[dict], updates: List[dict], exc: Exception) -> None:
+        """Set operations the API will not take aside for a human, and ack them."""
+        log.error("sheet mirror: dead-lettering %d operations: %s",
+                  sum(len(g["seqs"]) for g in appends + updates), exc)
+        at = time.strftime("%Y-%m-%d %H:%M:%S")
+        lines = []
+        for group in appends:
+            for row in group["rows"]:
+                op = {"op": "append", "tab": group["tab"], "header": group["header"], "row": row}
+                lines.append(json.dumps({"at": at, "error": str(exc), "op": op}))
+        for update in updates:
+            op = {k: v for k, v in update.items() if k != "seqs"}
+            lines.append(json.dumps({"at": at, "error": str(exc), "op": op}))
+        with open(os.path.join(self._journal_dir, DEAD_LETTER_FILE), "a",
+                  encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+        self._ack([s for g in appends + updates for s in g["seqs"]])
+
+    def _flush(self, appends: List[dict], updates: List[dict]) -> None:
+        for group in appends:
+            if group.get("done"):           # already written on an earlier attempt
+                continue
+            self._append_rows(group)
+            group["done"] = True
+            self._ack(group["seqs"])
+        if updates:
+            missing = self._write_updates(updates)
+            skipped = {id(u) for u in missing}
+            self._ack([s for u in updates if id(u) not in skipped for s in u["seqs"]])
+            if missing:
+                self._defer(missing)
+
+    def _defer(self, updates: List[dict]) -> None:
+        """Keep updates whose row is not on the sheet for a later round."""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            for update in updates:
+                since = min(self._missing_since.setdefault(s, now) for s in update["seqs"])
+                if now - since >= MISSING_KEY_SECONDS:
+                    expired.append(update)
+                    continue
+                log.warning("sheet mirror: %s not found in %s, retrying in %ds",
+                            update["key"], update["tab"], MISSING_RETRY_SECONDS)
+                for seq in update["seqs"]:
+                    self._retry_at[seq] = now + MISSING_RETRY_SECONDS
+            self._cond.notify_all()
+        if expired:
+            self._dead_letter([], expired, LookupError("row not found on the sheet"))
+
+    def _append_rows(self, group: dict) -> None:
+        tab = group["tab"]
+        ws = self._open_ws(tab, group["header"])
+        resp = ws.append_rows(group["rows"])
+        idx = self._indexes.get(tab)
+        if idx is not None:
+            first = _appended_row(resp)
+            if first is None:
+                self.forget(tab)
+            else:
+                for n, row in enumerate(group["rows"]):
+                    idx.add(row[idx.key_col - 1], first + n)
+
+    def _write_updates(self, ops: List[dict]) -> List[dict]:
+        """Send all row updates in ``ops`` with a single values.batchUpdate.
+
+        Returns the updates whose key is not on the sheet; they are not sent."""
+        data, spreadsheet, missing, rebuilt = [], None, [], set()
+        for op in ops:
+            tab = op["tab"]
+            ws = self._open_ws(tab, op["header"])
+            row = self._index(ws, tab, op["key_col"]).row_for(op["key"])
+            if row is None and tab not in rebuilt:
+                # may have been added to the sheet (by hand or by another
+                # worker) since the last build; one rebuild per tab and round
+                rebuilt.add(tab)
+                row = self._rebuild(ws, tab, op["key_col"]).row_for(op["key"])
+            if row is None:
+                missing.append(op)
+                continue
+            data.extend(_row_ranges(tab, row, op["changes"]))
+            spreadsheet = ws.spreadsheet
+        if data:
+            spreadsheet.values_batch_update(
+                body={"valueInputOption": "USER_ENTERED", "data": data}
+            )
+        return missing
+
+
+def _coalesce(ops: List[Tuple[int, dict]]) -> Tuple[List[dict], List[dict]]:
+    """Group pending operations into per-tab appends and per-row updates."""
+    appends: Dict[str, dict] = {}
+    updates: Dict[tuple, dict] = {}
+    for seq, op in ops:
+        if op["op"] == "append":
+            group = appends.setdefault(op["tab"], {
+                "tab": op["tab"], "header": op["header"], "rows": [], "seqs": [],
+            })
+            group["rows"].append(op["row"])
+            group["seqs"].append(seq)
+        else:
+            key = (op["tab"], op["key_col"], op["key"])
+            merged = updates.get(key)
+            if merged is None:
+                updates[key] = dict(op, changes=dict(op["changes"]), seqs=[seq])
+            else:
+                merged["changes"].update(op["changes"])
+                merged["seqs"].append(seq)
+    return list(appends.values()), list(updates.values())
+
+
+def _split(appends: List[dict], updates: List[dict]) -> List[Tuple[List[dict], List[dict]]]:
+    """The unwritten operations of a coalesced batch, one per part."""
+    parts = []
+    for group in appends:
+        if group.get("done"):
+            continue
+        for seq, row in zip(group["seqs"], group["rows"]):
+            parts.append(([dict(group, rows=[row], seqs=[seq])], []))
+    parts.extend(([], [update]) for update in updates)
+    return parts
@@ -0,0 +1,200 @@
+"""
+Sheets quota scheduler
+──────────────────────
+Every Google Sheets request – gspread in threads and the async client on
+the request path – takes a token from one bucket before it goes out.  The
+bucket refills at ``SHEETS_QUOTA_PER_MINUTE`` (the per-user quota, split
+between gunicorn workers) so bursts queue up locally instead of coming
+back as 429s.
+
+Waiters are served by priority, then arrival:
+
+* ``DRIVER`` – scans, status writes, driver screens (the default)
+* ``ADMIN`` – admin pages and reports
+* ``BACKGROUND`` – delta sync, header checks, archiving
+
+The priority of the current request or thread is a context variable; use
+``with priority(BACKGROUND): …``.
+
+A 429 or 5xx that still gets through is retried with jittered exponential
+backoff (``backoff_delay``), taking a fresh token each time.  Every
+attempt is counted in ``metrics`` under its ``call_kind``.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+DRIVER, ADMIN, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {DRIVER: "driver", ADMIN: "admin", BACKGROUND: "background"}
+
+QUOTA_PER_MINUTE = int(os.getenv("SHEETS_QUOTA_PER_MINUTE", "60"))
+# gunicorn workers (gunicorn_conf.py uses this too); each gets its share of the quota
+WORKERS = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+BURST = 10                  # tokens an idle bucket can save up
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+ASYNC_POLL = 0.05
+
+_SPREADSHEET_ID = re.compile(r"[^/:]*")
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("sheets_priority", default=DRIVER)
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retry ``attempt`` (1-based), with ±50 % jitter."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def call_kind(method: str, url: str) -> str:
+    """Metrics label for a Sheets request – ``values.get``, ``values.batchGet``,
+    ``spreadsheets.batchUpdate``…  ``url`` is absolute (gspread) or relative
+    to the spreadsheet (async client)."""
+    path = urlsplit(url).path
+    if "/spreadsheets/" in path:
+        path = path.split("/spreadsheets/", 1)[1]
+        path = path[len(_SPREADSHEET_ID.match(path).group()):]
+    elif path and not path.startswith(("/values", ":")):
+        return "other"                                  # Drive API etc.
+    if path.startswith("/values:"):
+        return "values." + path[len("/values:"):]
+    if path.startswith("/values/"):
+        action = path.rsplit(":", 1)[-1]
+        if action in ("append", "clear"):
+            return "values." + action
+        return "values.update" if method.upper() == "PUT" else "values.get"
+    if path.startswith(":"):
+        return "spreadsheets." + path[1:]
+    return "spreadsheets.get"
+
+
+class TokenBucket:
+    """Rate limiter whose waiters are served lowest priority value first."""
+
+    def __init__(self, per_minute: float, burst: int = BURST):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, min(burst, int(per_minute)))
+        self._tokens = float(self.capacity)
+        self._stamp = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def _try_take(self, ticket) -> Optional[float]:
+        """Take a token for ``ticket``; otherwise return how long to wait."""
+        self._refill()
+        if self._waiters[0] == ticket and self._tokens >= 1:
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self._cond.notify_all()
+            return None
+        if self._waiters[0] == ticket:
+            return (1 - self._tokens) / self.rate
+        return 1.0 / self.rate
+
+    def _leave(self, ticket) -> None:
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def acquire(self, level: Optional[int] = None) -> None:
+        started = time.perf_counter()
+        with self._cond:
+            ticket = (current_priority() if level is None else level, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                wait = self._try_take(ticket)
+                if wait is None:
+                    return _waited(ticket, started)
+                self._cond.wait(wait)
+
+    async def aacquire(self, level: Optional[int] = None) -> None:
+        started = time.perf_counter()
+        with self._cond:
+            ticket = (current_priority() if level is None else level, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(ticket)
+                if wait is None:
+                    return _waited(ticket, started)
+                await asyncio.sleep(min(wait, ASYNC_POLL))
+        except BaseException:
+            with self._cond:
+                if ticket in self._waiters:
+                    self._leave(ticket)
+            raise
+
+
+def _waited(ticket, started: float) -> None:
+    metrics.SHEETS_QUOTA_WAIT.observe(time.perf_counter() - started,
+                                      PRIORITY_NAMES.get(ticket[0], str(ticket[0])))
+
+
+bucket = TokenBucket(QUOTA_PER_MINUTE / WORKERS)
+
+
+class ScheduledHTTPClient(HTTPClient):
+    """gspread transport that goes through ``bucket`` and retries quota errors."""
+
+    def request(self, method: str, endpoint: str, *args: Any, **kwargs: Any):
+        kind = call_kind(method, endpoint)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            started = time.perf_counter()
+            try:
+                resp = super().request(method, endpoint, *args, **kwargs)
+            except APIError as exc:
+                attempt += 1
+                status = exc.response.status_code
+                metrics.sheets_call(kind, status, time.perf_counter() - started)
+                if status not in RETRYABLE_STATUS or attempt >= MAX_ATTEMPTS:
+                    raise
+                delay = backoff_delay(attempt)
+                log.warning("sheets: %s, retrying in %.1fs", status, delay)
+                time.sleep(delay)
+            except Exception:
+                metrics.sheets_call(kind, "error", None)
+                raise
+            else:
+                metrics.sheets_call(kind, resp.status_code, time.perf_counter() - started)
+                return resp
@@ -0,0 +1,166 @@
+"""
+Order and payout records
+────────────────────────
+Sheet rows parsed once into ``__slots__`` objects.  ``OrderSnapshot``
+holds every order of a driver at one data version and is what
+``orders_data_cache`` keeps, so the timestamps, scan date, cash and fee
+of a row are parsed when the snapshot is built, not again by every
+request that reads it.  Statuses are interned: membership tests against
+``COMPLETED_STATUSES`` mostly hit on identity.
+
+``json()`` gives the shapes ``/orders`` and ``/payouts`` return.  The
+store still hands out raw rows (see ``store.py``); wrap one in a record
+where a handler needs more than a cell or two.
+"""
+import datetime as dt
+import sys
+from typing import Callable, List, Optional, Sequence
+
+from .store import ORDER_WIDTH, PAYOUT_WIDTH
+
+
+def safe_float(val):
+    """Return a float or 0.0 for falsy/non-numeric values."""
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_timestamp(val: str) -> dt.datetime:
+    """Parse timestamp strings with optional microseconds and timezone."""
+    val = (val or "").strip()
+    parts = val.split()
+    if len(parts) > 2 and parts[-1].isalpha():
+        val = " ".join(parts[:-1])
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return dt.datetime.strptime(val, fmt)
+        except ValueError:
+            continue
+    return dt.datetime.fromisoformat(val)
+
+
+def _timestamp(val) -> Optional[dt.datetime]:
+    # fromisoformat takes the sheet's "YYYY-MM-DD HH:MM:SS" at C speed
+    if not val:
+        return None
+    try:
+        return dt.datetime.fromisoformat(val)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return parse_timestamp(str(val))
+    except ValueError:
+        return None
+
+
+def _day(val) -> Optional[dt.date]:
+    try:
+        return dt.date.fromisoformat(val) if val else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _padded(row: Sequence, width: int) -> Sequence:
+    return row if len(row) >= width else list(row) + [""] * (width - len(row))
+
+
+class OrderRecord:
+    """One ``*_Orders`` row."""
+
+    __slots__ = (
+        "timestamp", "name", "customer", "phone", "address", "tags", "fulfillment",
+        "order_status", "store", "status", "notes", "scheduled_time", "scan_date",
+        "cash", "fee", "payout_id", "status_log", "comm_log",
+        "created_at", "scheduled_at", "scan_day", "due_at",
+    )
+
+    def __init__(self, row: Sequence):
+        (self.timestamp, self.name, self.customer, self.phone, self.address, self.tags,
+         self.fulfillment, self.order_status, self.store, status, self.notes,
+         self.scheduled_time, self.scan_date, cash, fee, self.payout_id,
+         self.status_log, self.comm_log) = _padded(row, ORDER_WIDTH)[:ORDER_WIDTH]
+        self.status = sys.intern(status) if isinstance(status, str) else status
+        self.cash = safe_float(cash)
+        self.fee = safe_float(fee)
+        self.created_at = _timestamp(self.timestamp)
+        self.scheduled_at = _timestamp(self.scheduled_time)
+        self.scan_day = _day(self.scan_date)
+        # /orders sorts by the scheduled time, falling back to the scan time
+        self.due_at = self.scheduled_at or self.created_at or dt.datetime.min
+
+    def json(self, now: dt.datetime) -> dict:
+        """The order as returned by ``/orders``."""
+        urgent = False
+        if self.scheduled_at is not None:
+            try:
+                urgent = (self.scheduled_at - now).total_seconds() <= 3600
+            except TypeError:       # timezone-aware scheduled time
+                pass
+        return {
+            "timestamp":    self.timestamp,
+            "orderName":    self.name,
+            "customerName": self.customer,
+            "customerPhone":self.phone,
+            "address":      self.address,
+            "tags":         self.tags,
+            "deliveryStatus": self.status or "Dispatched",
+            "notes":        self.notes,
+            "scheduledTime": self.scheduled_time,
+            "scanDate":     self.scan_date,
+            "cashAmount":   self.cash,
+            "driverFee":    self.fee,
+            "payoutId":     self.payout_id,
+            "statusLog":    self.status_log,
+            "commLog":      self.comm_log,
+            "urgent":       urgent,
+        }
+
+
+class PayoutRecord:
+    """One ``*_Payouts`` row."""
+
+    __slots__ = ("payout_id", "created", "orders", "order_names", "total_cash",
+                 "total_fees", "total_payout", "status", "date_paid")
+
+    def __init__(self, row: Sequence):
+        (self.payout_id, self.created, self.orders, cash, fees, payout,
+         status, self.date_paid) = _padded(row, PAYOUT_WIDTH)[:PAYOUT_WIDTH]
+        self.order_names = [o.strip() for o in (self.orders or "").split(",") if o.strip()]
+        self.total_cash = safe_float(cash)
+        self.total_fees = safe_float(fees)
+        self.total_payout = safe_float(payout)
+        self.status = sys.intern(status or "pending")
+
+    def json(self, order: Callable[[str], Optional[OrderRecord]]) -> dict:
+        """The payout as returned by ``/payouts``; ``order(name)`` finds its orders."""
+        details = []
+        for name in self.order_names:
+            rec = order(name)
+            details.append({
+                "name": name,
+                "cashAmount": rec.cash if rec else 0.0,
+                "driverFee": rec.fee if rec else 0.0,
+            })
+        return {
+            "payoutId":   self.payout_id,
+            "dateCreated":self.created,
+            "orders":     self.orders,
+            "totalCash":  self.total_cash,
+            "totalFees":  self.total_fees,
+            "totalPayout":self.total_payout,
+            "status":     self.status,
+            "datePaid":   self.date_paid,
+            "orderDetails": details,
+        }
+
+
+class OrderSnapshot:
+    """Every order of one driver at one data version, with a by-name index."""
+
+    __slots__ = ("records", "by_name")
+
+    def __init__(self, rows: List[Sequence]):
+        self.records = [OrderRecord(r) for r in rows if r]
+        self.by_name = {r.name: r for r in self.records}
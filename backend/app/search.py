@@ -0,0 +1,69 @@
+"""
+Order search terms
+──────────────────
+How order rows are broken into index terms and how a query is matched
+against them.  The index itself lives in the store (``search_terms``) and
+is updated in the same transaction as the row.
+
+Terms carry a kind prefix:
+
+* ``o:`` order-name digits (``#1234`` → ``o:1234``)
+* ``p:`` phone digits without ``+212`` / ``00212`` / leading ``0``
+* ``w:`` lower-cased, accent-folded customer name and address words
+
+Every query token must prefix-match a term of the order.
+"""
+import re
+import unicodedata
+from typing import List, Set
+
+_WORD = re.compile(r"[^\W_]+")
+_NON_DIGIT = re.compile(r"\D")
+_LETTER = re.compile(r"[^\W\d_]")
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def normalize_phone(phone: str) -> str:
+    digits = _NON_DIGIT.sub("", phone or "")
+    if digits.startswith("00212"):
+        digits = digits[5:]
+    elif digits.startswith("212"):
+        digits = digits[3:]
+    return digits.lstrip("0")
+
+
+def row_terms(row: List[str]) -> Set[str]:
+    """Index terms of an order row (sheet layout)."""
+    terms = set()
+    order_digits = _NON_DIGIT.sub("", row[1])
+    if order_digits:
+        terms.add("o:" + order_digits)
+    phone = normalize_phone(row[3])
+    if phone:
+        terms.add("p:" + phone)
+    for word in _WORD.findall(_fold(f"{row[2]} {row[4]}")):
+        terms.add("w:" + word)
+    return terms
+
+
+def query_prefixes(q: str) -> List[List[str]]:
+    """One list of alternative term prefixes per query token."""
+    q = _fold(q)
+    # no letters: a phone typed with spaces ("+212 6 12 34") is one token
+    if not _LETTER.search(q):
+        q = _NON_DIGIT.sub("", q)
+    out = []
+    for token in _WORD.findall(q):
+        if token.isdigit():
+            alternatives = ["o:" + token]
+            phone = normalize_phone(token)
+            if phone:
+                alternatives.append("p:" + phone)
+            out.append(alternatives)
+        else:
+            out.append(["w:" + token])
+    return out
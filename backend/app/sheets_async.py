@@ -0,0 +1,135 @@
+"""
+Async Google Sheets client
+──────────────────────────
+Minimal read-only ``spreadsheets.values`` client on ``httpx.AsyncClient``
+for the request path, so a worker can have many Sheets reads in flight
+without tying up Starlette's threadpool.  Writes go through the
+background mirror and maintenance jobs, which use gspread.
+
+The service-account token is refreshed in a worker thread (google-auth is
+blocking) and shared by all requests.
+
+Calls take a token from the quota scheduler (``quota.py``) and retry
+429 / 5xx with backoff.  Identical GETs that overlap share one request.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import httpx
+from google.auth.transport.requests import Request as GoogleAuthRequest
+
+from . import metrics
+from .quota import MAX_ATTEMPTS, RETRYABLE_STATUS, backoff_delay, bucket, call_kind
+
+log = logging.getLogger(__name__)
+
+API_ROOT = "https://sheets.googleapis.com/v4/spreadsheets"
+TIMEOUT = 30.0
+
+
+class SheetsError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+def a1(tab: str, cells: str = "") -> str:
+    """Quoted A1 range for ``tab`` (whole tab when ``cells`` is empty)."""
+    quoted = "'" + tab.replace("'", "''") + "'"
+    return f"{quoted}!{cells}" if cells else quoted
+
+
+class AsyncSheetsClient:
+    def __init__(self, credentials, spreadsheet_id: str,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.credentials = credentials
+        self.spreadsheet_id = spreadsheet_id
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def _http(self) -> httpx.AsyncClient:
+        # one pooled client per event loop (gunicorn workers each run their own)
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=f"{API_ROOT}/{self.spreadsheet_id}",
+                timeout=TIMEOUT,
+                transport=self._transport,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+            self._loop = loop
+            self._token_lock = asyncio.Lock()
+            self._inflight = {}
+        return self._client
+
+    async def _auth_headers(self) -> dict:
+        if not self.credentials.valid:
+            async with self._token_lock:
+                if not self.credentials.valid:
+                    await asyncio.to_thread(self.credentials.refresh, GoogleAuthRequest())
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    async def _call(self, method: str, path: str, **kwargs) -> dict:
+        if method != "GET":
+            return await self._send(method, path, **kwargs)
+        key = (path, tuple(kwargs.get("params") or ()))
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self._inflight[key] = asyncio.ensure_future(self._send(method, path, **kwargs))
+        def done(fut: asyncio.Future) -> None:
+            self._inflight.pop(key, None)
+            if not fut.cancelled():
+                fut.exception()         # retrieved even if every waiter went away
+
+        pending.add_done_callback(done)
+        return await asyncio.shield(pending)
+
+    async def _send(self, method: str, path: str, **kwargs) -> dict:
+        client = self._http()
+        kind = call_kind(method, path)
+        attempt = 0
+        while True:
+            await bucket.aacquire()
+            headers = await self._auth_headers()
+            started = time.perf_counter()
+            try:
+                r = await client.request(method, path, headers=headers, **kwargs)
+            except httpx.HTTPError:
+                metrics.sheets_call(kind, "error", None)
+                raise
+            metrics.sheets_call(kind, r.status_code, time.perf_counter() - started)
+            if r.status_code < 400:
+                return r.json()
+            attempt += 1
+            if r.status_code in RETRYABLE_STATUS and attempt < MAX_ATTEMPTS:
+                delay = backoff_delay(attempt)
+                log.warning("sheets: %s on %s, retrying in %.1fs", r.status_code, path, delay)
+                await asyncio.sleep(delay)
+                continue
+            try:
+                message = r.json()["error"]["message"]
+            except (ValueError, KeyError, TypeError):
+                message = r.text
+            raise SheetsError(r.status_code, message)
+
+    # ─── values API ────────────────────────────────────────────
+    async def values_get(self, rng: str) -> List[List[str]]:
+        data = await self._call("GET", f"/values/{quote(rng, safe='')}")
+        return data.get("values", [])
+
+    async def values_batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        data = await self._call("GET", "/values:batchGet", params=[("ranges", r) for r in ranges])
+        return [vr.get("values", []) for vr in data.get("valueRanges", [])]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
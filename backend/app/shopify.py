@@ -0,0 +1,232 @@
+"""
+Shopify Admin API access
+────────────────────────
+One pooled keep-alive ``httpx.AsyncClient`` per store and event loop, a
+per-store timeout and a small circuit breaker, so a store that is down
+stops costing every scan its full timeout.  ``ShopifyClient.afind_order``
+asks all stores at once; a scan waits for the slowest store, not the sum
+of them.  ``afind_orders`` does the same for a whole batch of names,
+``BULK_NAMES`` per ``orders.json?name=…`` request.
+
+``ShopifyStore.aupdated_orders`` pages through ``orders.json`` by
+``updated_at_min`` for the local order cache; ``verify_webhook`` checks the
+HMAC of ``orders/updated`` webhooks that keep that cache current.
+
+Every request is counted in ``metrics`` per store and call kind.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+API_VERSION = "2023-07"
+DEFAULT_TIMEOUT = 10.0
+BREAKER_FAILURES = 5        # consecutive failures before the store is skipped
+BREAKER_RESET = 30.0        # seconds before a skipped store is tried again
+PAGE_SIZE = 250
+BULK_NAMES = 50             # order names per bulk lookup request
+
+# everything /scan needs from an order – the cache keeps only these
+ORDER_FIELDS = (
+    "id", "name", "created_at", "updated_at", "cancelled_at", "tags",
+    "fulfillment_status", "total_price", "total_outstanding",
+    "shipping_address", "phone",
+)
+
+
+def _call_kind(params: Optional[dict]) -> str:
+    return "orders.by_name" if params and "name" in params else "orders.updated"
+
+
+def slim_order(order: dict) -> dict:
+    return {k: order.get(k) for k in ORDER_FIELDS}
+
+
+class CircuitBreaker:
+    """Closed → open after ``failures`` errors in a row → half-open after ``reset_after``."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._errors = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            # half-open: let one probe through, re-arm the timer for the rest
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._errors = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._errors += 1
+            if self._errors >= self.failures:
+                self._opened_at = time.monotonic()
+
+
+class ShopifyStore:
+    def __init__(self, cfg: dict):
+        self.name = cfg["name"]
+        self.domain = cfg["domain"]
+        self.webhook_secret = cfg.get("webhook_secret", "")
+        self.breaker = CircuitBreaker()
+        self._client_kwargs = dict(
+            base_url=f"https://{cfg['domain']}/admin/api/{API_VERSION}",
+            auth=(cfg["api_key"], cfg["password"]),
+            timeout=httpx.Timeout(cfg.get("timeout") or DEFAULT_TIMEOUT),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aloop = None
+
+    def _async_client(self) -> httpx.AsyncClient:
+        # one pooled client per event loop (gunicorn workers each run their own)
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aloop is not loop:
+            self._aclient = httpx.AsyncClient(**self._client_kwargs)
+            self._aloop = loop
+        return self._aclient
+
+    async def aget_order(self, order_name: str) -> Optional[dict]:
+        """Call Shopify Admin API by order name (#1234)."""
+        if not self.breaker.allow():
+            return None
+        try:
+            r = await self._aget(self._async_client(), "/orders.json", {"name": order_name})
+        except httpx.HTTPError as exc:
+            return self._failed(exc)
+        return self._order_from(r)
+
+    async def aget_orders(self, names: List[str]) -> Dict[str, dict]:
+        """Orders found for ``names``, keyed by name; missing names are left out."""
+        if not names or not self.breaker.allow():
+            return {}
+        client = self._async_client()
+
+        async def chunk(part: List[str]) -> List[dict]:
+            try:
+                r = await self._aget(client, "/orders.json",
+                                     {"name": ",".join(part), "limit": PAGE_SIZE})
+            except httpx.HTTPError as exc:
+                self._failed(exc)
+                return []
+            return self._orders_from(r)
+
+        parts = [names[i:i + BULK_NAMES] for i in range(0, len(names), BULK_NAMES)]
+        found: Dict[str, dict] = {}
+        for orders in await asyncio.gather(*(chunk(p) for p in parts)):
+            for order in orders:
+                found.setdefault(order.get("name"), order)
+        return found
+
+    # ─── timed requests ────────────────────────────────────────
+    async def _aget(self, client: httpx.AsyncClient, url: str,
+                    params: Optional[dict]) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            r = await client.get(url, params=params)
+        except httpx.HTTPError:
+            metrics.shopify_call(self.name, _call_kind(params), "error", None)
+            raise
+        metrics.shopify_call(self.name, _call_kind(params), r.status_code,
+                             time.perf_counter() - started)
+        return r
+
+    def _failed(self, exc: Exception) -> None:
+        log.warning("shopify %s: %s", self.name, exc.__class__.__name__)
+        self.breaker.record_failure()
+        return None
+
+    def _order_from(self, r: httpx.Response) -> Optional[dict]:
+        orders = self._orders_from(r)
+        return orders[0] if orders else None
+
+    def _orders_from(self, r: httpx.Response) -> List[dict]:
+        try:
+            r.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            # 4xx means "no such order / bad request", not an outage
+            if exc.response.status_code == 429 or exc.response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return []
+        self.breaker.record_success()
+        return r.json().get("orders") or []
+
+    async def aupdated_orders(self, updated_at_min: str) -> AsyncIterator[dict]:
+        """All orders (any status) updated since ``updated_at_min``, page by page."""
+        client = self._async_client()
+        url = "/orders.json"
+        params = {
+            "updated_at_min": updated_at_min, "status": "any",
+            "limit": PAGE_SIZE, "fields": ",".join(ORDER_FIELDS),
+        }
+        while url:
+            r = await self._aget(client, url, params)
+            r.raise_for_status()
+            for order in r.json().get("orders", []):
+                yield order
+            # cursor pagination: the next link already carries limit/fields
+            nxt = r.links.get("next")
+            url, params = (nxt["url"], None) if nxt else (None, None)
+
+    def verify_webhook(self, body: bytes, signature: str) -> bool:
+        if not self.webhook_secret:
+            return False
+        digest = hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).digest()
+        return hmac.compare_digest(base64.b64encode(digest).decode(), signature or "")
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
+
+class ShopifyClient:
+    def __init__(self, stores: List[dict]):
+        self.stores = [ShopifyStore(cfg) for cfg in stores]
+
+    async def afind_order(self, order_name: str) -> List[Tuple[str, Optional[dict]]]:
+        """``(store name, order or None)`` for every store, looked up concurrently."""
+        orders = await asyncio.gather(*(s.aget_order(order_name) for s in self.stores))
+        return [(s.name, order) for s, order in zip(self.stores, orders)]
+
+    async def afind_orders(self, names: List[str]) -> Dict[str, List[Tuple[str, Optional[dict]]]]:
+        """``afind_order`` for many names: ``{name: [(store name, order or None)]}``."""
+        per_store = await asyncio.gather(*(s.aget_orders(names) for s in self.stores))
+        return {
+            name: [(s.name, found.get(name)) for s, found in zip(self.stores, per_store)]
+            for name in names
+        }
+
+    def store_for_domain(self, domain: str) -> Optional[ShopifyStore]:
+        return next((s for s in self.stores if s.domain == domain), None)
+
+    async def aclose(self) -> None:
+        for s in self.stores:
+            await s.aclose()
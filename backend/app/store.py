@@ -0,0 +1,1126 @@
+"""
+Local order store
+─────────────────
+SQLite (WAL mode) copy of every driver's ``*_Orders`` / ``*_Payouts`` tab.
+
+Rows are stored in sheet layout – lists of strings in ``ORDER_HEADER`` /
+``PAYOUT_HEADER`` column order – so route code keeps indexing them by
+position (``r[9]``, ``get_cell(r, 13)``).  The store is authoritative for
+everything written through the API; Google Sheets is a mirror that is
+brought up to date in the background (see ``mirror.py``).
+
+``rollups`` keeps order count, cash and fees per (driver, scan day,
+delivery status), maintained in the same transactions as the rows, so
+stats for any date range sum a few hundred buckets instead of parsing
+every row.
+
+``search_terms`` maps order-number / phone / name / address terms to
+order rows (see ``search.py``) and is kept current the same way.
+
+Rows moved to the archive (``archive.py``) leave ``orders`` / ``payouts``
+but are listed in ``archived`` (key → segment day) and keep their
+rollups (``archive_rollups``) and search terms (``archive_terms``), so
+stats and search still include them; loads and delta merges skip them.
+A load also takes the rows of the sheet's archive tabs, which rebuilds
+all of that on an instance whose data directory started out empty.
+
+``sheet_layouts`` counts row deletions per tab, so every worker's sheet
+mirror knows when its row index has gone stale.
+
+Money moves into and out of payouts through ``payout_ledger``: one
+append-only entry per order added (or removed, with negated amounts), and
+a payout row's totals are always its ledger sums.  Totals that come from
+the sheet (loads, rows added or edited there) are booked as a balancing
+entry without an order name.  The entry, the payout totals, the order's
+status and payout ID change in one ``BEGIN IMMEDIATE`` transaction, which
+serialises them across threads and workers – no two open payouts, no
+lost additions, no delivery saved without its credit.
+
+``sheet_rows`` remembers how many rows each tab had when it was last read,
+so the delta sync only fetches rows appended since.
+
+Every write bumps a per-driver data version inside the same transaction;
+caches in any worker compare against it (see ``cache.py``).  The same
+transaction records the changed row and the version it produced in
+``events``, which ``/events`` streams to clients connected to any worker
+and ``changes_since`` replays for ``?since=`` delta responses.
+
+The same database caches recently updated Shopify orders (one row per
+order name and store) so ``/scan`` can resolve barcodes without a live
+Admin API call.
+
+One database file is shared by all gunicorn workers; every thread gets its
+own connection.  It is not shared between instances: the service runs as a
+single instance (``--max-instances=1`` in ``cloudbuild.yaml``), and one that
+starts with an empty ``DATA_DIR`` rebuilds the store from the sheet.  Writes
+still in the mirror journal when an instance is recycled are lost unless
+``DATA_DIR`` is on storage that outlives it.
+"""
+import datetime as dt
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .archive import SegmentStore
+from .search import query_prefixes, row_terms
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    driver  TEXT    NOT NULL,
+    seq     INTEGER NOT NULL,
+    name    TEXT    NOT NULL,
+    row     TEXT    NOT NULL,
+    PRIMARY KEY (driver, seq)
+);
+CREATE INDEX IF NOT EXISTS orders_by_name ON orders (driver, name);
+
+CREATE TABLE IF NOT EXISTS payouts (
+    driver    TEXT    NOT NULL,
+    seq       INTEGER NOT NULL,
+    payout_id TEXT    NOT NULL,
+    row       TEXT    NOT NULL,
+    PRIMARY KEY (driver, seq)
+);
+CREATE INDEX IF NOT EXISTS payouts_by_id ON payouts (driver, payout_id);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    driver TEXT    NOT NULL,
+    day    TEXT    NOT NULL,            -- ISO scan date, '' when unparseable
+    status TEXT    NOT NULL,
+    orders INTEGER NOT NULL,
+    cash   INTEGER NOT NULL,            -- cents, so +/- never drifts
+    fees   INTEGER NOT NULL,
+    PRIMARY KEY (driver, day, status)
+);
+
+CREATE TABLE IF NOT EXISTS search_terms (
+    term   TEXT    NOT NULL,
+    driver TEXT    NOT NULL,
+    seq    INTEGER NOT NULL,
+    PRIMARY KEY (term, driver, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS search_terms_by_row ON search_terms (driver, seq);
+
+CREATE TABLE IF NOT EXISTS archived (
+    driver TEXT NOT NULL,
+    kind   TEXT NOT NULL,               -- 'orders' / 'payouts'
+    key    TEXT NOT NULL,
+    day    TEXT NOT NULL,               -- segment the row was written to
+    PRIMARY KEY (driver, kind, key)
+);
+
+CREATE TABLE IF NOT EXISTS archive_rollups (
+    driver TEXT    NOT NULL,
+    day    TEXT    NOT NULL,
+    status TEXT    NOT NULL,
+    orders INTEGER NOT NULL,
+    cash   INTEGER NOT NULL,
+    fees   INTEGER NOT NULL,
+    PRIMARY KEY (driver, day, status)
+);
+
+CREATE TABLE IF NOT EXISTS archive_terms (
+    term   TEXT NOT NULL,
+    driver TEXT NOT NULL,
+    key    TEXT NOT NULL,
+    PRIMARY KEY (term, driver, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS payout_ledger (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver     TEXT    NOT NULL,
+    payout_id  TEXT    NOT NULL,
+    order_name TEXT    NOT NULL,
+    cash       INTEGER NOT NULL,        -- cents; negative for a removal
+    fees       INTEGER NOT NULL,
+    created_at REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS payout_ledger_payout ON payout_ledger (driver, payout_id);
+
+CREATE TABLE IF NOT EXISTS tabs (
+    driver    TEXT PRIMARY KEY,
+    loaded_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    tab  TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sheet_layouts (
+    tab        TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL         -- bumped after rows are deleted from the tab
+);
+
+CREATE TABLE IF NOT EXISTS versions (
+    driver  TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver     TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    row        TEXT,
+    created_at REAL NOT NULL,
+    version    INTEGER                  -- the driver's data version it produced
+);
+
+CREATE TABLE IF NOT EXISTS cache_entries (
+    cache   TEXT    NOT NULL,
+    key     TEXT    NOT NULL,
+    version INTEGER NOT NULL,
+    value   TEXT    NOT NULL,
+    stored_at REAL  NOT NULL,
+    PRIMARY KEY (cache, key)
+);
+
+CREATE TABLE IF NOT EXISTS shopify_orders (
+    name       TEXT NOT NULL,
+    store      TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (name, store)
+);
+
+CREATE TABLE IF NOT EXISTS shopify_sync (
+    store          TEXT PRIMARY KEY,
+    updated_at_min TEXT
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    name       TEXT PRIMARY KEY,
+    started_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+ORDER_WIDTH = 18    # len(ORDER_HEADER)
+PAYOUT_WIDTH = 8    # len(PAYOUT_HEADER)
+EVENT_RETENTION = 3600.0    # seconds a change event stays available to /events
+# Tag of this process in new payout IDs: the collision check below only sees
+# the local database, so a second instance (e.g. during a deploy's overlap)
+# must not mint the same ID for the same minute
+PAYOUT_ID_TAG = os.getenv("PAYOUT_ID_TAG") or os.urandom(2).hex()
+
+
+def _text(val) -> str:
+    """Store every cell the way Sheets hands it back: as a string."""
+    return "" if val is None else str(val)
+
+
+def _bump(conn: sqlite3.Connection, driver: str, kind: str = "reload",
+          row: Optional[List[str]] = None) -> None:
+    """New data version for ``driver`` plus a change event (``order`` /
+    ``payout`` with the new row, or ``reload`` when the whole tab changed)."""
+    conn.execute(
+        "INSERT INTO versions (driver, version) VALUES (?, 1) "
+        "ON CONFLICT (driver) DO UPDATE SET version = version + 1",
+        (driver,),
+    )
+    version = conn.execute("SELECT version FROM versions WHERE driver = ?", (driver,)).fetchone()[0]
+    now = time.time()
+    cur = conn.execute(
+        "INSERT INTO events (driver, kind, row, created_at, version) VALUES (?, ?, ?, ?, ?)",
+        (driver, kind, None if row is None else json.dumps(row), now, version),
+    )
+    if cur.lastrowid % 500 == 0:
+        conn.execute("DELETE FROM events WHERE created_at < ?", (now - EVENT_RETENTION,))
+
+
+def _day(val) -> str:
+    try:
+        return dt.datetime.strptime(val, "%Y-%m-%d").date().isoformat()
+    except (TypeError, ValueError):
+        return ""
+
+
+def _cents(val) -> int:
+    try:
+        return round(float(val) * 100)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def _bucket(row: List[str]) -> Tuple[str, str, int, int]:
+    """``(day, status, cash, fees)`` rollup contribution of an order row."""
+    return _day(row[12]), row[9], _cents(row[13]), _cents(row[14])
+
+
+def _roll(conn: sqlite3.Connection, driver: str, row: List[str], sign: int,
+          table: str = "rollups") -> None:
+    day, status, cash, fees = _bucket(row)
+    conn.execute(
+        f"INSERT INTO {table} (driver, day, status, orders, cash, fees) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (driver, day, status) DO UPDATE SET orders = orders + excluded.orders, "
+        "cash = cash + excluded.cash, fees = fees + excluded.fees",
+        (driver, day, status, sign, sign * cash, sign * fees),
+    )
+
+
+def _rebuild_rollups(conn: sqlite3.Connection, driver: str) -> None:
+    conn.execute("DELETE FROM rollups WHERE driver = ?", (driver,))
+    totals: Dict[Tuple[str, str], List[int]] = {}
+    for (raw,) in conn.execute("SELECT row FROM orders WHERE driver = ?", (driver,)):
+        day, status, cash, fees = _bucket(json.loads(raw))
+        t = totals.setdefault((day, status), [0, 0, 0])
+        t[0] += 1
+        t[1] += cash
+        t[2] += fees
+    conn.executemany(
+        "INSERT INTO rollups (driver, day, status, orders, cash, fees) VALUES (?, ?, ?, ?, ?, ?)",
+        [(driver, day, status, *t) for (day, status), t in totals.items()],
+    )
+
+
+def _next_seq(conn: sqlite3.Connection, table: str, driver: str) -> int:
+    return conn.execute(
+        f"SELECT COALESCE(MAX(seq), 0) + 1 FROM {table} WHERE driver = ?", (driver,)
+    ).fetchone()[0]
+
+
+def _index_row(conn: sqlite3.Connection, driver: str, seq: int, row: List[str]) -> None:
+    conn.execute("DELETE FROM search_terms WHERE driver = ? AND seq = ?", (driver, seq))
+    conn.executemany(
+        "INSERT OR IGNORE INTO search_terms (term, driver, seq) VALUES (?, ?, ?)",
+        [(t, driver, seq) for t in row_terms(row)],
+    )
+
+
+def _rebuild_search(conn: sqlite3.Connection, driver: str) -> None:
+    conn.execute("DELETE FROM search_terms WHERE driver = ?", (driver,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO search_terms (term, driver, seq) VALUES (?, ?, ?)",
+        [(t, driver, seq)
+         for seq, raw in conn.execute("SELECT seq, row FROM orders WHERE driver = ?", (driver,)).fetchall()
+         for t in row_terms(json.loads(raw))],
+    )
+
+
+def _archived_keys(conn: sqlite3.Connection, driver: str, kind: str) -> set:
+    cur = conn.execute("SELECT key FROM archived WHERE driver = ? AND kind = ?", (driver, kind))
+    return {k for (k,) in cur}
+
+
+def _by_day(orders: List[List[str]], payouts: List[List[str]]
+            ) -> Tuple[Dict[str, List[List[str]]], Dict[str, List[List[str]]]]:
+    """Orders by scan day and payouts by creation day – their segments."""
+    order_days: Dict[str, List[List[str]]] = {}
+    for r in orders:
+        order_days.setdefault(_day(r[12]), []).append(r)
+    payout_days: Dict[str, List[List[str]]] = {}
+    for r in payouts:
+        payout_days.setdefault(_day(r[1][:10]), []).append(r)
+    return order_days, payout_days
+
+
+def _mark_archived(conn: sqlite3.Connection, driver: str, kind: str, key: str, day: str,
+                   terms: Iterable[str] = ()) -> None:
+    conn.executemany(
+        "INSERT OR IGNORE INTO archive_terms (term, driver, key) VALUES (?, ?, ?)",
+        [(t, driver, key) for t in terms],
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO archived (driver, kind, key, day) VALUES (?, ?, ?, ?)",
+        (driver, kind, key, day),
+    )
+
+
+def _restore(conn: sqlite3.Connection, segments: SegmentStore, driver: str,
+             orders: List[List[str]], payouts: List[List[str]]) -> None:
+    """Re-archive archive-tab rows the ``archived`` table does not list."""
+    known_orders = _archived_keys(conn, driver, "orders")
+    known_payouts = _archived_keys(conn, driver, "payouts")
+    orders = list({r[1]: r for r in orders if r[1] and r[1] not in known_orders}.values())
+    payouts = list({r[0]: r for r in payouts if r[0] and r[0] not in known_payouts}.values())
+    if not orders and not payouts:
+        return
+    order_days, payout_days = _by_day(orders, payouts)
+    segments.append(driver, "orders", order_days)
+    segments.append(driver, "payouts", payout_days)
+    for day, rows in order_days.items():
+        for r in rows:
+            _roll(conn, driver, r, +1, table="archive_rollups")
+            _mark_archived(conn, driver, "orders", r[1], day, row_terms(r))
+    for day, rows in payout_days.items():
+        for r in rows:
+            _mark_archived(conn, driver, "payouts", r[0], day)
+    log.info("restored %d orders and %d payouts of %s from the archive tabs",
+             len(orders), len(payouts), driver)
+
+
+def _order_for_update(conn: sqlite3.Connection, driver: str,
+                      name: str) -> Optional[Tuple[int, List[str]]]:
+    hit = conn.execute(
+        "SELECT seq, row FROM orders WHERE driver = ? AND name = ? ORDER BY seq LIMIT 1",
+        (driver, name),
+    ).fetchone()
+    return (hit[0], json.loads(hit[1])) if hit else None
+
+
+def _payout_for_update(conn: sqlite3.Connection, driver: str,
+                       payout_id: str) -> Optional[Tuple[int, List[str]]]:
+    hit = conn.execute(
+        "SELECT seq, row FROM payouts WHERE driver = ? AND payout_id = ? ORDER BY seq LIMIT 1",
+        (driver, payout_id),
+    ).fetchone()
+    return (hit[0], json.loads(hit[1])) if hit else None
+
+
+def _open_payout(conn: sqlite3.Connection, driver: str) -> Optional[List[str]]:
+    for (raw,) in conn.execute(
+        "SELECT row FROM payouts WHERE driver = ? ORDER BY seq DESC", (driver,)
+    ):
+        row = json.loads(raw)
+        if row[6].lower() != "paid":
+            return row
+    return None
+
+
+def _utc(ts: Optional[str]) -> str:
+    """An ISO timestamp as UTC text, so SQL compares instants rather than
+    Shopify's shop-local offsets (which change with DST)."""
+    if not ts:
+        return ""
+    try:
+        when = dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return ts
+    return when.astimezone(dt.timezone.utc).isoformat()
+
+
+def _search_hits(prefixes: List[List[str]]) -> Tuple[str, List[str]]:
+    """SQL for the ``(archived, driver, ref)`` rows matching every query token.
+
+    Each token is the union of its alternatives' prefix ranges over live
+    (``seq``) and archived (``key``) terms; the tokens are intersected."""
+    tokens, params = [], []
+    for alternatives in prefixes:
+        ranges = []
+        for p in alternatives:
+            ranges += [
+                "SELECT 0 AS archived, driver, seq AS ref FROM search_terms "
+                "WHERE term >= ? AND term < ?",
+                "SELECT 1, driver, key FROM archive_terms WHERE term >= ? AND term < ?",
+            ]
+            params += [p, p + "\U0010ffff"] * 2
+        tokens.append(f"SELECT * FROM ({' UNION '.join(ranges)})")
+    return " INTERSECT ".join(tokens), params
+
+
+def _new_payout_id(conn: sqlite3.Connection, driver: str, now: dt.datetime) -> str:
+    """``PO-YYYYMMDD-HHMM-<tag>``, suffixed ``-2``, ``-3`` … when that ID is taken."""
+    base = f"PO-{now:%Y%m%d-%H%M}-{PAYOUT_ID_TAG}"
+    payout_id, n = base, 1
+    while conn.execute(
+        "SELECT 1 FROM payouts WHERE driver = ? AND payout_id = ? UNION ALL "
+        "SELECT 1 FROM archived WHERE driver = ? AND kind = 'payouts' AND key = ?",
+        (driver, payout_id, driver, payout_id),
+    ).fetchone():
+        n += 1
+        payout_id = f"{base}-{n}"
+    return payout_id
+
+
+def _post_entry(conn: sqlite3.Connection, driver: str, payout: List[str], order_name: str,
+                names: List[str], cash: int, fees: int) -> List[str]:
+    """Append a ledger entry and set the payout row's totals to its ledger sums."""
+    conn.execute(
+        "INSERT INTO payout_ledger (driver, payout_id, order_name, cash, fees, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (driver, payout[0], order_name, cash, fees, time.time()),
+    )
+    cash_cents, fee_cents = conn.execute(
+        "SELECT IFNULL(SUM(cash), 0), IFNULL(SUM(fees), 0) FROM payout_ledger "
+        "WHERE driver = ? AND payout_id = ?", (driver, payout[0]),
+    ).fetchone()
+    cash_total, fee_total = cash_cents / 100, fee_cents / 100
+    payout[2:6] = [", ".join(names), _text(cash_total), _text(fee_total),
+                   _text(round(cash_total - fee_total, 2))]
+    conn.execute(
+        "UPDATE payouts SET row = ? WHERE driver = ? AND payout_id = ?",
+        (json.dumps(payout), driver, payout[0]),
+    )
+    _bump(conn, driver, "payout", payout)
+    return payout
+
+
+def _reconcile(conn: sqlite3.Connection, driver: str, payouts: Iterable[List[str]]) -> None:
+    """Post a balancing entry (no order name) for every payout whose totals –
+    read from the sheet, or edited there by hand – differ from its ledger."""
+    sums = {pid: (cash, fees) for pid, cash, fees in conn.execute(
+        "SELECT payout_id, SUM(cash), SUM(fees) FROM payout_ledger WHERE driver = ? "
+        "GROUP BY payout_id", (driver,),
+    )}
+    now = time.time()
+    entries = []
+    for p in payouts:
+        cash, fees = sums.get(p[0], (0, 0))
+        if (_cents(p[3]), _cents(p[4])) != (cash, fees):
+            entries.append((driver, p[0], "", _cents(p[3]) - cash, _cents(p[4]) - fees, now))
+    conn.executemany(
+        "INSERT INTO payout_ledger (driver, payout_id, order_name, cash, fees, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)", entries,
+    )
+
+
+def _credit(conn: sqlite3.Connection, driver: str, row: List[str], cash: float,
+            fee: float) -> Tuple[Optional[List[str]], bool]:
+    """Add order ``row`` to the open payout, opening one when there is none.
+
+    An order whose payout ID names an existing (or archived) payout is
+    left alone, so a retried or concurrent delivery is counted once; an
+    ID that names no payout at all counts as none."""
+    if row[15] and (_payout_for_update(conn, driver, row[15]) or conn.execute(
+        "SELECT 1 FROM archived WHERE driver = ? AND kind = 'payouts' AND key = ?",
+        (driver, row[15]),
+    ).fetchone()):
+        return None, False
+    payout = _open_payout(conn, driver)
+    created = payout is None
+    if created:
+        now = dt.datetime.now()
+        payout = _pad([_new_payout_id(conn, driver, now), now.strftime("%Y-%m-%d %H:%M:%S"),
+                       "", 0.0, 0.0, 0.0, "pending", ""], PAYOUT_WIDTH)
+        conn.execute(
+            "INSERT INTO payouts (driver, seq, payout_id, row) VALUES (?, ?, ?, ?)",
+            (driver, _next_seq(conn, "payouts", driver), payout[0], json.dumps(payout)),
+        )
+    names = [o.strip() for o in payout[2].split(",") if o.strip()] + [row[1]]
+    payout = _post_entry(conn, driver, payout, row[1], names, _cents(cash), _cents(fee))
+    row[15] = payout[0]
+    return payout, created
+
+
+def _debit(conn: sqlite3.Connection, driver: str, row: List[str], cash: float,
+           fee: float) -> Optional[List[str]]:
+    """Take order ``row`` back out of its payout; None if it was not in one."""
+    found = _payout_for_update(conn, driver, row[15]) if row[15] else None
+    if found is None:
+        return None
+    payout = found[1]
+    names = [o.strip() for o in payout[2].split(",") if o.strip()]
+    if row[1] not in names:
+        return None
+    names.remove(row[1])
+    payout = _post_entry(conn, driver, payout, row[1], names, -_cents(cash), -_cents(fee))
+    row[15] = ""
+    return payout
+
+
+def _pad(row, width: int) -> List[str]:
+    row = [_text(v) for v in row]
+    if len(row) < width:
+        row += [""] * (width - len(row))
+    return row
+
+
+class OrderStore:
+    def __init__(self, path: str, segments: Optional[SegmentStore] = None):
+        self.path = path
+        self.segments = segments or SegmentStore(
+            os.path.join(os.path.dirname(os.path.abspath(path)), "archive")
+        )
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # databases created before events carried the data version
+        if "version" not in {c[1] for c in conn.execute("PRAGMA table_info(events)")}:
+            try:
+                conn.execute("ALTER TABLE events ADD COLUMN version INTEGER")
+            except sqlite3.OperationalError:
+                pass                    # another worker added it first
+        conn.execute("CREATE INDEX IF NOT EXISTS events_driver_version ON events (driver, version)")
+        # databases created before the rollup / search tables existed
+        for table, rebuild in (("rollups", _rebuild_rollups), ("search_terms", _rebuild_search)):
+            if conn.execute("SELECT 1 FROM orders LIMIT 1").fetchone() and \
+                    not conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                with self._write() as conn:
+                    for (driver,) in conn.execute("SELECT DISTINCT driver FROM orders").fetchall():
+                        rebuild(conn, driver)
+
+    # ─── connection handling ───────────────────────────────────
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        """Context manager for a write transaction (serialised across workers)."""
+        return _Tx(self._conn())
+
+    # ─── bootstrap from Sheets ─────────────────────────────────
+    def is_loaded(self, driver: str) -> bool:
+        cur = self._conn().execute("SELECT 1 FROM tabs WHERE driver = ?", (driver,))
+        return cur.fetchone() is not None
+
+    def load(self, driver: str, order_rows: List[List[str]], payout_rows: List[List[str]],
+             archived_orders: Iterable[List[str]] = (),
+             archived_payouts: Iterable[List[str]] = ()) -> bool:
+        """Seed ``driver`` from sheet values (header excluded).
+
+        ``archived_*`` are the rows of the driver's archive tabs; the ones
+        this store does not know as archived yet are restored into the
+        segments first.  Returns False if another worker finished loading
+        first."""
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM tabs WHERE driver = ?", (driver,)).fetchone():
+                return False
+            _restore(conn, self.segments, driver,
+                     [_pad(r, ORDER_WIDTH) for r in archived_orders if any(r)],
+                     [_pad(r, PAYOUT_WIDTH) for r in archived_payouts if any(r)])
+            conn.execute("DELETE FROM orders WHERE driver = ?", (driver,))
+            conn.execute("DELETE FROM payouts WHERE driver = ?", (driver,))
+            # rows archived but not yet deleted from the sheet stay archived
+            gone_orders = _archived_keys(conn, driver, "orders")
+            gone_payouts = _archived_keys(conn, driver, "payouts")
+            order_rows = (_pad(r, ORDER_WIDTH) for r in order_rows if any(r))
+            payout_rows = [r for r in (_pad(r, PAYOUT_WIDTH) for r in payout_rows if any(r))
+                           if r[0] not in gone_payouts]
+            conn.executemany(
+                "INSERT INTO orders (driver, seq, name, row) VALUES (?, ?, ?, ?)",
+                [(driver, seq, r[1], json.dumps(r))
+                 for seq, r in enumerate((r for r in order_rows if r[1] not in gone_orders), 1)],
+            )
+            conn.executemany(
+                "INSERT INTO payouts (driver, seq, payout_id, row) VALUES (?, ?, ?, ?)",
+                [(driver, seq, r[0], json.dumps(r))
+                 for seq, r in enumerate(payout_rows, 1)],
+            )
+            _reconcile(conn, driver, payout_rows)
+            conn.execute(
+                "INSERT INTO tabs (driver, loaded_at) VALUES (?, datetime('now'))", (driver,)
+            )
+            _rebuild_rollups(conn, driver)
+            _rebuild_search(conn, driver)
+            _bump(conn, driver)
+        return True
+
+    def reset(self, driver: str) -> None:
+        """Forget ``driver`` so the next access reloads it from Sheets."""
+        with self._write() as conn:
+            conn.execute("DELETE FROM tabs WHERE driver = ?", (driver,))
+            conn.execute("DELETE FROM orders WHERE driver = ?", (driver,))
+            conn.execute("DELETE FROM payouts WHERE driver = ?", (driver,))
+            conn.execute("DELETE FROM rollups WHERE driver = ?", (driver,))
+            conn.execute("DELETE FROM search_terms WHERE driver = ?", (driver,))
+            _bump(conn, driver)
+
+    def merge_orders(self, driver: str, rows: List[List[str]]) -> int:
+        """Append sheet rows whose order name is not in the store yet."""
+        return self._merge("orders", "name", 1, ORDER_WIDTH, "order", driver, rows)
+
+    def merge_payouts(self, driver: str, rows: List[List[str]]) -> int:
+        """Append sheet rows whose payout ID is not in the store yet."""
+        return self._merge("payouts", "payout_id", 0, PAYOUT_WIDTH, "payout", driver, rows)
+
+    def _merge(self, table: str, key: str, key_col: int, width: int, kind: str,
+               driver: str, rows: List[List[str]]) -> int:
+        added = 0
+        with self._write() as conn:
+            if not conn.execute("SELECT 1 FROM tabs WHERE driver = ?", (driver,)).fetchone():
+                return 0        # not loaded (or being reset) – the next load reads everything
+            gone = _archived_keys(conn, driver, table)
+            for r in rows:
+                r = _pad(r, width)
+                if not r[key_col] or r[key_col] in gone or conn.execute(
+                    f"SELECT 1 FROM {table} WHERE driver = ? AND {key} = ?", (driver, r[key_col])
+                ).fetchone():
+                    continue
+                seq = _next_seq(conn, table, driver)
+                conn.execute(
+                    f"INSERT INTO {table} (driver, seq, {key}, row) VALUES (?, ?, ?, ?)",
+                    (driver, seq, r[key_col], json.dumps(r)),
+                )
+                if table == "orders":
+                    _roll(conn, driver, r, +1)
+                    _index_row(conn, driver, seq, r)
+                else:
+                    _reconcile(conn, driver, [r])
+                _bump(conn, driver, kind, r)
+                added += 1
+        return added
+
+    def sheet_rows(self, tab: str) -> Optional[int]:
+        hit = self._conn().execute("SELECT rows FROM sheet_rows WHERE tab = ?", (tab,)).fetchone()
+        return hit[0] if hit else None
+
+    def set_sheet_rows(self, tab: str, rows: int, expected: Optional[int] = None) -> bool:
+        """Record the sheet row count of ``tab`` (only if it is still ``expected``)."""
+        with self._write() as conn:
+            if expected is None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sheet_rows (tab, rows) VALUES (?, ?)", (tab, rows)
+                )
+                return True
+            cur = conn.execute(
+                "UPDATE sheet_rows SET rows = ? WHERE tab = ? AND rows = ?", (rows, tab, expected)
+            )
+            return cur.rowcount == 1
+
+    # ─── data versions ─────────────────────────────────────────
+    def data_version(self, driver: str) -> int:
+        hit = self._conn().execute(
+            "SELECT version FROM versions WHERE driver = ?", (driver,)
+        ).fetchone()
+        return hit[0] if hit else 0
+
+    # ─── change events ─────────────────────────────────────────
+    def last_event_id(self) -> int:
+        hit = self._conn().execute("SELECT MAX(id) FROM events").fetchone()
+        return hit[0] or 0
+
+    def events_since(self, after: int, driver: Optional[str] = None,
+                     limit: int = 200) -> List[Tuple[int, str, str, Optional[List[str]]]]:
+        """``(id, driver, kind, row)`` after event ``after``.
+
+        A single ``reload`` event (id -1) is returned when events after
+        ``after`` have already been pruned."""
+        conn = self._conn()
+        oldest = conn.execute("SELECT MIN(id) FROM events").fetchone()[0]
+        if oldest is not None and after < oldest - 1:
+            return [(-1, driver or "*", "reload", None)]
+        sql, args = "SELECT id, driver, kind, row FROM events WHERE id > ?", [after]
+        if driver:
+            sql += " AND driver = ?"
+            args.append(driver)
+        cur = conn.execute(sql + " ORDER BY id LIMIT ?", (*args, limit))
+        return [(i, d, k, json.loads(r) if r else None) for i, d, k, r in cur]
+
+    def changes_since(self, driver: str, version: int
+                      ) -> Tuple[int, Optional[List[Tuple[str, List[str]]]]]:
+        """``(current version, [(kind, row)] after ``version``, oldest first)``.
+
+        The list is None when the changes cannot be replayed: events were
+        pruned, or a whole-tab reload (load, archive) happened in between."""
+        conn = self._conn()
+        current = self.data_version(driver)
+        if version > current:
+            return current, None
+        cur = conn.execute(
+            "SELECT kind, row FROM events WHERE driver = ? AND version > ? AND version <= ? "
+            "ORDER BY id", (driver, version, current),
+        )
+        events = cur.fetchall()
+        if len(events) != current - version or any(kind == "reload" for kind, _ in events):
+            return current, None
+        return current, [(kind, json.loads(row)) for kind, row in events]
+
+    # ─── orders ────────────────────────────────────────────────
+    def order_rows(self, driver: str) -> List[List[str]]:
+        cur = self._conn().execute(
+            "SELECT row FROM orders WHERE driver = ? ORDER BY seq", (driver,)
+        )
+        return [json.loads(r) for (r,) in cur]
+
+    def find_order(self, driver: str, name: str) -> Optional[List[str]]:
+        cur = self._conn().execute(
+            "SELECT row FROM orders WHERE driver = ? AND name = ? ORDER BY seq LIMIT 1",
+            (driver, name),
+        )
+        hit = cur.fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    def find_orders(self, driver: str, names: Iterable[str]) -> Dict[str, List[str]]:
+        """First row of each of ``names`` that exists, by name."""
+        conn, found = self._conn(), {}
+        for name in dict.fromkeys(names):
+            hit = conn.execute(
+                "SELECT row FROM orders WHERE driver = ? AND name = ? ORDER BY seq LIMIT 1",
+                (driver, name),
+            ).fetchone()
+            if hit:
+                found[name] = json.loads(hit[0])
+        return found
+
+    def append_order(self, driver: str, row: list) -> List[str]:
+        return self.append_orders(driver, [row])[0]
+
+    def append_orders(self, driver: str, rows: List[list]) -> List[List[str]]:
+        """Append rows in one transaction (one event per row)."""
+        rows = [_pad(r, ORDER_WIDTH) for r in rows]
+        with self._write() as conn:
+            seq = _next_seq(conn, "orders", driver)
+            for n, row in enumerate(rows):
+                conn.execute(
+                    "INSERT INTO orders (driver, seq, name, row) VALUES (?, ?, ?, ?)",
+                    (driver, seq + n, row[1], json.dumps(row)),
+                )
+                _roll(conn, driver, row, +1)
+                _index_row(conn, driver, seq + n, row)
+                _bump(conn, driver, "order", row)
+        return rows
+
+    def update_order(self, driver: str, name: str, changes: Dict[int, object],
+                     credit: Optional[Tuple[float, float]] = None,
+                     debit: Optional[Tuple[float, float]] = None,
+                     ) -> Optional[Tuple[List[str], Optional[List[str]], bool]]:
+        """Apply ``{column index: value}`` to the first row named ``name``.
+
+        ``credit=(cash, fee)`` adds the order to the open payout and
+        ``debit=(cash, fee)`` takes it out of its payout, in the same
+        transaction as ``changes`` – a delivery is never saved without its
+        payout entry.  Returns ``(order row, payout row or None when no
+        payout changed, payout created)``; None if the order is unknown."""
+        with self._write() as conn:
+            hit = _order_for_update(conn, driver, name)
+            if hit is None:
+                return None
+            seq, row = hit
+            _roll(conn, driver, row, -1)
+            for idx, val in changes.items():
+                row[idx] = _text(val)
+            payout, created = None, False
+            if credit is not None:
+                payout, created = _credit(conn, driver, row, *credit)
+            elif debit is not None:
+                payout = _debit(conn, driver, row, *debit)
+            conn.execute(
+                "UPDATE orders SET row = ? WHERE driver = ? AND seq = ?",
+                (json.dumps(row), driver, seq),
+            )
+            _roll(conn, driver, row, +1)
+            _index_row(conn, driver, seq, row)
+            _bump(conn, driver, "order", row)
+        return row, payout, created
+
+    # ─── per-day rollups ───────────────────────────────────────
+    def rollups(self, driver: str, start: Optional[str] = None,
+                end: Optional[str] = None) -> List[Tuple[str, str, int, float, float]]:
+        """``(day, status, orders, cash, fees)`` buckets with ``start <= day <= end``.
+
+        Rows without a parseable scan day (``day == ''``) only count when
+        the range is open on both ends."""
+        where, args = "driver = ?", [driver]
+        if start:
+            where += " AND day != '' AND day >= ?"
+            args.append(start)
+        if end:
+            where += " AND day != '' AND day <= ?"
+            args.append(end)
+        # archived rows keep counting
+        sql = (
+            "SELECT day, status, SUM(orders), SUM(cash), SUM(fees) FROM ("
+            f"SELECT day, status, orders, cash, fees FROM rollups WHERE {where} UNION ALL "
+            f"SELECT day, status, orders, cash, fees FROM archive_rollups WHERE {where}"
+            ") GROUP BY day, status HAVING SUM(orders) != 0"
+        )
+        cur = self._conn().execute(sql, args * 2)
+        return [(d, st, n, cash / 100, fees / 100) for d, st, n, cash, fees in cur]
+
+    # ─── search ────────────────────────────────────────────────
+    def search(self, q: str, limit: int = 50,
+               offset: int = 0) -> Tuple[int, List[Tuple[str, List[str]]]]:
+        """``(total matches, [(driver, row)])`` for the ``limit`` rows after ``offset``.
+
+        Live rows come first, then archived ones, newest segment first.  The
+        tokens are intersected and the page is cut in SQL; archived rows of
+        the page are read back with one pass per segment."""
+        prefixes = query_prefixes(q)
+        if not prefixes:
+            return 0, []
+        hits, params = _search_hits(prefixes)
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM ({hits})", params).fetchone()[0]
+        if not total:
+            return 0, []
+        page = conn.execute(
+            f"SELECT h.archived, h.driver, h.ref, a.day FROM ({hits}) AS h "
+            "LEFT JOIN archived AS a ON h.archived = 1 AND a.driver = h.driver "
+            "AND a.kind = 'orders' AND a.key = h.ref "
+            "ORDER BY h.archived, h.driver, a.day DESC, h.ref LIMIT ? OFFSET ?",
+            (*params, limit, offset),
+        ).fetchall()
+        segments: Dict[Tuple[str, str], List[str]] = {}
+        for archived, driver, ref, day in page:
+            if archived and day is not None:
+                segments.setdefault((driver, day), []).append(ref)
+        archived_rows = {
+            (driver, name): row
+            for (driver, day), names in segments.items()
+            for name, row in self.segments.find(driver, "orders", day, 1, names).items()
+        }
+        rows = []
+        for archived, driver, ref, _ in page:
+            row = archived_rows.get((driver, ref)) if archived else self._order_at(driver, ref)
+            if row:
+                rows.append((driver, row))
+        return total, rows
+
+    def _order_at(self, driver: str, seq: int) -> Optional[List[str]]:
+        hit = self._conn().execute(
+            "SELECT row FROM orders WHERE driver = ? AND seq = ?", (driver, seq)
+        ).fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    # ─── archive ───────────────────────────────────────────────
+    def archive(self, driver: str, order_names: List[str], payout_ids: List[str]) -> Tuple[int, int]:
+        """Move orders and payouts to archive segments; returns how many moved.
+
+        Segments are written (and fsynced) before the rows leave the
+        store, so a crash in between leaves at worst a duplicate copy in
+        a segment, never a lost row."""
+        orders = [r for r in (self.find_order(driver, n) for n in order_names) if r]
+        payouts = [r for r in (self.find_payout(driver, p) for p in payout_ids) if r]
+        order_days, payout_days = _by_day(orders, payouts)
+        self.segments.append(driver, "orders", order_days)
+        self.segments.append(driver, "payouts", payout_days)
+
+        with self._write() as conn:
+            for day, rows in order_days.items():
+                for r in rows:
+                    for seq, raw in conn.execute(
+                        "SELECT seq, row FROM orders WHERE driver = ? AND name = ?", (driver, r[1])
+                    ).fetchall():
+                        live = json.loads(raw)
+                        _roll(conn, driver, live, -1)
+                        _roll(conn, driver, live, +1, table="archive_rollups")
+                        conn.execute(
+                            "DELETE FROM search_terms WHERE driver = ? AND seq = ?", (driver, seq)
+                        )
+                    conn.execute("DELETE FROM orders WHERE driver = ? AND name = ?", (driver, r[1]))
+                    _mark_archived(conn, driver, "orders", r[1], day, row_terms(r))
+            for day, rows in payout_days.items():
+                for r in rows:
+                    conn.execute(
+                        "DELETE FROM payouts WHERE driver = ? AND payout_id = ?", (driver, r[0])
+                    )
+                    _mark_archived(conn, driver, "payouts", r[0], day)
+            _bump(conn, driver)
+        return len(orders), len(payouts)
+
+    def has_archive(self, driver: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM archived WHERE driver = ? LIMIT 1", (driver,)
+        ).fetchone() is not None
+
+    def archived_keys(self, driver: str, kind: str) -> set:
+        return _archived_keys(self._conn(), driver, kind)
+
+    def archived_orders(self, driver: str) -> List[List[str]]:
+        """Archived order rows, read back from the segments."""
+        keys = self.archived_keys(driver, "orders")
+        latest = {r[1]: r for r in self.segments.rows(driver, "orders") if r[1] in keys}
+        return list(latest.values())
+
+    def archive_generation(self) -> int:
+        """Changes whenever rows are archived or restored."""
+        return self._conn().execute("SELECT IFNULL(MAX(rowid), 0) FROM archived").fetchone()[0]
+
+    # ─── sheet layout ──────────────────────────────────────────
+    def sheet_generation(self, tab: str) -> int:
+        """Changes whenever rows are deleted from ``tab``."""
+        hit = self._conn().execute(
+            "SELECT generation FROM sheet_layouts WHERE tab = ?", (tab,)
+        ).fetchone()
+        return hit[0] if hit else 0
+
+    def rows_deleted(self, tab: str, rows: int) -> None:
+        """Record a deletion from ``tab``, which now has ``rows`` rows.
+
+        Call it once the sheet has confirmed the delete, never before:
+        a mirror that sees the new generation re-reads the tab's layout."""
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO sheet_layouts (tab, generation) VALUES (?, 1) "
+                "ON CONFLICT (tab) DO UPDATE SET generation = generation + 1", (tab,),
+            )
+            conn.execute("INSERT OR REPLACE INTO sheet_rows (tab, rows) VALUES (?, ?)", (tab, rows))
+
+    # ─── payouts ───────────────────────────────────────────────
+    def payout_rows(self, driver: str) -> List[List[str]]:
+        cur = self._conn().execute(
+            "SELECT row FROM payouts WHERE driver = ? ORDER BY seq", (driver,)
+        )
+        return [json.loads(r) for (r,) in cur]
+
+    def find_payout(self, driver: str, payout_id: str) -> Optional[List[str]]:
+        cur = self._conn().execute(
+            "SELECT row FROM payouts WHERE driver = ? AND payout_id = ? ORDER BY seq LIMIT 1",
+            (driver, payout_id),
+        )
+        hit = cur.fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    def update_payout(self, driver: str, payout_id: str,
+                      changes: Dict[int, object]) -> Optional[List[str]]:
+        with self._write() as conn:
+            hit = conn.execute(
+                "SELECT seq, row FROM payouts WHERE driver = ? AND payout_id = ? ORDER BY seq LIMIT 1",
+                (driver, payout_id),
+            ).fetchone()
+            if hit is None:
+                return None
+            seq, row = hit[0], json.loads(hit[1])
+            for idx, val in changes.items():
+                row[idx] = _text(val)
+            conn.execute(
+                "UPDATE payouts SET row = ? WHERE driver = ? AND seq = ?",
+                (json.dumps(row), driver, seq),
+            )
+            _reconcile(conn, driver, [row])
+            _bump(conn, driver, "payout", row)
+        return row
+
+    # ─── shared cache entries ──────────────────────────────────
+    def cache_get(self, cache: str, key: str, version: int, max_age: float):
+        hit = self._conn().execute(
+            "SELECT value FROM cache_entries "
+            "WHERE cache = ? AND key = ? AND version = ? AND stored_at >= ?",
+            (cache, key, version, time.time() - max_age),
+        ).fetchone()
+        return json.loads(hit[0]) if hit else None
+
+    def cache_put(self, cache: str, key: str, version: int, value) -> None:
+        # never replace a newer entry with one computed from older data
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO cache_entries (cache, key, version, value, stored_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (cache, key) DO UPDATE SET version = excluded.version, "
+                "value = excluded.value, stored_at = excluded.stored_at "
+                "WHERE excluded.version >= cache_entries.version",
+                (cache, key, version, json.dumps(value), time.time()),
+            )
+
+    # ─── Shopify order cache ───────────────────────────────────
+    def shopify_orders(self, name: str) -> List[Tuple[str, dict]]:
+        """Cached ``(store name, order)`` pairs for an order name."""
+        cur = self._conn().execute(
+            "SELECT store, data FROM shopify_orders WHERE name = ?", (name,)
+        )
+        return [(store, json.loads(data)) for store, data in cur]
+
+    def put_shopify_orders(self, store: str, orders: List[dict]) -> None:
+        """Upsert orders; an older copy never overwrites a newer one."""
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT INTO shopify_orders (name, store, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (name, store) DO UPDATE SET "
+                "created_at = excluded.created_at, updated_at = excluded.updated_at, "
+                "data = excluded.data WHERE excluded.updated_at >= shopify_orders.updated_at",
+                [(o["name"], store, _utc(o.get("created_at")), _utc(o.get("updated_at")),
+                  json.dumps(o)) for o in orders if o.get("name")],
+            )
+
+    def prune_shopify_orders(self, created_before: str) -> None:
+        with self._write() as conn:
+            conn.execute("DELETE FROM shopify_orders WHERE created_at < ?",
+                         (_utc(created_before),))
+
+    def shopify_cursor(self, store: str) -> Optional[str]:
+        hit = self._conn().execute(
+            "SELECT updated_at_min FROM shopify_sync WHERE store = ?", (store,)
+        ).fetchone()
+        return hit[0] if hit else None
+
+    def set_shopify_cursor(self, store: str, updated_at_min: str) -> None:
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO shopify_sync (store, updated_at_min) VALUES (?, ?) "
+                "ON CONFLICT (store) DO UPDATE SET updated_at_min = excluded.updated_at_min",
+                (store, updated_at_min),
+            )
+
+    # ─── background jobs ───────────────────────────────────────
+    def claim(self, job: str, interval: float) -> bool:
+        """True for exactly one worker per ``interval`` seconds."""
+        now = time.time()
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO jobs (name) VALUES (?)", (job,))
+            cur = conn.execute(
+                "UPDATE jobs SET started_at = ? WHERE name = ? AND started_at <= ?",
+                (now, job, now - interval),
+            )
+            return cur.rowcount == 1
+
+    def lease(self, job: str, ttl: float) -> Optional["Lease"]:
+        """Hold ``job`` until the lease is released; None while another
+        worker holds it.  The lease is renewed every ``ttl / 3`` seconds,
+        so it only lapses (after ``ttl``) when its holder died."""
+        now = time.time()
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO jobs (name) VALUES (?)", (job,))
+            cur = conn.execute(
+                "UPDATE jobs SET started_at = ? WHERE name = ? AND started_at <= ?",
+                (now, job, now - ttl),
+            )
+            if cur.rowcount != 1:
+                return None
+        return Lease(self, job, ttl, now)
+
+
+class Lease:
+    """A job held through ``OrderStore.lease``; use it as a context manager."""
+
+    def __init__(self, store: OrderStore, job: str, ttl: float, stamp: float):
+        self.job = job
+        self.ttl = ttl
+        self._store = store
+        self._stamp: Optional[float] = stamp       # our started_at in ``jobs``
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        threading.Thread(target=self._keep, name=f"lease-{job}", daemon=True).start()
+
+    @property
+    def held(self) -> bool:
+        return self._stamp is not None
+
+    def _keep(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if not self._swap(time.time()):
+                    log.warning("lease on %s lost", self.job)
+                    return
+            except sqlite3.Error:
+                log.warning("lease on %s: renewal failed", self.job, exc_info=True)
+
+    def _swap(self, stamp: Optional[float]) -> bool:
+        with self._lock:
+            if self._stamp is None:
+                return False
+            with self._store._write() as conn:
+                cur = conn.execute(
+                    "UPDATE jobs SET started_at = ? WHERE name = ? AND started_at = ?",
+                    (stamp or 0, self.job, self._stamp),
+                )
+            self._stamp = stamp if cur.rowcount == 1 else None
+            return cur.rowcount == 1
+
+    def release(self) -> None:
+        self._stop.set()
+        self._swap(None)
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class _Tx:
+    """``BEGIN IMMEDIATE`` … ``COMMIT`` / ``ROLLBACK`` around a block."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
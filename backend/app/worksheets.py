@@ -0,0 +1,103 @@
+"""
+Worksheet handles
+─────────────────
+Lazily opened spreadsheet plus a per-process cache of worksheet handles
+whose header row has been checked.
+
+Nothing talks to Google until the first worksheet is needed: the gspread
+client is authorised and the spreadsheet opened on first use, so the app
+serves ``/health`` straight away.  A tab's header is read (and repaired)
+once, when the tab is first opened; after that ``worksheet()`` is a dict
+lookup.  ``revalidate()`` re-reads every cached header with a single
+batchGet and is run periodically from a background thread, which catches
+tabs that were edited, renamed or deleted by hand.
+"""
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import gspread
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+
+def _a1_tab(tab: str) -> str:
+    return "'" + tab.replace("'", "''") + "'"
+
+
+class Workbook:
+    def __init__(self, authorize: Callable[[], gspread.Client], spreadsheet_id: str):
+        self._authorize = authorize
+        self.spreadsheet_id = spreadsheet_id
+        self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        self._open_lock = threading.Lock()
+        self._tabs: Dict[str, Tuple[gspread.Worksheet, List[str]]] = {}
+        self._tab_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        if self._spreadsheet is None:
+            with self._open_lock:
+                if self._spreadsheet is None:
+                    self._spreadsheet = self._authorize().open_by_key(self.spreadsheet_id)
+        return self._spreadsheet
+
+    def worksheet(self, name: str, header: List[str]) -> gspread.Worksheet:
+        """Handle for tab ``name``, created and given ``header`` if needed."""
+        hit = self._tabs.get(name)
+        if hit is not None and hit[1] == header:
+            metrics.cache_event("worksheets", "hit")
+            return hit[0]
+        metrics.cache_event("worksheets", "miss")
+        with self._open_lock:
+            lock = self._tab_locks.setdefault(name, threading.Lock())
+        with lock:
+            hit = self._tabs.get(name)
+            if hit is not None and hit[1] == header:
+                return hit[0]
+            ws = hit[0] if hit is not None else self._open(name, header)
+            _fix_header(ws, ws.row_values(1), header)
+            self._tabs[name] = (ws, header)
+            return ws
+
+    def _open(self, name: str, header: List[str]) -> gspread.Worksheet:
+        try:
+            return self.spreadsheet.worksheet(name)
+        except gspread.WorksheetNotFound:
+            ws = self.spreadsheet.add_worksheet(title=name, rows="1", cols=str(len(header)))
+            ws.append_row(header)
+            return ws
+
+    def forget(self, name: str) -> None:
+        self._tabs.pop(name, None)
+
+    def revalidate(self) -> int:
+        """Re-check the header of every cached tab; returns how many were fixed."""
+        tabs = list(self._tabs.items())
+        if not tabs:
+            return 0
+        try:
+            resp = self.spreadsheet.values_batch_get([f"{_a1_tab(n)}!1:1" for n, _ in tabs])
+        except gspread.exceptions.APIError:
+            # a tab was deleted or renamed: drop the handles, reopen on next use
+            log.warning("worksheet revalidation failed, dropping cached handles", exc_info=True)
+            self._tabs.clear()
+            return 0
+        fixed = 0
+        for (name, (ws, header)), vr in zip(tabs, resp.get("valueRanges", [])):
+            current = (vr.get("values") or [[]])[0]
+            if current != header:
+                _fix_header(ws, current, header)
+                fixed += 1
+        return fixed
+
+
+def _fix_header(ws: gspread.Worksheet, current: List[str], header: List[str]) -> None:
+    """Extend or update the header row to match the expected columns."""
+    if current == header:
+        return
+    for idx, val in enumerate(header, start=1):
+        if idx > len(current) or current[idx - 1] != val:
+            ws.update_cell(1, idx, val)
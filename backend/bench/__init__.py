@@ -0,0 +1,13 @@
+"""
+Endpoint benchmarks
+───────────────────
+Runs the FastAPI app in-process against ``emulator.SheetsEmulator`` and
+``emulator.ShopifyEmulator`` and reports, per endpoint, p50 / p99 latency
+and the number of Sheets and Shopify calls each request costs (background
+mirror writes included)::
+
+    python -m backend.bench --rows 1000,10000,100000
+    python -m backend.bench --rows 10000 --latency 0.08 --quota 60 --json out.json
+
+Every size runs in a fresh interpreter with its own data directory.
+"""
@@ -0,0 +1,270 @@
+"""
+Benchmark runner
+────────────────
+``python -m backend.bench --help`` for the options.  The parent process
+starts one child per ``--rows`` size (``--child-out``) and prints the
+combined table; a child seeds the emulated workbook, imports the app
+against it and times each endpoint.
+"""
+import argparse
+import datetime as dt
+import itertools
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from .emulator import SPREADSHEET_ID, SheetsEmulator, ShopifyEmulator, service_account, wire
+
+SCAN_BATCH = 50
+COLD_SAMPLES = 5
+# mix of delivery statuses the seeded rows cycle through
+STATUS_MIX = [
+    "Dispatched", "En cours", "Livré", "Livré", "Pas de réponse 1",
+    "Livré", "Annulé", "Livré", "Refusé", "Returned",
+]
+# delivered orders per seeded payout
+PAYOUT_SIZE = 25
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m backend.bench", description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", default="1000,10000,100000",
+                   help="comma-separated total order rows, split across the drivers")
+    p.add_argument("--repeat", type=int, default=20, help="requests timed per endpoint")
+    p.add_argument("--latency", type=float, default=0.0,
+                   help="seconds added to every emulated Sheets call")
+    p.add_argument("--shopify-latency", type=float, default=0.0,
+                   help="seconds added to every emulated Shopify call")
+    p.add_argument("--quota", type=int, default=0,
+                   help="emulated Sheets calls per minute before 429s (0 = unlimited)")
+    p.add_argument("--error-rate", type=float, default=0.0,
+                   help="share of emulated Sheets calls answered with a 429")
+    p.add_argument("--app-quota", type=int, default=1_000_000,
+                   help="SHEETS_QUOTA_PER_MINUTE given to the app's scheduler")
+    p.add_argument("--json", dest="json_out", help="also write the results to this file")
+    p.add_argument("--child-out", help=argparse.SUPPRESS)
+    return p.parse_args(argv)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+# ─── child: one size ───────────────────────────────────────────
+def _seed(m, sheets: SheetsEmulator, rows: int) -> Dict[str, List[str]]:
+    """Fill every driver's tabs; returns the active order names per driver."""
+    per_driver = max(rows // len(m.DRIVERS), 1)
+    now = dt.datetime.now()
+    serial = itertools.count(100000)
+    active: Dict[str, List[str]] = {}
+    for driver, cfg in m.DRIVERS.items():
+        orders, payouts, delivered = [m.ORDER_HEADER], [m.PAYOUT_HEADER], []
+        active[driver] = []
+        for i in range(per_driver):
+            when = now - dt.timedelta(days=i % 40, minutes=i % 600)
+            name = f"#{next(serial)}"
+            status = STATUS_MIX[i % len(STATUS_MIX)]
+            tags = ("", "big", "ch")[i % 3]
+            cash = 100 + i % 400
+            fee = m.calculate_driver_fee(tags)
+            row = [
+                when.strftime("%Y-%m-%d %H:%M:%S"), name, f"Client {i}",
+                f"06{i % 100_000_000:08d}", f"{i} Rue {i % 97}, Casablanca", tags,
+                "fulfilled", "open", "irrakids", status, "", "",
+                when.strftime("%Y-%m-%d"), str(cash), str(fee), "",
+            ]
+            if status == "Livré":
+                delivered.append(row)
+            elif status not in m.COMPLETED_STATUSES:
+                active[driver].append(name)
+            orders.append(row)
+        for n in range(0, len(delivered), PAYOUT_SIZE):
+            part = delivered[n:n + PAYOUT_SIZE]
+            payout_id = f"PO-{driver}-{n // PAYOUT_SIZE:05d}"
+            for row in part:
+                row[15] = payout_id
+            cash = sum(float(r[13]) for r in part)
+            fees = sum(float(r[14]) for r in part)
+            payouts.append([
+                payout_id, part[0][0], ", ".join(r[1] for r in part),
+                str(cash), str(fees), str(cash - fees), "paid", part[0][12],
+            ])
+        sheets.add_tab(cfg["order_tab"], orders)
+        sheets.add_tab(cfg["payouts_tab"], payouts)
+    return active
+
+
+def _shopify_order(name: str) -> dict:
+    return {
+        "name": name, "created_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "updated_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "tags": "", "fulfillment_status": "fulfilled", "total_outstanding": "150.00",
+        "shipping_address": {"name": "Bench", "phone": "0600000000",
+                             "address1": "1 Rue Bench", "city": "Rabat"},
+    }
+
+
+class _Runner:
+    def __init__(self, m, client, sheets: SheetsEmulator, shopify: ShopifyEmulator,
+                 rows: int, repeat: int):
+        self.m, self.client = m, client
+        self.sheets, self.shopify = sheets, shopify
+        self.rows, self.repeat = rows, repeat
+        self.results: List[dict] = []
+
+    def measure(self, label: str, request: Callable[[int], object], samples: int = 0,
+                before: Optional[Callable[[int], None]] = None) -> None:
+        timings, sheet_calls, shop_calls = [], 0, 0
+        samples = samples or self.repeat
+        for i in range(samples):
+            if before is not None:
+                before(i)
+            self.m.mirror.flush()
+            s0, p0 = self.sheets.total_calls(), self.shopify.total_calls()
+            started = time.perf_counter()
+            r = request(i)
+            timings.append(time.perf_counter() - started)
+            if r.status_code >= 400:
+                raise SystemExit(f"{label}: HTTP {r.status_code} {r.text[:200]}")
+            # writes queued for the mirror are part of what the request costs
+            self.m.mirror.flush()
+            sheet_calls += self.sheets.total_calls() - s0
+            shop_calls += self.shopify.total_calls() - p0
+        self.results.append({
+            "rows": self.rows, "endpoint": label, "samples": samples,
+            "p50_ms": round(percentile(timings, 50) * 1000, 2),
+            "p99_ms": round(percentile(timings, 99) * 1000, 2),
+            "sheets_calls": round(sheet_calls / samples, 2),
+            "shopify_calls": round(shop_calls / samples, 2),
+        })
+        print(f"  {label:<34} done", file=sys.stderr)
+
+
+def _run_size(args: argparse.Namespace, rows: int) -> List[dict]:
+    data_dir = tempfile.mkdtemp(prefix="delivery-bench-")
+    os.environ.update({
+        "DATA_DIR": data_dir,
+        "SPREADSHEET_ID": SPREADSHEET_ID,
+        "GOOGLE_CREDENTIALS_B64": service_account(),
+        "SHEETS_QUOTA_PER_MINUTE": str(args.app_quota),
+        "SHEET_SYNC_INTERVAL": "0",
+        "SHOPIFY_SYNC_INTERVAL": "0",
+        "HEADER_CHECK_INTERVAL": "0",
+    })
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    from fastapi.testclient import TestClient
+
+    import backend.app.main as m
+
+    sheets = SheetsEmulator(SPREADSHEET_ID, latency=args.latency,
+                            quota_per_minute=args.quota or None, error_rate=args.error_rate)
+    shopify = ShopifyEmulator(latency=args.shopify_latency)
+    wire(m, sheets, shopify)
+    active = _seed(m, sheets, rows)
+    driver = next(iter(m.DRIVERS))
+    domain = m.shopify.stores[0].domain
+    fresh = (f"#{n}" for n in itertools.count(900000))
+
+    with TestClient(m.app) as client:
+        bench = _Runner(m, client, sheets, shopify, rows, args.repeat)
+        cold = min(args.repeat, COLD_SAMPLES)
+        orders = f"/orders?driver={driver}"
+
+        bench.measure("GET /orders (cold)", lambda i: client.get(orders), cold,
+                      before=lambda i: m.order_store.reset(driver))
+        bench.measure("GET /orders", lambda i: client.get(orders))
+        etag = client.get(orders).headers["ETag"]
+        bench.measure("GET /orders (304)",
+                      lambda i: client.get(orders, headers={"If-None-Match": etag}))
+        version = m.order_store.data_version(driver)
+        bench.measure("GET /orders?since=", lambda i: client.get(f"{orders}&since={version}"))
+        bench.measure("GET /payouts", lambda i: client.get(f"/payouts?driver={driver}"))
+        bench.measure("GET /stats", lambda i: client.get(f"/stats?driver={driver}&days=30"))
+
+        def reset_all(i: int) -> None:
+            for d in m.DRIVERS:
+                m.order_store.reset(d)
+
+        bench.measure("GET /admin/stats (cold)", lambda i: client.get("/admin/stats?days=30"),
+                      cold, before=reset_all)
+        bench.measure("GET /admin/stats", lambda i: client.get("/admin/stats?days=30"))
+        bench.measure("GET /admin/dashboard", lambda i: client.get("/admin/dashboard?days=30"))
+        bench.measure("GET /admin/analytics",
+                      lambda i: client.get("/admin/analytics?by=driver,week&days=90"))
+        bench.measure("GET /admin/search", lambda i: client.get(f"/admin/search?q=06{i:04d}"))
+
+        def new_orders(count: int) -> List[str]:
+            names = [next(fresh) for _ in range(count)]
+            for name in names:
+                shopify.add_order(domain, _shopify_order(name))
+            return names
+
+        bench.measure("POST /scan", lambda i: client.post(
+            f"/scan?driver={driver}", json={"barcode": new_orders(1)[0]}))
+        bench.measure(f"POST /scan/batch ({SCAN_BATCH})", lambda i: client.post(
+            f"/scan/batch?driver={driver}", json={"barcodes": new_orders(SCAN_BATCH)}))
+        pending = iter(active[driver])
+        bench.measure("PUT /order/status", lambda i: client.put(
+            f"/order/status?driver={driver}",
+            json={"order_name": next(pending), "new_status": "Livré", "cash_amount": 150}))
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    bench.results.append({"rows": rows, "endpoint": "(emulator totals)",
+                          "sheets": dict(sheets.calls), "shopify": dict(shopify.calls)})
+    return bench.results
+
+
+# ─── parent: all sizes ─────────────────────────────────────────
+def _table(results: List[dict]) -> str:
+    lines = [f"{'rows':>7}  {'endpoint':<34} {'p50 ms':>9} {'p99 ms':>9} "
+             f"{'sheets/req':>10} {'shopify/req':>11}"]
+    for r in results:
+        if "p50_ms" not in r:
+            continue
+        lines.append(f"{r['rows']:>7}  {r['endpoint']:<34} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+                     f"{r['sheets_calls']:>10.2f} {r['shopify_calls']:>11.2f}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    if args.child_out:
+        with open(args.child_out, "w") as fh:
+            json.dump(_run_size(args, int(args.rows)), fh)
+        return 0
+
+    passthrough = [
+        "--repeat", str(args.repeat), "--latency", str(args.latency),
+        "--shopify-latency", str(args.shopify_latency), "--quota", str(args.quota),
+        "--error-rate", str(args.error_rate), "--app-quota", str(args.app_quota),
+    ]
+    results: List[dict] = []
+    for rows in (int(n) for n in args.rows.split(",") if n.strip()):
+        print(f"{rows} rows…", file=sys.stderr)
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            subprocess.run(
+                [sys.executable, "-m", "backend.bench", "--rows", str(rows),
+                 "--child-out", out.name, *passthrough],
+                check=True,
+            )
+            with open(out.name) as fh:
+                results += json.load(fh)
+    print(_table(results))
+    if args.json_out:
+        with open(args.json_out, "w") as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,410 @@
+"""
+Sheets / Shopify emulator
+─────────────────────────
+In-process fakes of the two external APIs the backend talks to, for
+benchmarks and local runs without Google or Shopify credentials.
+
+``SheetsEmulator`` implements the slice of the Sheets v4 REST API the app
+uses – spreadsheet metadata, ``values`` get / batchGet / update /
+batchUpdate / append and ``spreadsheets.batchUpdate`` (addSheet,
+deleteDimension) – on plain lists of strings.  It is reachable both as an
+``httpx`` transport (``AsyncSheetsClient``) and as a ``requests`` session
+(gspread).
+
+``ShopifyEmulator`` answers ``orders.json`` by ``name`` (one or a comma
+separated list) and by ``updated_at_min``.
+
+Both count every call by kind, can add a fixed latency per call and can
+inject 429s: ``quota_per_minute`` rejects calls above a sliding one-minute
+window, ``error_rate`` rejects a random share of them.
+
+``service_account()`` makes the credentials the app needs at import and
+``wire()`` points an imported app at a pair of emulators; the benchmark
+runner and the test suite both start the app this way.
+"""
+import asyncio
+import base64
+import collections
+import datetime as dt
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+
+SHEETS_HOST = "sheets.googleapis.com"
+SPREADSHEET_ID = "bench"
+
+_CELL = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _instant(ts: str) -> dt.datetime:
+    """Shopify compares ``updated_at_min`` as an instant, whatever the offset."""
+    if not ts:
+        return dt.datetime.min.replace(tzinfo=dt.timezone.utc)
+    return dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def _col_number(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _col_letters(n: int) -> str:
+    out = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        out = chr(65 + rem) + out
+    return out
+
+
+def split_range(rng: str) -> Tuple[str, Optional[str]]:
+    """``'My tab'!A1:R`` → ``("My tab", "A1:R")``; a bare tab gives ``None`` cells."""
+    if "!" in rng:
+        tab, cells = rng.rsplit("!", 1)
+    else:
+        tab, cells = rng, None
+    if tab.startswith("'") and tab.endswith("'"):
+        tab = tab[1:-1].replace("''", "'")
+    return tab, cells
+
+
+def parse_cells(cells: Optional[str]) -> Tuple[int, int, Optional[int], Optional[int]]:
+    """1-based ``(first row, first col, last row, last col)``; None = unbounded."""
+    if not cells:
+        return 1, 1, None, None
+    start, _, end = cells.partition(":")
+    end = end or start
+    c1, r1 = _CELL.match(start).groups()
+    c2, r2 = _CELL.match(end).groups()
+    return (int(r1) if r1 else 1, _col_number(c1) if c1 else 1,
+            int(r2) if r2 else None, _col_number(c2) if c2 else None)
+
+
+class _Quota:
+    def __init__(self, per_minute: Optional[int], error_rate: float):
+        self.per_minute = per_minute
+        self.error_rate = error_rate
+        self._calls: collections.deque = collections.deque()
+        self._lock = threading.Lock()
+
+    def exceeded(self) -> bool:
+        if self.error_rate and random.random() < self.error_rate:
+            return True
+        if not self.per_minute:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._calls and now - self._calls[0] > 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.per_minute:
+                return True
+            self._calls.append(now)
+        return False
+
+
+class _Emulator:
+    """Call counting, latency and quota shared by both fakes."""
+
+    def __init__(self, latency: float = 0.0, quota_per_minute: Optional[int] = None,
+                 error_rate: float = 0.0):
+        self.latency = latency
+        self.quota = _Quota(quota_per_minute, error_rate)
+        self.calls: collections.Counter = collections.Counter()
+        self._lock = threading.Lock()
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _handle(self, method: str, url: str, body: bytes) -> Tuple[int, dict]:
+        raise NotImplementedError
+
+    def _dispatch(self, method: str, url: str, body: bytes) -> Tuple[int, dict]:
+        if self.quota.exceeded():
+            with self._lock:
+                self.calls["429"] += 1
+            return 429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                   "message": "Quota exceeded (emulated)"}}
+        with self._lock:
+            return self._handle(method, url, body)
+
+    # ─── transports ────────────────────────────────────────────
+    def async_transport(self) -> httpx.AsyncBaseTransport:
+        emulator = self
+
+        class Transport(httpx.AsyncBaseTransport):
+            async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+                if emulator.latency:
+                    await asyncio.sleep(emulator.latency)
+                status, data = emulator._dispatch(request.method, str(request.url),
+                                                  await request.aread())
+                return httpx.Response(status, json=data, request=request)
+
+        return Transport()
+
+    def sync_transport(self) -> httpx.BaseTransport:
+        emulator = self
+
+        class Transport(httpx.BaseTransport):
+            def handle_request(self, request: httpx.Request) -> httpx.Response:
+                if emulator.latency:
+                    time.sleep(emulator.latency)
+                status, data = emulator._dispatch(request.method, str(request.url),
+                                                  request.read())
+                return httpx.Response(status, json=data, request=request)
+
+        return Transport()
+
+    def requests_session(self) -> requests.Session:
+        emulator = self
+
+        class Adapter(BaseAdapter):
+            def send(self, request, **kwargs):
+                if emulator.latency:
+                    time.sleep(emulator.latency)
+                body = request.body or b""
+                status, data = emulator._dispatch(
+                    request.method, request.url, body.encode() if isinstance(body, str) else body
+                )
+                resp = requests.Response()
+                resp.status_code = status
+                resp._content = json.dumps(data).encode()
+                resp.headers["Content-Type"] = "application/json"
+                resp.url = request.url
+                resp.request = request
+                resp.encoding = "utf-8"
+                return resp
+
+            def close(self):
+                pass
+
+        session = requests.Session()
+        session.mount("https://", Adapter())
+        return session
+
+
+# ─── Google Sheets ─────────────────────────────────────────────
+class _Tab:
+    def __init__(self, sheet_id: int, title: str, index: int):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.index = index
+        self.rows: List[List[str]] = []
+
+    def properties(self) -> dict:
+        width = max((len(r) for r in self.rows), default=0)
+        return {
+            "sheetId": self.sheet_id, "title": self.title, "index": self.index,
+            "sheetType": "GRID",
+            "gridProperties": {"rowCount": max(len(self.rows), 1000),
+                               "columnCount": max(width, 26)},
+        }
+
+    def last_row(self) -> int:
+        n = len(self.rows)
+        while n and not any(self.rows[n - 1]):
+            n -= 1
+        return n
+
+    def read(self, cells: Optional[str], by_columns: bool = False) -> List[List[str]]:
+        r1, c1, r2, c2 = parse_cells(cells)
+        r2 = min(r2 or len(self.rows), len(self.rows))
+        out = []
+        for r in range(r1, r2 + 1):
+            row = self.rows[r - 1][c1 - 1:c2]
+            while row and row[-1] == "":
+                row = row[:-1]
+            out.append(row)
+        while out and not out[-1]:
+            out.pop()
+        if by_columns:
+            width = max((len(r) for r in out), default=0)
+            cols = [[r[i] if i < len(r) else "" for r in out] for i in range(width)]
+            for col in cols:
+                while col and col[-1] == "":
+                    col.pop()
+            return cols
+        return out
+
+    def write(self, cells: Optional[str], values: List[list]) -> None:
+        r1, c1, _, _ = parse_cells(cells)
+        for i, row in enumerate(values):
+            r = r1 + i
+            while len(self.rows) < r:
+                self.rows.append([])
+            target = self.rows[r - 1]
+            for j, v in enumerate(row):
+                c = c1 + j
+                while len(target) < c:
+                    target.append("")
+                target[c - 1] = "" if v is None else str(v)
+
+
+class SheetsEmulator(_Emulator):
+    def __init__(self, spreadsheet_id: str = "emulated", **kwargs):
+        super().__init__(**kwargs)
+        self.spreadsheet_id = spreadsheet_id
+        self.tabs: Dict[str, _Tab] = {}
+        self._next_id = 1
+
+    def add_tab(self, title: str, rows: Optional[List[list]] = None) -> _Tab:
+        tab = _Tab(self._next_id, title, len(self.tabs))
+        self._next_id += 1
+        tab.rows = [["" if v is None else str(v) for v in r] for r in rows or []]
+        self.tabs[title] = tab
+        return tab
+
+    def _tab(self, rng: str) -> Tuple[Optional[_Tab], Optional[str]]:
+        title, cells = split_range(rng)
+        return self.tabs.get(title), cells
+
+    @staticmethod
+    def _missing(rng: str) -> Tuple[int, dict]:
+        return 400, {"error": {"code": 400, "status": "INVALID_ARGUMENT",
+                               "message": f"Unable to parse range: {rng}"}}
+
+    def _handle(self, method: str, url: str, body: bytes) -> Tuple[int, dict]:
+        parts = urlsplit(url)
+        params = parse_qsl(parts.query)
+        path = unquote(parts.path)
+        prefix = f"/v4/spreadsheets/{self.spreadsheet_id}"
+        if not path.startswith(prefix):
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        rest = path[len(prefix):]
+        payload = json.loads(body) if body else {}
+        by_columns = ("majorDimension", "COLUMNS") in params
+
+        if rest == "" and method == "GET":
+            self.calls["metadata"] += 1
+            return 200, {
+                "spreadsheetId": self.spreadsheet_id,
+                "properties": {"title": "Emulated", "locale": "en_US", "timeZone": "Etc/UTC"},
+                "sheets": [{"properties": t.properties()} for t in self.tabs.values()],
+            }
+        if rest == ":batchUpdate":
+            self.calls["batchUpdate"] += 1
+            return 200, self._batch_update(payload.get("requests", []))
+        if rest == "/values:batchGet":
+            self.calls["values.batchGet"] += 1
+            out = []
+            for _, rng in (p for p in params if p[0] == "ranges"):
+                tab, cells = self._tab(rng)
+                if tab is None:
+                    return self._missing(rng)
+                out.append({"range": rng, "values": tab.read(cells, by_columns)})
+            return 200, {"spreadsheetId": self.spreadsheet_id, "valueRanges": out}
+        if rest == "/values:batchUpdate":
+            self.calls["values.batchUpdate"] += 1
+            for entry in payload.get("data", []):
+                tab, cells = self._tab(entry["range"])
+                if tab is None:
+                    return self._missing(entry["range"])
+                tab.write(cells, entry.get("values", []))
+            return 200, {"spreadsheetId": self.spreadsheet_id}
+        if rest.startswith("/values/"):
+            rng = rest[len("/values/"):]
+            append = rng.endswith(":append")
+            if append:
+                rng = rng[:-len(":append")]
+            tab, cells = self._tab(rng)
+            if tab is None:
+                return self._missing(rng)
+            if append:
+                self.calls["values.append"] += 1
+                rows = payload.get("values", [])
+                start = tab.last_row() + 1
+                tab.write(f"A{start}", rows)
+                width = max((len(r) for r in rows), default=1) or 1
+                updated = f"'{tab.title}'!A{start}:{_col_letters(width)}{start + len(rows) - 1}"
+                return 200, {"updates": {"updatedRange": updated, "updatedRows": len(rows)}}
+            if method == "PUT":
+                self.calls["values.update"] += 1
+                tab.write(cells, payload.get("values", []))
+                return 200, {"updatedRange": rng}
+            self.calls["values.get"] += 1
+            return 200, {"range": rng, "majorDimension": "COLUMNS" if by_columns else "ROWS",
+                         "values": tab.read(cells, by_columns)}
+        return 404, {"error": {"code": 404, "message": f"not emulated: {method} {rest}"}}
+
+    def _batch_update(self, reqs: List[dict]) -> dict:
+        replies = []
+        for req in reqs:
+            if "addSheet" in req:
+                title = req["addSheet"]["properties"]["title"]
+                replies.append({"addSheet": {"properties": self.add_tab(title).properties()}})
+            elif "deleteDimension" in req:
+                rng = req["deleteDimension"]["range"]
+                tab = next(t for t in self.tabs.values() if t.sheet_id == rng["sheetId"])
+                del tab.rows[rng["startIndex"]:rng["endIndex"]]
+                replies.append({})
+            else:
+                replies.append({})
+        return {"spreadsheetId": self.spreadsheet_id, "replies": replies}
+
+
+# ─── Shopify ───────────────────────────────────────────────────
+class ShopifyEmulator(_Emulator):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.orders: Dict[str, Dict[str, dict]] = collections.defaultdict(dict)
+
+    def add_order(self, domain: str, order: dict) -> None:
+        self.orders[domain][order["name"]] = order
+
+    def _handle(self, method: str, url: str, body: bytes) -> Tuple[int, dict]:
+        parts = urlsplit(url)
+        params = dict(parse_qsl(parts.query))
+        if not parts.path.endswith("/orders.json"):
+            return 404, {"errors": "Not Found"}
+        store = self.orders.get(parts.hostname, {})
+        if "name" in params:
+            self.calls["orders.by_name"] += 1
+            names = [n.strip() for n in params["name"].split(",") if n.strip()]
+            return 200, {"orders": [store[n] for n in names if n in store]}
+        self.calls["orders.updated"] += 1
+        since = _instant(params.get("updated_at_min", ""))
+        return 200, {"orders": [o for o in store.values()
+                                if o.get("updated_at") and _instant(o["updated_at"]) >= since]}
+
+
+# ─── wiring the app ────────────────────────────────────────────
+def service_account() -> str:
+    """Throwaway service-account JSON (base64) – the app parses it at import."""
+    import rsa   # google-auth dependency
+
+    key = rsa.newkeys(1024)[1].save_pkcs1().decode()
+    info = {
+        "type": "service_account", "project_id": "bench", "private_key_id": "bench",
+        "private_key": key, "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "0", "token_uri": "https://oauth2.googleapis.com/token",
+    }
+    return base64.b64encode(json.dumps(info).encode()).decode()
+
+
+def wire(m, sheets: SheetsEmulator, shopify: ShopifyEmulator) -> None:
+    """Point the Sheets and Shopify clients of the app module ``m`` at the emulators."""
+    import gspread
+    from google.oauth2.credentials import Credentials as TokenCredentials
+
+    from backend.app.quota import ScheduledHTTPClient
+    from backend.app.sheets_async import AsyncSheetsClient
+    from backend.app.worksheets import Workbook
+
+    token = TokenCredentials(token="emulator")
+    m.sheets = AsyncSheetsClient(token, sheets.spreadsheet_id, transport=sheets.async_transport())
+    m.workbook = Workbook(
+        lambda: gspread.Client(token, session=sheets.requests_session(),
+                               http_client=ScheduledHTTPClient),
+        sheets.spreadsheet_id,
+    )
+    for store in m.shopify.stores:
+        store._client_kwargs["transport"] = shopify.async_transport()
+        store._aclient = None
@@ -1,8 +1,11 @@
 # backend/gunicorn_conf.py
-import multiprocessing
+import os
 
-bind = "0.0.0.0:10000"   # matches Dockerfile ENV PORT
-workers = (multiprocessing.cpu_count() * 2) + 1
+# the Sheets token bucket is split between workers: one number for both
+from app.quota import WORKERS
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"   # Render/Cloud Run inject $PORT
+workers = WORKERS                               # $WEB_CONCURRENCY, default 1
 worker_class = "uvicorn.workers.UvicornWorker"
 keepalive = 30
 timeout = 120
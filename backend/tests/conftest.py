@@ -0,0 +1,110 @@
+"""
+Test fixtures
+─────────────
+The app is imported once, against the Sheets / Shopify emulators of
+``backend.bench`` (no Google or Shopify credentials needed), and served
+by one ``TestClient`` for the whole session: its module-level asyncio
+locks belong to that client's event loop.
+
+``app`` gives every test its own local store, sheet mirror, caches and
+emulated workbook, with empty driver tabs.
+"""
+import datetime as dt
+import os
+import tempfile
+from typing import List, Optional
+
+import pytest
+
+from backend.bench.emulator import (SPREADSHEET_ID, SheetsEmulator, ShopifyEmulator,
+                                    service_account, wire)
+
+os.environ.update({
+    "DATA_DIR": tempfile.mkdtemp(prefix="delivery-tests-"),
+    "SPREADSHEET_ID": SPREADSHEET_ID,
+    "GOOGLE_CREDENTIALS_B64": service_account(),
+    "SHEETS_QUOTA_PER_MINUTE": "1000000",
+    "SHEET_SYNC_INTERVAL": "0",
+    "SHOPIFY_SYNC_INTERVAL": "0",
+    "HEADER_CHECK_INTERVAL": "0",
+    "MIRROR_FLUSH_INTERVAL": "0.01",
+    "MIRROR_FSYNC": "0",
+})
+
+
+class Emulated:
+    """The app of one test, with helpers to seed and read the emulated tabs."""
+
+    def __init__(self, m, client, monkeypatch, tmp_path):
+        self.m = m
+        self.client = client
+        self._monkeypatch = monkeypatch
+        self._tmp_path = tmp_path
+        self._stores = 0
+        self.sheets = SheetsEmulator(SPREADSHEET_ID)
+        self.shopify = ShopifyEmulator()
+        wire(m, self.sheets, self.shopify)
+        for cfg in m.DRIVERS.values():
+            self.sheets.add_tab(cfg["order_tab"], [m.ORDER_HEADER])
+            self.sheets.add_tab(cfg["payouts_tab"], [m.PAYOUT_HEADER])
+        self.fresh_store()
+
+    def fresh_store(self) -> None:
+        """Swap in an empty local store (a new instance with a new data dir)."""
+        from backend.app.archive import SegmentStore
+        from backend.app.cache import SharedCache
+        from backend.app.mirror import SheetMirror
+        from backend.app.store import OrderStore
+
+        m, patch = self.m, self._monkeypatch.setattr
+        self._stores += 1
+        data_dir = self._tmp_path / f"data-{self._stores}"
+        self.store = OrderStore(str(data_dir / "orders.sqlite3"),
+                                SegmentStore(str(data_dir / "archive")))
+        self.mirror = SheetMirror(m._get_or_create_sheet, str(data_dir / "journal"),
+                                  layout=self.store.sheet_generation)
+        patch(m, "order_store", self.store)
+        patch(m, "mirror", self.mirror)
+        for name in ("orders_cache", "payouts_cache", "orders_data_cache"):
+            cache = getattr(m, name)
+            patch(m, name, SharedCache(cache.name, self.store, maxsize=8, ttl=cache.ttl,
+                                       persist=cache.persist))
+        patch(m, "_frame", {"versions": {}, "frame": None})
+        patch(m, "_archived_rows", {"generation": None, "rows": {}})
+
+    # ─── seeding ───────────────────────────────────────────────
+    def order(self, name: str, status: str = "Dispatched", day: Optional[str] = None,
+              cash: float = 100, tags: str = "", payout: str = "") -> List[str]:
+        """An ``*_Orders`` row in sheet layout."""
+        day = day or dt.date.today().isoformat()
+        return [f"{day} 09:00:00", name, f"Client {name}", "0600000000", "1 Rue Test",
+                tags, "fulfilled", "open", "irrakids", status, "", "", day,
+                str(cash), str(self.m.calculate_driver_fee(tags)), payout, "", ""]
+
+    def seed(self, driver: str, orders=(), payouts=()) -> None:
+        cfg = self.m.DRIVERS[driver]
+        self.sheets.tabs[cfg["order_tab"]].rows.extend(list(r) for r in orders)
+        self.sheets.tabs[cfg["payouts_tab"]].rows.extend(list(r) for r in payouts)
+
+    def rows(self, tab: str) -> List[List[str]]:
+        """Data rows of an emulated tab, after the mirror has caught up."""
+        assert self.mirror.flush(10)
+        return [list(r) for r in self.sheets.tabs[tab].rows[1:]]
+
+
+@pytest.fixture(scope="session")
+def _served():
+    from fastapi.testclient import TestClient
+
+    import backend.app.main as m
+
+    with TestClient(m.app) as client:
+        yield m, client
+
+
+@pytest.fixture
+def app(_served, monkeypatch, tmp_path) -> Emulated:
+    m, client = _served
+    emulated = Emulated(m, client, monkeypatch, tmp_path)
+    yield emulated
+    emulated.mirror.flush(10)
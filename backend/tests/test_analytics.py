@@ -0,0 +1,69 @@
+"""/admin/analytics: grouped metrics from the columnar order frame."""
+import datetime as dt
+
+import pytest
+
+DRIVER = "mohammed"
+
+
+def _day(days_ago):
+    return (dt.date.today() - dt.timedelta(days=days_ago)).isoformat()
+
+
+@pytest.fixture
+def seeded(app):
+    o = app.order
+    app.seed(DRIVER, [
+        o("#1", "Livré", _day(0), cash=100, tags="big"),
+        o("#2", "Livré", _day(1), cash=200),
+        o("#3", "Refusé", _day(1), cash=60),
+        o("#4", "Dispatched", _day(3), cash=40),
+    ])
+    app.seed("anouar", [o("#7", "Livré", _day(0), cash=90), o("#8", "Annulé", _day(9), cash=30)])
+    return app
+
+
+def _groups(app, query):
+    r = app.client.get(f"/admin/analytics?{query}")
+    assert r.status_code == 200, r.text
+    return r.json()["groups"]
+
+
+def test_by_driver_matches_stats(seeded):
+    stats = seeded.client.get("/admin/stats").json()
+
+    groups = _groups(seeded, "by=driver")
+
+    assert {g["driver"] for g in groups} == {DRIVER, "anouar"}
+    for g in groups:
+        assert {k: g[k] for k in stats[g["driver"]]} == stats[g["driver"]]
+
+
+def test_filters_and_several_keys(seeded):
+    groups = _groups(seeded, f"by=status,day&driver={DRIVER}&days=2")
+
+    assert [(g["status"], g["day"], g["totalOrders"]) for g in groups] == \
+        [("Livré", _day(1), 1), ("Livré", _day(0), 1), ("Refusé", _day(1), 1)]
+    [month] = _groups(seeded, f"by=month&status=Livré&start={_day(0)}")
+    assert month["month"] == _day(0)[:7] and month["totalCollect"] == 190
+
+
+def test_rejects_unknown_keys(seeded):
+    assert seeded.client.get("/admin/analytics?by=colour").status_code == 400
+    assert seeded.client.get("/admin/analytics?by=driver,day,week,month").status_code == 400
+
+
+def test_only_the_changed_driver_is_encoded_again(seeded):
+    _groups(seeded, "by=driver")
+    before = seeded.m._frame["frame"]
+
+    r = seeded.client.put(f"/order/status?driver={DRIVER}",
+                          json={"order_name": "#4", "new_status": "Livré"})
+    assert r.status_code == 200, r.text
+    groups = {g["driver"]: g for g in _groups(seeded, "by=driver")}
+
+    after = seeded.m._frame["frame"]
+    assert after is not before
+    assert after.parts["anouar"] is before.parts["anouar"]
+    assert after.parts[DRIVER] is not before.parts[DRIVER]
+    assert groups[DRIVER]["delivered"] == 3
@@ -0,0 +1,94 @@
+"""Archiving settled rows into the archive tabs, and restoring from them."""
+import datetime as dt
+
+import pytest
+
+DRIVER = "anouar"
+
+
+def _ago(days):
+    return (dt.date.today() - dt.timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def history(app):
+    o = app.order
+    app.seed(DRIVER, [
+        o("#1", "Livré", _ago(60), payout="PO-A"),      # paid, old → archived
+        o("#2", "Livré", _ago(59), payout="PO-A"),
+        o("#3", "Livré", _ago(58)),                     # not paid out yet → kept
+        o("#4", "Returned", _ago(57)),                  # settled, no payout → archived
+        o("#5", "Dispatched", _ago(56)),                # active → kept
+        o("#6", "Livré", _ago(1), payout="PO-B"),       # recent → kept
+        o("#7", "Livré", _ago(55), payout="PO-C"),      # payout still pending → kept
+        o("#8", "Annulé", _ago(54)),                    # archived
+    ], [
+        ["PO-A", f"{_ago(50)} 10:00:00", "#1, #2", "200", "40", "160", "paid", _ago(49)],
+        ["PO-B", f"{_ago(1)} 10:00:00", "#6", "100", "20", "80", "paid", _ago(1)],
+        ["PO-C", f"{_ago(50)} 10:00:00", "#7", "100", "20", "80", "pending", ""],
+    ])
+    return app
+
+
+def _names(rows, col=1):
+    return [r[col] for r in rows]
+
+
+def test_archive_without_apply_changes_nothing(history):
+    app = history
+    tab = app.m.DRIVERS[DRIVER]["order_tab"]
+
+    r = app.client.post("/archive")
+    assert r.status_code == 200, r.text
+    assert r.json()["applied"] is False
+    assert r.json()["drivers"][DRIVER] == {"orders": 4, "payouts": 1}
+
+    assert len(app.rows(tab)) == 8
+    assert not app.store.has_archive(DRIVER)
+
+
+def test_archive_yesterday_is_gone(history):
+    r = history.client.post("/archive-yesterday")
+    assert r.status_code == 410
+    assert "/archive?apply=true" in r.json()["detail"]
+    assert not history.store.has_archive(DRIVER)
+
+
+def test_archive_moves_rows_to_the_archive_tabs(history):
+    app = history
+    cfg = app.m.DRIVERS[DRIVER]
+    stats = app.client.get("/admin/stats").json()[DRIVER]
+    analytics = app.client.get("/admin/analytics?by=status").json()
+
+    r = app.client.post("/archive?apply=true")
+
+    assert r.status_code == 200, r.text
+    assert r.json()["drivers"][DRIVER] == {"orders": 4, "payouts": 1, "sheetRowsDeleted": 5}
+    assert _names(app.rows(cfg["order_tab"])) == ["#3", "#5", "#6", "#7"]
+    assert _names(app.rows(cfg["order_archive_tab"])) == ["#1", "#2", "#4", "#8"]
+    assert _names(app.rows(cfg["payouts_tab"]), 0) == ["PO-B", "PO-C"]
+    assert _names(app.rows(cfg["payouts_archive_tab"]), 0) == ["PO-A"]
+    # archived rows still count
+    assert app.client.get("/admin/stats").json()[DRIVER] == stats
+    assert app.client.get("/admin/analytics?by=status").json() == analytics
+
+    # the deleted rows shifted the sheet: later writes must still find theirs
+    r = app.client.put(f"/order/status?driver={DRIVER}",
+                       json={"order_name": "#5", "new_status": "Livré"})
+    assert r.status_code == 200, r.text
+    rows = {r[1]: r[9] for r in app.rows(cfg["order_tab"])}
+    assert rows["#5"] == "Livré" and rows["#6"] == "Livré" and rows["#3"] == "Livré"
+
+
+def test_archive_is_restored_from_the_archive_tabs(history):
+    app = history
+    assert app.client.post("/archive?apply=true").status_code == 200
+    stats = app.client.get("/admin/stats").json()[DRIVER]
+
+    app.fresh_store()                           # e.g. a new instance with an empty disk
+
+    assert app.client.get("/admin/stats").json()[DRIVER] == stats
+    assert app.store.archived_keys(DRIVER, "orders") == {"#1", "#2", "#4", "#8"}
+    assert app.store.archived_keys(DRIVER, "payouts") == {"PO-A"}
+    assert sorted(_names(app.store.order_rows(DRIVER))) == ["#3", "#5", "#6", "#7"]
+    assert sorted(_names(app.store.archived_orders(DRIVER))) == ["#1", "#2", "#4", "#8"]
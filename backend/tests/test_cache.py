@@ -0,0 +1,84 @@
+"""SharedCache: single-flight loads, revival and stale-while-revalidate."""
+import asyncio
+import time
+
+import pytest
+
+from backend.app.cache import SharedCache
+
+DRIVER = "nizar"
+
+
+@pytest.fixture
+def seeded(app):
+    app.seed(DRIVER, [app.order("#1")])
+    assert app.client.get(f"/orders?driver={DRIVER}").status_code == 200    # loads the tabs
+    return app
+
+
+def _cache(app, ttl=60.0):
+    return SharedCache("test", app.store, maxsize=4, ttl=ttl)
+
+
+class Loader:
+    """A slow load that counts its calls and returns the call number."""
+
+    def __init__(self, delay=0.05):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        n = self.calls
+        await asyncio.sleep(self.delay)
+        return f"load {n}"
+
+
+def _write(app):
+    r = app.client.put(f"/order/status?driver={DRIVER}", json={"order_name": "#1", "note": "x"})
+    assert r.status_code == 200, r.text
+
+
+def test_concurrent_misses_share_one_load(seeded):
+    cache, load = _cache(seeded), Loader()
+
+    async def gets():
+        return await asyncio.gather(*(cache.get(DRIVER, load) for _ in range(10)))
+
+    results = asyncio.run(gets())
+
+    assert load.calls == 1
+    assert {value for value, _ in results} == {"load 1"}
+
+
+def test_expired_entry_of_the_current_version_is_revived(seeded):
+    app = seeded
+    cache, load = _cache(app, ttl=0.01), Loader(delay=0)
+    asyncio.run(cache.get(DRIVER, load))
+    time.sleep(0.02)
+
+    assert asyncio.run(cache.get(DRIVER, load))[0] == "load 1"
+    assert load.calls == 1
+
+    _write(app)
+    assert asyncio.run(cache.get(DRIVER, load))[0] == "load 2"
+
+
+def test_stale_ok_answers_at_once_while_the_refresh_runs(seeded):
+    app = seeded
+    cache, load = _cache(app), Loader(delay=0.2)
+    _, first = asyncio.run(cache.get(DRIVER, load))
+    _write(app)
+
+    async def stale_then_fresh():
+        started = time.monotonic()
+        stale = await cache.get(DRIVER, load, stale_ok=True)
+        answered = time.monotonic() - started
+        fresh = await cache.get(DRIVER, load)           # joins the refresh
+        return stale, answered, fresh
+
+    stale, answered, (value, version) = asyncio.run(stale_then_fresh())
+
+    assert stale == ("load 1", first) and answered < 0.1
+    assert value == "load 2" and version > first
+    assert load.calls == 2
@@ -0,0 +1,73 @@
+"""Conditional GETs (ETag / 304) and ``?since=`` deltas on /orders and /payouts."""
+DRIVER = "nizar"
+
+
+def _set(app, name, **payload):
+    r = app.client.put(f"/order/status?driver={DRIVER}", json={"order_name": name, **payload})
+    assert r.status_code == 200, r.text
+
+
+def _version(app):
+    return app.store.data_version(DRIVER)
+
+
+def test_orders_etag_revalidates_until_data_changes(app):
+    app.seed(DRIVER, [app.order("#1"), app.order("#2")])
+    url = f"/orders?driver={DRIVER}"
+
+    first = app.client.get(url)
+    etag = first.headers["ETag"]
+    assert sorted(o["orderName"] for o in first.json()) == ["#1", "#2"]
+
+    cached = app.client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["ETag"] == etag
+
+    _set(app, "#1", note="call first")
+    fresh = app.client.get(url, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["ETag"] != etag
+    assert {o["orderName"]: o["notes"] for o in fresh.json()}["#1"] == "call first"
+
+
+def test_orders_since_returns_only_changes(app):
+    app.seed(DRIVER, [app.order("#1"), app.order("#2"), app.order("#3")])
+    app.client.get(f"/orders?driver={DRIVER}")
+    since = _version(app)
+
+    _set(app, "#1", note="gate code 12")
+    _set(app, "#2", new_status="Annulé")
+    delta = app.client.get(f"/orders?driver={DRIVER}&since={since}").json()
+
+    assert delta["full"] is False and delta["version"] == _version(app)
+    assert [o["orderName"] for o in delta["changed"]] == ["#1"]
+    assert delta["changed"][0]["notes"] == "gate code 12"
+    assert delta["removed"] == ["#2"]
+
+    empty = app.client.get(f"/orders?driver={DRIVER}&since={delta['version']}").json()
+    assert (empty["changed"], empty["removed"]) == ([], [])
+
+
+def test_orders_since_before_the_event_log_falls_back_to_full(app):
+    app.seed(DRIVER, [app.order("#1")])
+    app.client.get(f"/orders?driver={DRIVER}")
+    app.store.reset(DRIVER)                     # reload: older versions cannot be replayed
+
+    delta = app.client.get(f"/orders?driver={DRIVER}&since=0").json()
+
+    assert delta["full"] is True
+    assert [o["orderName"] for o in delta["changed"]] == ["#1"]
+
+
+def test_payouts_etag_and_since(app):
+    app.seed(DRIVER, [app.order("#1"), app.order("#2")])
+    url = f"/payouts?driver={DRIVER}"
+    etag = app.client.get(url).headers["ETag"]
+    since = _version(app)
+    assert app.client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    _set(app, "#1", new_status="Livré")
+
+    assert app.client.get(url, headers={"If-None-Match": etag}).status_code == 200
+    delta = app.client.get(f"{url}&since={since}").json()
+    assert delta["full"] is False
+    [payout] = delta["changed"]
+    assert payout["orders"] == "#1" and payout["totalCash"] == 100
@@ -0,0 +1,89 @@
+"""/events: server-sent order and payout changes from the shared event log."""
+import asyncio
+import json
+
+DRIVER = "anouar"
+
+
+class _Request:
+    """Just enough of a Starlette request for the endpoint; hangs up after ``polls``."""
+
+    def __init__(self, last_event_id=None, polls=1):
+        self.headers = {"last-event-id": str(last_event_id)} if last_event_id is not None else {}
+        self._polls = polls
+
+    async def is_disconnected(self):
+        self._polls -= 1
+        return self._polls < 0
+
+
+def _events(app, driver=None, last_event_id=None, polls=1):
+    """``[(id, event, data)]`` the stream sends before the client hangs up."""
+    async def read():
+        response = await app.m.events(_Request(last_event_id, polls), driver)
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    out = []
+    for block in asyncio.run(read()).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            out.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return out
+
+
+def _status(app, driver, name, **payload):
+    r = app.client.put(f"/order/status?driver={driver}", json={"order_name": name, **payload})
+    assert r.status_code == 200, r.text
+
+
+def test_changes_after_last_event_id_are_streamed(app, monkeypatch):
+    monkeypatch.setattr(app.m, "EVENTS_POLL", 0.01)
+    app.seed(DRIVER, [app.order("#1"), app.order("#2")])
+    app.client.get(f"/orders?driver={DRIVER}")
+    start = app.store.last_event_id()
+
+    _status(app, DRIVER, "#1", note="ring twice")
+    _status(app, DRIVER, "#2", new_status="Livré")
+    events = _events(app, DRIVER, last_event_id=start)
+
+    orders = [(e[2]["op"], e[2]["order"]["orderName"]) for e in events if e[1] == "order"]
+    assert orders == [("upsert", "#1"), ("remove", "#2")]
+    [payout] = [e[2]["payout"] for e in events if e[1] == "payout"]
+    assert payout["orders"] == "#2"
+    ids = [int(e[0]) for e in events]
+    assert ids == sorted(ids) and ids[0] > start
+
+    # resuming from the last id sends nothing twice
+    assert _events(app, DRIVER, last_event_id=ids[-1]) == []
+
+
+def test_stream_is_filtered_by_driver(app, monkeypatch):
+    monkeypatch.setattr(app.m, "EVENTS_POLL", 0.01)
+    app.seed(DRIVER, [app.order("#1")])
+    app.seed("nizar", [app.order("#9")])
+    app.client.get(f"/orders?driver={DRIVER}")
+    app.client.get("/orders?driver=nizar")
+    start = app.store.last_event_id()
+
+    _status(app, DRIVER, "#1", note="a")
+    _status(app, "nizar", "#9", note="b")
+
+    assert {e[2]["driver"] for e in _events(app, "nizar", last_event_id=start)} == {"nizar"}
+    assert {e[2]["driver"] for e in _events(app, last_event_id=start)} == {DRIVER, "nizar"}
+    assert app.client.get("/events?driver=nobody").status_code == 400
+
+
+def test_pruned_log_asks_the_client_to_reload(app, monkeypatch):
+    monkeypatch.setattr(app.m, "EVENTS_POLL", 0.01)
+    app.seed(DRIVER, [app.order("#1")])
+    app.client.get(f"/orders?driver={DRIVER}")
+    start = app.store.last_event_id()
+    _status(app, DRIVER, "#1", note="a")
+    _status(app, DRIVER, "#1", note="b")
+    with app.store._write() as conn:
+        conn.execute("DELETE FROM events WHERE id <= ?", (start + 1,))
+
+    events = _events(app, DRIVER, last_event_id=start)
+
+    # the client refetches everything, so the stream goes on from the newest event
+    assert [(e[1], e[2]) for e in events] == [("reload", {"driver": DRIVER})]
@@ -0,0 +1,68 @@
+"""/metrics: external calls, per-route tallies and request timings."""
+import re
+
+DRIVER = "abderrehman"
+_SAMPLE = re.compile(r"^(\S+) (\S+)$")
+
+
+def _scrape(app):
+    r = app.client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return {m[1]: float(m[2]) for m in map(_SAMPLE.match, r.text.splitlines())
+            if m and not m[1].startswith("#")}
+
+
+def _delta(before, after, series):
+    return after.get(series, 0) - before.get(series, 0)
+
+
+def test_external_calls_are_counted_per_kind_and_route(app):
+    stores = app.m.shopify.stores
+    app.seed(DRIVER, [app.order("#1")])
+    before = _scrape(app)
+
+    app.client.get(f"/orders?driver={DRIVER}")
+    app.client.post(f"/scan?driver={DRIVER}", json={"barcode": "8001"})
+    after = _scrape(app)
+
+    assert _delta(before, after, 'sheets_calls_total{call="values.batchGet",status="200"}') >= 1
+    assert _delta(before, after,
+                  'route_external_calls_total{route="/orders",service="sheets"}') >= 1
+    for st in stores:
+        series = f'shopify_calls_total{{store="{st.name}",call="orders.by_name",status="200"}}'
+        assert _delta(before, after, series) == 1
+    assert _delta(before, after,
+                  'route_external_calls_total{route="/scan",service="shopify"}') == len(stores)
+
+
+def test_requests_are_timed_by_route_template(app):
+    before = _scrape(app)
+
+    app.client.post(f"/payout/mark-paid/PO-NOPE?driver={DRIVER}")
+    after = _scrape(app)
+
+    series = [s for s in after if s.startswith("http_request_duration_seconds_count{")
+              and 'route="/payout/mark-paid/{payout_id}"' in s]
+    assert series and sum(_delta(before, after, s) for s in series) == 1
+    assert not any("PO-NOPE" in s for s in after)
+
+
+def test_rejected_sheets_calls_show_up_as_429(app, monkeypatch):
+    from backend.app import sheets_async
+
+    monkeypatch.setattr(sheets_async, "backoff_delay", lambda attempt: 0.0)
+    handle, left = app.sheets._handle, [1]
+
+    def flaky(method, url, body):
+        if left[0]:
+            left[0] -= 1
+            return 429, {"error": {"code": 429, "message": "Quota exceeded (emulated)"}}
+        return handle(method, url, body)
+
+    app.sheets._handle = flaky
+    before = _scrape(app)
+    app.client.get(f"/orders?driver={DRIVER}")
+    after = _scrape(app)
+
+    assert _delta(before, after, 'sheets_calls_total{call="values.batchGet",status="429"}') == 1
@@ -0,0 +1,95 @@
+"""Sheet mirror: journal replay, orphan adoption, unmatched keys, rejected ops."""
+import json
+import os
+import time
+
+from backend.app import mirror as mirror_mod
+from backend.app.mirror import SheetMirror
+
+TAB = "anouar_Orders"
+
+
+def _orphan(journal_dir, entries, pid=999999, torn=""):
+    os.makedirs(journal_dir, exist_ok=True)
+    path = os.path.join(journal_dir, f"mirror-{pid}.jsonl")
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("".join(json.dumps(e) + "\n" for e in entries) + torn)
+    return path
+
+
+def _append(app, name):
+    row = app.order(name)
+    return {"op": "append", "tab": TAB, "header": app.m.ORDER_HEADER, "row": row}
+
+
+def _update(app, name, changes):
+    return {"op": "update", "tab": TAB, "header": app.m.ORDER_HEADER,
+            "key_col": 2, "key": name, "changes": changes}
+
+
+def test_orphaned_journal_is_replayed(app, tmp_path):
+    journal = str(tmp_path / "journal")
+    path = _orphan(journal, [
+        {"seq": 1, "op": _append(app, "#1")},
+        {"seq": 2, "op": _append(app, "#2")},
+        {"ack": [1]},                                   # #1 made it before the crash
+        {"seq": 3, "op": _update(app, "#2", {"9": "Livré"})},
+    ], torn='{"seq": 4, "op": {"op"')
+
+    mirror = SheetMirror(app.m._get_or_create_sheet, journal)
+    assert mirror.flush(10)
+
+    rows = app.sheets.tabs[TAB].rows[1:]
+    assert [(r[1], r[9]) for r in rows] == [("#2", "Livré")]
+    assert not os.path.exists(path)
+    assert [f for f in os.listdir(journal) if f.startswith("mirror-")] == \
+        [f"mirror-{os.getpid()}.jsonl"]
+
+
+def test_live_or_adopted_journal_is_not_claimed(tmp_path):
+    path = _orphan(str(tmp_path), [{"seq": 1, "op": {"op": "append"}}])
+    held = SheetMirror._claim(path)
+    assert held is not None
+    try:
+        assert SheetMirror._claim(path) is None         # locked by its owner
+    finally:
+        os.unlink(path)
+        held.close()
+    assert SheetMirror._claim(path) is None             # adopted and removed meanwhile
+
+
+def test_update_waits_for_its_row(app, monkeypatch):
+    monkeypatch.setattr(mirror_mod, "MISSING_RETRY_SECONDS", 0.05)
+    app.mirror.update(TAB, app.m.ORDER_HEADER, 2, "#7", {9: "Livré"})
+    assert app.mirror.flush(10)                         # does not wait for the row
+    assert app.mirror.pending() == 1
+
+    # another worker's append of the row lands
+    app.sheets.tabs[TAB].rows.append(app.order("#7"))
+
+    deadline = time.monotonic() + 10
+    while app.mirror.pending() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert app.sheets.tabs[TAB].rows[1][9] == "Livré"
+
+
+def test_rejected_op_alone_is_dead_lettered(app, tmp_path):
+    app.sheets.tabs[TAB].rows += [app.order("#1"), app.order("#2")]
+    handle = app.sheets._handle
+
+    def reject_bad(method, url, body):
+        if b"BAD" in (body or b""):
+            return 400, {"error": {"code": 400, "message": "Invalid value"}}
+        return handle(method, url, body)
+
+    app.sheets._handle = reject_bad
+    with app.mirror.batch():
+        app.mirror.update(TAB, app.m.ORDER_HEADER, 2, "#1", {10: "fine"})
+        app.mirror.update(TAB, app.m.ORDER_HEADER, 2, "#2", {10: "BAD"})
+    rows = app.rows(TAB)
+
+    assert [r[10] for r in rows] == ["fine", ""]
+    with open(os.path.join(app.mirror._journal_dir, mirror_mod.DEAD_LETTER_FILE)) as fh:
+        [entry] = [json.loads(line) for line in fh]
+    assert entry["op"]["key"] == "#2"
+    assert app.mirror.pending() == 0
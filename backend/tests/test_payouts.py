@@ -0,0 +1,104 @@
+"""Payout ledger: deliveries credit the open payout, reversals debit it."""
+import datetime as dt
+
+DRIVER = "anouar"
+
+
+def _status(app, name, status, **extra):
+    r = app.client.put(f"/order/status?driver={DRIVER}",
+                       json={"order_name": name, "new_status": status, **extra})
+    assert r.status_code == 200, r.text
+    return r
+
+
+def _payouts(app):
+    r = app.client.get(f"/payouts?driver={DRIVER}")
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _ledger(app, payout_id):
+    cash, fees = app.store._conn().execute(
+        "SELECT SUM(cash), SUM(fees) FROM payout_ledger WHERE payout_id = ?", (payout_id,),
+    ).fetchone()
+    return cash / 100, fees / 100
+
+
+def test_deliveries_are_credited_to_one_open_payout(app):
+    app.seed(DRIVER, [app.order("#1", cash=150), app.order("#2", cash=100, tags="ch")])
+
+    _status(app, "#1", "Livré")
+    _status(app, "#2", "Livré", cash_amount=120)
+
+    [payout] = _payouts(app)
+    assert payout["orders"] == "#1, #2"
+    assert (payout["totalCash"], payout["totalFees"], payout["totalPayout"]) == (270, 30, 240)
+    assert payout["status"] == "pending"
+    assert _ledger(app, payout["payoutId"]) == (270, 30)
+
+    orders = app.rows(app.m.DRIVERS[DRIVER]["order_tab"])
+    assert {r[1]: r[15] for r in orders} == {"#1": payout["payoutId"], "#2": payout["payoutId"]}
+    [sheet] = app.rows(app.m.DRIVERS[DRIVER]["payouts_tab"])
+    assert sheet[0] == payout["payoutId"] and float(sheet[3]) == 270 and float(sheet[5]) == 240
+
+
+def test_repeated_delivery_is_credited_once(app):
+    app.seed(DRIVER, [app.order("#1", cash=150)])
+
+    _status(app, "#1", "Livré")
+    _status(app, "#1", "Livré")
+
+    [payout] = _payouts(app)
+    assert payout["totalCash"] == 150
+    assert _ledger(app, payout["payoutId"]) == (150, 20)
+
+
+def test_reverted_delivery_is_debited(app):
+    app.seed(DRIVER, [app.order("#1", cash=150), app.order("#2", cash=100)])
+    _status(app, "#1", "Livré")
+    _status(app, "#2", "Livré")
+
+    _status(app, "#1", "Refusé")
+
+    [payout] = _payouts(app)
+    assert payout["orders"] == "#2"
+    assert (payout["totalCash"], payout["totalFees"]) == (100, 20)
+    assert _ledger(app, payout["payoutId"]) == (100, 20)
+    order = app.store.find_order(DRIVER, "#1")
+    assert order[9] == "Refusé" and order[15] == ""
+
+
+def test_unknown_payout_id_counts_as_none(app):
+    # a payout ID naming no payout (row deleted by hand) must not fail the delivery
+    app.seed(DRIVER, [app.order("#1", cash=80, payout="PO-GONE")])
+
+    _status(app, "#1", "Livré")
+
+    [payout] = _payouts(app)
+    assert payout["payoutId"] != "PO-GONE" and payout["orders"] == "#1"
+    assert app.store.find_order(DRIVER, "#1")[15] == payout["payoutId"]
+
+
+def test_paid_payout_is_not_credited_again(app):
+    app.seed(DRIVER, [app.order("#1"), app.order("#2")])
+    _status(app, "#1", "Livré")
+    [first] = _payouts(app)
+    r = app.client.post(f"/payout/mark-paid/{first['payoutId']}?driver={DRIVER}")
+    assert r.status_code == 200, r.text
+
+    _status(app, "#2", "Livré")
+
+    second, paid = _payouts(app)
+    assert paid["payoutId"] == first["payoutId"] and paid["status"] == "paid"
+    assert second["orders"] == "#2" and second["totalCash"] == 100
+
+
+def test_hand_edited_totals_are_booked_in_the_ledger(app):
+    today = dt.date.today().isoformat()
+    app.seed(DRIVER, [app.order("#1", status="Livré", cash=100, payout="PO-A")],
+             [["PO-A", f"{today} 10:00:00", "#1", "100", "20", "80", "paid", today]])
+    _payouts(app)                                   # loads the tabs
+
+    app.store.update_payout(DRIVER, "PO-A", {3: "130"})
+
+    assert _ledger(app, "PO-A") == (130, 20)
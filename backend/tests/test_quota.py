@@ -0,0 +1,66 @@
+"""Sheets quota scheduler: priorities, and retries of rejected calls."""
+import threading
+import time
+
+from backend.app import quota, sheets_async
+from backend.app.quota import ADMIN, BACKGROUND, DRIVER, TokenBucket
+
+TAB = "abderrehman_Orders"
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    bucket = TokenBucket(60, burst=1)
+    bucket.acquire()                                    # drained
+    bucket.rate = 1e-6                                  # nothing refills while they queue
+    served, threads = [], []
+    for name, level in [("bg", BACKGROUND), ("admin", ADMIN), ("driver-1", DRIVER),
+                        ("driver-2", DRIVER)]:
+        def take(name=name, level=level):
+            bucket.acquire(level)
+            served.append(name)
+
+        t = threading.Thread(target=take)
+        t.start()
+        threads.append(t)
+        while len(bucket._waiters) < len(threads):     # queued in this order
+            time.sleep(0.001)
+
+    with bucket._cond:
+        bucket.rate = 20.0                              # one every 50 ms
+        bucket._cond.notify_all()
+    for t in threads:
+        t.join(5)
+
+    assert served == ["driver-1", "driver-2", "admin", "bg"]
+
+
+def _reject_first(app, calls: int):
+    """The next ``calls`` Sheets requests come back 429."""
+    handle, left = app.sheets._handle, [calls]
+
+    def flaky(method, url, body):
+        if left[0]:
+            left[0] -= 1
+            return 429, {"error": {"code": 429, "message": "Quota exceeded (emulated)"}}
+        return handle(method, url, body)
+
+    app.sheets._handle = flaky
+    return left
+
+
+def test_rejected_reads_and_writes_are_retried(app, monkeypatch):
+    monkeypatch.setattr(sheets_async, "backoff_delay", lambda attempt: 0.0)
+    monkeypatch.setattr(quota, "backoff_delay", lambda attempt: 0.0)
+    app.seed("abderrehman", [app.order("#1")])
+
+    left = _reject_first(app, 2)
+    r = app.client.get("/orders?driver=abderrehman")        # async client
+    assert r.status_code == 200 and [o["orderName"] for o in r.json()] == ["#1"]
+    assert left == [0]
+
+    left = _reject_first(app, 2)
+    r = app.client.put("/order/status?driver=abderrehman",
+                       json={"order_name": "#1", "new_status": "Livré"})
+    assert r.status_code == 200, r.text
+    assert app.rows(TAB)[0][9] == "Livré"                   # gspread, via the mirror
+    assert left == [0]
@@ -0,0 +1,105 @@
+"""/scan and /scan/batch: Shopify lookups and the rows they add."""
+import asyncio
+import datetime as dt
+import time
+
+import pytest
+
+from backend.app.shopify import BREAKER_FAILURES, CircuitBreaker
+
+DRIVER = "nizar"
+
+
+def _shopify_order(name, **extra):
+    now = dt.datetime.now(dt.timezone.utc).isoformat()
+    return {"name": name, "created_at": now, "updated_at": now, "tags": "",
+            "fulfillment_status": "fulfilled", "total_outstanding": "150.00", **extra}
+
+
+def test_batch_scan_looks_up_every_new_name_at_once(app):
+    domain = app.m.shopify.stores[0].domain
+    for name in ("#101", "#102", "#103"):
+        app.shopify.add_order(domain, _shopify_order(name))
+    app.shopify.add_order(domain, _shopify_order("#104", cancelled_at="2026-01-01T00:00:00Z"))
+    app.seed(DRIVER, [app.order("#100")])
+
+    r = app.client.post(f"/scan/batch?driver={DRIVER}",
+                        json={"barcodes": ["100", "101", "x", "102", "101", "103", "104", "105"]})
+
+    assert r.status_code == 200, r.text
+    assert [(s["order"], s["result"]) for s in r.json()] == [
+        ("#100", "⚠️ Already scanned"),
+        ("#101", "✅ OK"),
+        ("x", "❌ Invalid barcode"),
+        ("#102", "✅ OK"),
+        ("#101", "⚠️ Already scanned"),         # repeated within the batch
+        ("#103", "✅ OK"),
+        ("#104", "⚠️ Cancelled"),
+        ("#105", "❌ Not found"),
+    ]
+    # one bulk request per store, not one per barcode
+    assert app.shopify.calls["orders.by_name"] == len(app.m.shopify.stores)
+    names = [r[1] for r in app.rows(app.m.DRIVERS[DRIVER]["order_tab"])]
+    assert names == ["#100", "#101", "#102", "#103", "#104", "#105"]
+
+
+def test_batch_scan_reuses_cached_orders(app):
+    app.store.put_shopify_orders("irrakids", [_shopify_order("#201")])
+
+    r = app.client.post(f"/scan/batch?driver={DRIVER}", json={"barcodes": ["201"]})
+
+    assert [s["result"] for s in r.json()] == ["✅ OK"]
+    assert app.shopify.calls["orders.by_name"] == 0
+
+
+def test_batch_is_capped(app):
+    barcodes = [str(n) for n in range(app.m.SCAN_BATCH_MAX + 1)]
+    r = app.client.post(f"/scan/batch?driver={DRIVER}", json={"barcodes": barcodes})
+    assert r.status_code == 422
+
+
+@pytest.fixture
+def outage(app, monkeypatch):
+    """Every Shopify store answers 503; breakers start closed."""
+    for st in app.m.shopify.stores:
+        monkeypatch.setattr(st, "breaker", CircuitBreaker())
+    calls = []
+
+    def down(method, url, body):
+        calls.append(url)
+        return 503, {"errors": "Service Unavailable"}
+
+    app.shopify._handle = down
+    return calls
+
+
+def test_breaker_stops_calling_a_store_that_is_down(app, outage):
+    stores = app.m.shopify.stores
+    for n in range(BREAKER_FAILURES):
+        r = app.client.post(f"/scan?driver={DRIVER}", json={"barcode": f"30{n}"})
+        assert r.json()["result"] == "❌ Not found"
+    assert len(outage) == BREAKER_FAILURES * len(stores)
+    assert all(st.breaker.is_open for st in stores)
+
+    r = app.client.post(f"/scan?driver={DRIVER}", json={"barcode": "399"})
+
+    assert r.json()["result"] == "❌ Not found"
+    assert len(outage) == BREAKER_FAILURES * len(stores)    # answered without a call
+
+
+def test_half_open_breaker_lets_one_probe_through(app, outage):
+    st = app.m.shopify.stores[0]
+    for _ in range(BREAKER_FAILURES):
+        st.breaker.record_failure()
+    st.breaker._opened_at = time.monotonic() - st.breaker.reset_after - 1
+    app.shopify.latency = 0.05
+
+    async def scans():
+        try:
+            return await asyncio.gather(*(st.aget_order(f"#40{n}") for n in range(10)))
+        finally:
+            await st.aclose()
+
+    assert asyncio.run(scans()) == [None] * 10
+    assert len(outage) == 1
+    assert st.breaker.is_open                           # the probe failed
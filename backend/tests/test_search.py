@@ -0,0 +1,43 @@
+"""/admin/search: prefix matching, pagination and archived hits."""
+import datetime as dt
+
+DRIVER = "mohammed"
+
+
+def _ago(days):
+    return (dt.date.today() - dt.timedelta(days=days)).isoformat()
+
+
+def _search(app, q, **params):
+    r = app.client.get("/admin/search", params={"q": q, **params})
+    assert r.status_code == 200, r.text
+    return int(r.headers["X-Total-Count"]), [o["orderName"] for o in r.json()]
+
+
+def test_every_token_must_match(app):
+    rows = [app.order(f"#{1000 + i}") for i in range(3)]
+    rows[0][2], rows[0][4] = "Salma Idrissi", "12 Rue Atlas, Fès"
+    rows[1][2], rows[1][3] = "Salma Benali", "+212 661-234567"
+    app.seed(DRIVER, rows)
+
+    assert _search(app, "salma") == (2, ["#1000", "#1001"])
+    assert _search(app, "sal fes") == (1, ["#1000"])
+    assert _search(app, "0661 23") == (1, ["#1001"])
+    assert _search(app, "#1002") == (1, ["#1002"])
+    assert _search(app, "salma nowhere") == (0, [])
+
+
+def test_pages_cover_live_then_archived_rows(app):
+    o = app.order
+    app.seed(DRIVER, [o(f"#2{i:02d}", "Livré", _ago(60 - i), payout="PO-A") for i in range(5)]
+             + [o(f"#3{i:02d}") for i in range(4)],
+             [["PO-A", f"{_ago(50)} 10:00:00", "", "500", "100", "400", "paid", _ago(49)]])
+    app.client.get(f"/orders?driver={DRIVER}")
+    assert app.client.post("/archive?apply=true").status_code == 200
+
+    pages = [_search(app, "client", limit=4, offset=n) for n in (0, 4, 8)]
+
+    assert {total for total, _ in pages} == {9}
+    names = [n for _, page in pages for n in page]
+    assert names[:4] == ["#300", "#301", "#302", "#303"]
+    assert names[4:] == ["#204", "#203", "#202", "#201", "#200"]   # newest segment first
@@ -0,0 +1,80 @@
+"""Local Shopify order cache: the sync, its cursor and the orders/updated webhook."""
+import base64
+import datetime as dt
+import hashlib
+import hmac
+import json
+
+import pytest
+
+DRIVER = "abderrehman"
+SECRET = "hush"
+
+
+def _now():
+    return dt.datetime.now(dt.timezone.utc).isoformat()
+
+
+def _order(name, updated_at, created_at=None, **extra):
+    created_at = created_at or _now()
+    return {"name": name, "created_at": created_at, "updated_at": updated_at,
+            "tags": "", "fulfillment_status": "fulfilled", "total_outstanding": "150.00",
+            "shipping_address": {"name": f"Client {name}", "phone": "0611111111",
+                                 "address1": "1 Rue Test", "city": "Casablanca"},
+            **extra}
+
+
+@pytest.fixture
+def store(app, monkeypatch):
+    st = app.m.shopify.stores[0]
+    monkeypatch.setattr(st, "webhook_secret", SECRET)
+    return st
+
+
+def _webhook(app, st, order, secret=SECRET):
+    body = json.dumps(order).encode()
+    signature = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest())
+    return app.client.post("/shopify/webhooks/orders-updated", content=body, headers={
+        "X-Shopify-Shop-Domain": st.domain, "X-Shopify-Hmac-Sha256": signature.decode()})
+
+
+def test_sync_fills_the_cache_scans_read(app, store):
+    app.shopify.add_order(store.domain, _order("#5001", _now()))
+
+    assert app.client.post("/shopify/sync").json()[store.name] == 1
+    r = app.client.post(f"/scan?driver={DRIVER}", json={"barcode": "5001"})
+
+    assert r.json()["result"] == "✅ OK"
+    assert app.shopify.calls["orders.by_name"] == 0
+    [row] = app.rows(app.m.DRIVERS[DRIVER]["order_tab"])
+    assert (row[1], row[2], row[8]) == ("#5001", "Client #5001", store.name)
+
+
+def test_sync_cursor_is_the_latest_instant(app, store):
+    # the clocks went back overnight: the later update has the smaller local time
+    app.shopify.add_order(store.domain, _order("#1", "2026-10-25T02:30:00+02:00"))
+    app.shopify.add_order(store.domain, _order("#2", "2026-10-25T02:10:00+01:00"))
+    app.shopify.add_order(store.domain, _order("#3", "2026-10-25T00:20:00Z"))
+
+    app.client.post("/shopify/sync")
+
+    cursor = dt.datetime.fromisoformat(app.store.shopify_cursor(store.name))
+    assert cursor == dt.datetime(2026, 10, 25, 1, 10, tzinfo=dt.timezone.utc)
+
+
+def test_webhook_needs_a_valid_signature(app, store):
+    order = _order("#6001", _now())
+
+    assert _webhook(app, store, order, secret="wrong").status_code == 401
+    assert app.store.shopify_orders("#6001") == []
+
+    assert _webhook(app, store, order).status_code == 200
+    assert [s for s, _ in app.store.shopify_orders("#6001")] == [store.name]
+
+
+def test_older_webhook_does_not_overwrite_a_newer_copy(app, store):
+    _webhook(app, store, _order("#7001", "2026-10-25T02:10:00+01:00", tags="big"))
+    _webhook(app, store, _order("#7001", "2026-10-25T02:30:00+02:00", tags="stale"))
+
+    [(_, cached)] = app.store.shopify_orders("#7001")
+    assert cached["tags"] == "big"
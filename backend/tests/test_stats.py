@@ -0,0 +1,93 @@
+"""Stats, trends and the admin dashboard from the per-day rollups."""
+import datetime as dt
+
+import pytest
+
+DRIVER = "anouar"
+
+
+def _ago(days):
+    return (dt.date.today() - dt.timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def seeded(app):
+    o = app.order
+    app.seed(DRIVER, [
+        o("#1", "Livré", _ago(0), cash=100),
+        o("#2", "Livré", _ago(0), cash=200, tags="big"),
+        o("#3", "Livré", _ago(2), cash=50),
+        o("#4", "Refusé", _ago(2), cash=80),
+        o("#5", "Dispatched", _ago(1), cash=70),
+        o("#6", "Livré", _ago(20), cash=300),
+    ])
+    app.seed("nizar", [o("#9", "Livré", _ago(2), cash=10)])
+    return app
+
+
+def _stats(app, **params):
+    r = app.client.get("/stats", params={"driver": DRIVER, **params})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_stats_sum_the_day_buckets(seeded):
+    fee = seeded.m.calculate_driver_fee
+
+    stats = _stats(seeded, days=7)
+
+    assert stats["totalOrders"] == 5
+    assert (stats["delivered"], stats["returned"]) == (3, 1)
+    assert stats["totalCollect"] == 350 and stats["canceledAmount"] == 80
+    assert stats["totalFees"] == 2 * fee("") + fee("big")
+    assert stats["deliveryRate"] == 60
+    assert _stats(seeded)["totalOrders"] == 6
+    assert _stats(seeded, start=_ago(2), end=_ago(1))["totalOrders"] == 3
+
+
+def test_stats_follow_status_changes(seeded):
+    before = _stats(seeded, days=7)
+
+    r = seeded.client.put(f"/order/status?driver={DRIVER}",
+                          json={"order_name": "#5", "new_status": "Livré", "cash_amount": 75})
+    assert r.status_code == 200, r.text
+
+    after = _stats(seeded, days=7)
+    assert after["delivered"] == before["delivered"] + 1
+    assert after["totalCollect"] == before["totalCollect"] + 75
+    assert after["totalOrders"] == before["totalOrders"]
+
+
+def test_admin_stats_and_trends_cover_every_driver(seeded):
+    stats = seeded.client.get("/admin/stats?days=7").json()
+    assert set(stats) == set(seeded.m.DRIVERS)
+    assert stats[DRIVER] == _stats(seeded, days=7)
+    assert stats["nizar"]["delivered"] == 1 and stats["mohammed"]["totalOrders"] == 0
+
+    trends = seeded.client.get("/admin/trends?days=7").json()
+    assert trends == [{"date": _ago(2), "delivered": 2}, {"date": _ago(0), "delivered": 2}]
+
+
+def test_bad_dates_are_rejected(seeded):
+    r = seeded.client.get("/stats", params={"driver": DRIVER, "start": "yesterday"})
+    assert r.status_code == 400
+
+
+def test_dashboard_matches_the_endpoints_it_replaces(seeded):
+    app = seeded
+    app.seed(DRIVER, payouts=[
+        ["PO-A", f"{_ago(2)} 10:00:00", "#3", "50", "20", "30", "paid", _ago(1)],
+        ["PO-B", f"{_ago(0)} 10:00:00", "#1, #2", "300", "40", "260", "pending", ""],
+    ])
+
+    r = app.client.get("/admin/dashboard?days=7")
+
+    assert r.status_code == 200, r.text
+    dashboard = r.json()
+    assert dashboard["trends"] == app.client.get("/admin/trends?days=7").json()
+    stats = app.client.get("/admin/stats?days=7").json()
+    for driver, row in dashboard["drivers"].items():
+        assert {k: v for k, v in row.items() if k in stats[driver]} == stats[driver]
+    mine = dashboard["drivers"][DRIVER]
+    assert mine["activeOrders"] == 1                # #5, whatever the range
+    assert mine["unpaidPayout"] == 260